@@ -0,0 +1,329 @@
+import re
+import subprocess
+import time
+import uuid
+
+import app_launch
+from adb_input import InputBatch, TextInput
+from adb_metrics import METRICS, command_kind
+from adb_transport import ADB_PATH, AdbTransportError, make_transport
+from coord_cache import SNAPSHOT_MAX_AGE, CoordCache
+from hierarchy_agent import HierarchyAgent
+from selector_catalog import SelectorCatalog
+from session_trace import TRACE
+from ui_dump import decode_dump, dump_command
+from ui_selector import first_match, select
+from ui_tree import UITree
+from ui_wait import UIWaiter
+from visual_locator import VisualLocator
+
+# ==========================================
+# ADB CONTROLLER (ЗАМЕНА APPIUM)
+# ==========================================
+#
+# Управление устройством через adb: shell-команды, дамп UI, клики, ввод.
+# Отдельный модуль, чтобы библиотечный код (device_registry, ui_backend,
+# fake_device, бенчмарки) не импортировал скрипт main.py.
+
+def describe_selector(selector):
+    """Короткое описание селектора для логов"""
+    if not isinstance(selector, dict):
+        return getattr(selector, "source", selector)
+    for key in ('text', 'text_exact', 'resource_id', 'resource_id_contains', 'class_name', 'content_desc'):
+        if selector.get(key):
+            return selector[key]
+    return str(selector)
+
+class ADBController:
+    def __init__(self, device_name, transport=None):
+        self.device_name = device_name
+        self.adb = ADB_PATH
+        # Долгоживущее соединение с adb-сервером (None = только subprocess)
+        self.transport = transport if transport is not None else make_transport(device_name)
+        # Режим дампа UI (см. get_ui_dump)
+        self.dump_mode = "stream"
+        # Агент иерархии на устройстве, если установлен (иначе uiautomator dump)
+        self.agent = HierarchyAgent(self)
+        # Ожидание элементов по событиям UI (см. ui_wait)
+        self.waiter = UIWaiter(self)
+        # Поиск по скриншоту, когда иерархии нет (см. visual_locator)
+        self.visual = VisualLocator(self)
+        # Ввод текста: input text / куски / ADBKeyBoard для юникода
+        self.text_input = TextInput(self)
+        # Селекторы действий по языку устройства (язык читается один раз)
+        self.catalog = SelectorCatalog(self)
+        # Координаты элементов по последнему снимку - клик без дампа (см. coord_cache)
+        self.coords = CoordCache(self)
+
+    def close(self):
+        """Конец сессии: вернуть клавиатуру устройства, закрыть агент иерархии и поток событий UI"""
+        self.text_input.restore()
+        self.agent.close()
+        self.waiter.events.stop()
+
+    def run_shell(self, cmd, timeout=10):
+        """Выполнить shell команду"""
+        if not (METRICS.enabled or TRACE.enabled):
+            return self._run_shell(cmd, timeout)
+        start = time.perf_counter()
+        res = self._run_shell(cmd, timeout)
+        self._record_command(cmd, start, time.perf_counter(), res.returncode if res else None,
+                             len(res.stdout or "") if res else 0)
+        return res
+
+    def _record_command(self, cmd, start, end, rc, size):
+        kind = command_kind(cmd)
+        if TRACE.enabled:
+            TRACE.record(kind or cmd, "dump" if "uiautomator dump" in cmd else "adb", start, end,
+                         cmd=cmd[:200], rc=rc, bytes=size)
+        if not METRICS.enabled:
+            return
+        elapsed = end - start
+        METRICS.observe("adb_command_seconds", elapsed, kind=kind)
+        if rc is None:
+            METRICS.count("adb_command_timeouts_total", kind=kind)
+        METRICS.event("command", kind=kind, seconds=round(elapsed, 6), rc=rc)
+
+    def _run_shell(self, cmd, timeout):
+        if self.transport:
+            try:
+                return self.transport.shell(cmd, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                print(f"⚠️ Timeout команды: {cmd}")
+                return None
+            except AdbTransportError as e:
+                # Сервер недоступен или сессия сломалась - дальше работаем через процессы
+                print(f"⚠️ Сокетный транспорт недоступен ({e}), перехожу на adb subprocess")
+                self.transport = None
+
+        full_cmd = [self.adb, "-s", self.device_name, "shell"] + cmd.split()
+        try:
+            return subprocess.run(full_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️ Timeout команды: {cmd}")
+            return None
+
+    def tap(self, x, y):
+        """Клик по координатам"""
+        self.run_shell(f"input tap {x} {y}")
+        self.waiter.invalidate()
+
+    def text(self, text, verify=False, timeout=3):
+        """Ввод текста (способ выбирается по строке, см. TextInput). verify - проверить поле."""
+        return self.text_input.type(text, verify=verify, timeout=timeout)
+
+    def keyevent(self, keycode):
+        """Нажатие кнопки (66=ENTER, 67=BACKSPACE, 3=HOME)"""
+        self.run_shell(f"input keyevent {keycode}")
+        self.waiter.invalidate()
+
+    def batch(self):
+        """Пакет tap/keyevent/text за один shell вызов (см. InputBatch)"""
+        return InputBatch(self)
+
+    def exec_out(self, cmd, timeout=10):
+        """
+        Выполнить команду и получить сырой (бинарный) stdout и код возврата.
+        Возвращает (bytes, rc) или (None, None) при таймауте.
+        """
+        if not (METRICS.enabled or TRACE.enabled):
+            return self._exec_out(cmd, timeout)
+        start = time.perf_counter()
+        data, rc = self._exec_out(cmd, timeout)
+        self._record_command(cmd, start, time.perf_counter(), rc, len(data or b""))
+        return data, rc
+
+    def _exec_out(self, cmd, timeout):
+        if self.transport:
+            try:
+                return self.transport.exec_out(cmd, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                print(f"⚠️ Timeout команды: {cmd}")
+                return None, None
+            except AdbTransportError as e:
+                print(f"⚠️ Сокетный транспорт недоступен ({e}), перехожу на adb subprocess")
+                self.transport = None
+
+        # exec-out не отдает код возврата - печатаем его маркером в конце вывода
+        token = f"__RC_{uuid.uuid4().hex[:8]}__"
+        full_cmd = [self.adb, "-s", self.device_name, "exec-out", f"{cmd}; echo; echo {token} $?"]
+        try:
+            res = subprocess.run(full_cmd, capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️ Timeout команды: {cmd}")
+            return None, None
+        m = re.search(rb"\n" + token.encode() + rb" (\d+)\s*$", res.stdout)
+        if not m:
+            return res.stdout, res.returncode or None
+        return res.stdout[:m.start()], int(m.group(1))
+
+    def get_ui_dump(self):
+        """
+        Получить XML текущего экрана через uiautomator за один вызов.
+        "stream" - дамп сразу в stdout, "file" - дамп в файл и cat в той же команде.
+        Успех определяем по коду возврата, а не по тексту сообщения uiautomator.
+        """
+        if not TRACE.enabled:
+            return self._get_ui_dump()
+        with TRACE.span("get_ui_dump", "dump") as args:
+            xml = self._get_ui_dump()
+            # Дамп сохраняется в папку трассы - потом это фикстура для бенчмарка
+            args.update(bytes=len(xml), mode=self.dump_mode, fixture=TRACE.save_dump(xml))
+        return xml
+
+    def _get_ui_dump(self):
+        cmd = dump_command(self.dump_mode)
+
+        # Иногда uiautomator падает ("could not get idle state"), поэтому пробуем пару раз
+        malformed = 0
+        for _ in range(2):
+            data, rc = self.exec_out(cmd, timeout=15)
+            xml = decode_dump(data) if rc == 0 else ""
+            if METRICS.enabled:
+                METRICS.count("adb_dumps_total", mode=self.dump_mode, ok=bool(xml))
+                METRICS.count("adb_dump_bytes_total", len(data or b""), mode=self.dump_mode)
+            if xml:
+                return xml
+            # Команда прошла, а XML в выводе нет - это не сбой uiautomator, а режим
+            if rc == 0:
+                malformed += 1
+            TRACE.sleep(0.5, "повтор дампа")
+
+        if self.dump_mode == "stream" and malformed == 2:
+            # Прошивка не умеет писать дамп в stdout - переходим на файл
+            print("⚠️ Дамп в stdout не работает, перехожу на дамп через файл")
+            self.dump_mode = "file"
+            return self._get_ui_dump()
+        return ""
+
+    def screenshot(self):
+        """Сырой кадр экрана (visual_locator.Frame) или None"""
+        return self.visual.capture()
+
+    def focused_window(self):
+        """Окно в фокусе ("пакет/activity") - дешевая подпись экрана без дампа"""
+        res = self.run_shell("dumpsys window windows | grep mCurrentFocus", timeout=5)
+        if not res or not res.stdout:
+            return None
+        # mCurrentFocus=Window{3c1d8e5 u0 com.whatsapp/com.whatsapp.registration.EULA}
+        m = app_launch.FOCUS_RE.search(res.stdout)
+        return m.group(1) if m else res.stdout.strip()
+
+    def get_ui_tree(self):
+        """Снимок экрана, разобранный в UITree (у агента - без XML)"""
+        tree = self.agent.tree()
+        return tree if tree is not None else UITree.parse(self.get_ui_dump())
+
+    def find_all(self, selector):
+        """
+        Все элементы по селектору (строка UiSelector или словарь) из одного снимка.
+        Список словарей {x, y, bounds, node}.
+        """
+        return [node.as_element() for node in select(self.waiter.snapshot(), selector)]
+
+    def find_element(self, text=None, resource_id=None, class_name=None, index=0, **selector):
+        """
+        Ищет элемент в XML дампе.
+        Возвращает словарь {x, y, bounds, node} или None.
+        text - подстрока text (без учета регистра), resource_id/class_name - точно.
+        Остальные ключи селектора см. в ui_tree.
+        """
+        selector.update(text=text, resource_id=resource_id, class_name=class_name)
+        selector = {k: v for k, v in selector.items() if v is not None}
+
+        # Агент отдает только совпавшие узлы, без всей иерархии
+        found = self.agent.query([selector], limit=index + 1)
+        if found is not None:
+            return found[index].as_element() if len(found) > index else None
+
+        xml = self.get_ui_dump()
+        if not xml:
+            return None
+
+        if index == 0:
+            # Нужен только первый - разбираем дамп до первого совпадения
+            node = UITree.first(xml, **selector)
+        else:
+            node = UITree.parse(xml).get(index=index, **selector)
+        return node.as_element() if node else None
+
+    def find_any(self, selectors, timeout=0, op="find_any"):
+        """
+        Ищет первый сработавший селектор из списка.
+        Селектор - dict с ключами text / resource_id / class_name / index.
+        Один дамп на опрос проверяется всеми селекторами, таймаут общий.
+        Возвращает (selector, element) или None.
+        """
+        def match(tree):
+            for selector in selectors:
+                node = first_match(tree, selector)
+                if node:
+                    return selector, node.as_element()
+            return None
+
+        if not (METRICS.enabled or TRACE.enabled):
+            return self.waiter.wait(match, timeout)
+
+        start = time.perf_counter()
+        dumps_before = self.waiter.dumps
+        found = self.waiter.wait(match, timeout)
+        end = time.perf_counter()
+        if TRACE.enabled:
+            TRACE.record(op, "wait", start, end, timeout=timeout, dumps=self.waiter.dumps - dumps_before,
+                         selectors=[describe_selector(sel) for sel in selectors],
+                         matched=describe_selector(found[0]) if found else None)
+        if not METRICS.enabled:
+            return found
+        elapsed = end - start
+        outcome = "found" if found else "timeout"
+        METRICS.observe("adb_wait_seconds", elapsed, op=op, outcome=outcome)
+        if not found:
+            METRICS.count("adb_wait_timeouts_total", op=op)
+        METRICS.event("wait", op=op, outcome=outcome, seconds=round(elapsed, 6), timeout=timeout,
+                      dumps=self.waiter.dumps - dumps_before,
+                      selectors=[describe_selector(sel) for sel in selectors],
+                      matched=describe_selector(found[0]) if found else None)
+        return found
+
+    def click_any(self, selectors, timeout=10):
+        """Ждет любой из селекторов и кликает. Возвращает сработавший селектор или None."""
+        found = self._find_to_click(selectors, timeout, "click_any")
+        if found:
+            selector, el = found
+            print(f"✓ Клик по '{describe_selector(selector)}' ({el['x']}, {el['y']})")
+            self.tap(el['x'], el['y'])
+            return selector
+        print(f"⚠️ Ни один из {[describe_selector(sel) for sel in selectors]} не найден за {timeout} сек")
+        return None
+
+    def click_element(self, text=None, resource_id=None, timeout=10, **selector):
+        """Ждет элемент и кликает по нему"""
+        selector.update(text=text, resource_id=resource_id)
+        selector = {k: v for k, v in selector.items() if v is not None}
+        found = self._find_to_click([selector], timeout, "click_element")
+        if found:
+            _, el = found
+            print(f"✓ Клик по '{describe_selector(selector)}' ({el['x']}, {el['y']})")
+            self.tap(el['x'], el['y'])
+            return True
+        print(f"⚠️ Элемент '{describe_selector(selector)}' не найден за {timeout} сек")
+        return False
+
+    def _find_to_click(self, selectors, timeout, op):
+        """find_any для клика: сначала кэш координат (без дампа), найденное обычным поиском запоминается"""
+        # Последний снимок, даже если после него были наши tap/text - ключ кэша, запросов к устройству нет
+        before = self.waiter.last_snapshot(SNAPSHOT_MAX_AGE)
+        cached = self.coords.lookup(selectors, before)
+        if cached:
+            print(f"⚡ '{describe_selector(cached[0])}' из кэша координат")
+            return cached
+        found = self.find_any(selectors, timeout=timeout, op=op)
+        if found:
+            self.coords.store(found[0], found[1], before)
+        return found
+
+    def wait_for_element(self, text=None, resource_id=None, class_name=None, timeout=20, **selector):
+        """Ждет появления элемента"""
+        selector.update(text=text, resource_id=resource_id, class_name=class_name)
+        selector = {k: v for k, v in selector.items() if v is not None}
+        return self.find_any([selector], timeout=timeout, op="wait_for_element") is not None
@@ -0,0 +1,210 @@
+import base64
+import re
+
+from session_trace import TRACE
+
+# ==========================================
+# ПАКЕТНЫЙ ВВОД (tap / keyevent / text за один вызов)
+# ==========================================
+
+STEP_MARKER = "__STEP__"
+STEP_RE = re.compile(STEP_MARKER + r" (\d+) (\d+)")
+
+# `input text` на длинной строке теряет символы - режем на куски
+TEXT_CHUNK = 80
+
+# ADBKeyBoard (https://github.com/senzhk/ADBKeyBoard) - ввод юникода бродкастом
+ADB_KEYBOARD_IME = "com.android.adbkeyboard/.AdbIME"
+
+
+def escape_text(text):
+    """
+    Аргумент для `input text`: пробел -> %s (так его понимает input),
+    остальное в одинарных кавычках, чтобы & ( ; $ и т.п. не трогал shell.
+    """
+    return "'" + text.replace("'", "'\\''").replace(" ", "%s") + "'"
+
+
+def text_commands(text, chunk=TEXT_CHUNK):
+    """Команды `input text` для ASCII-строки (длинная - кусками)"""
+    return [f"input text {escape_text(text[i:i + chunk])}" for i in range(0, len(text), chunk)]
+
+
+def _normalize(text):
+    # Поля часто форматируют ввод ("+7 912 345-67-89") - сравниваем только буквы и цифры
+    return "".join(ch for ch in text.casefold() if ch.isalnum())
+
+
+class TextInput:
+    """
+    Ввод текста самым быстрым корректным способом:
+      input   - ASCII, одна команда `input text`
+      chunked - длинный ASCII, куски через && в одном вызове
+      ime     - не ASCII (кириллица, эмодзи): бродкаст в ADBKeyBoard, текст в base64
+    Проверка - по полю в фокусе на следующем снимке UIWaiter (тот же снимок
+    потом получает следующий шаг, лишнего дампа нет).
+    """
+
+    def __init__(self, adb):
+        self.adb = adb
+        # None - еще не проверяли, установлен ли ADBKeyBoard
+        self.ime_ready = None
+        # Клавиатура, которая была до ADBKeyBoard (вернуть в restore)
+        self.previous_ime = None
+
+    def plan(self, text):
+        """(method, commands) для строки; commands пустой, если ввести нельзя"""
+        if text.isascii():
+            commands = text_commands(text)
+            return ("input" if len(commands) <= 1 else "chunked"), commands
+        if self.ensure_ime():
+            b64 = base64.b64encode(text.encode("utf-8")).decode("ascii")
+            return "ime", [f"am broadcast -a ADB_INPUT_B64 --es msg {b64}"]
+        return "unsupported", []
+
+    def ensure_ime(self):
+        """Включить ADBKeyBoard, если он установлен (проверяется один раз); прежняя клавиатура - в restore"""
+        if self.ime_ready is None:
+            res = self.adb.run_shell("ime list -a -s", timeout=5)
+            self.ime_ready = bool(res and ADB_KEYBOARD_IME in (res.stdout or ""))
+            if self.ime_ready:
+                res = self.adb.run_shell("settings get secure default_input_method", timeout=5)
+                current = (res.stdout or "").strip() if res else ""
+                if current and current != "null" and current != ADB_KEYBOARD_IME:
+                    self.previous_ime = current
+                self.adb.run_shell(f"ime enable {ADB_KEYBOARD_IME};ime set {ADB_KEYBOARD_IME}", timeout=5)
+                # Клавиатуре нужно время, чтобы подключиться к полю
+                TRACE.sleep(0.5, "подключение ADBKeyBoard")
+            else:
+                print("⚠️ ADBKeyBoard не установлен - не-ASCII текст ввести нельзя")
+        return self.ime_ready
+
+    def restore(self):
+        """Вернуть клавиатуру, которая была до ADBKeyBoard (конец сессии)"""
+        if self.previous_ime is None:
+            return
+        self.adb.run_shell(f"ime set {self.previous_ime}", timeout=5)
+        print(f"⌨️ Клавиатура возвращена: {self.previous_ime}")
+        self.previous_ime = None
+        self.ime_ready = None
+
+    def type(self, text, verify=False, timeout=3):
+        """
+        Ввести текст в поле в фокусе. verify=True - дождаться текста в поле
+        (по снимкам UIWaiter). Возвращает True/False.
+        """
+        method, commands = self.plan(text)
+        if not commands:
+            return not text
+        res = self.adb.run_shell(" && ".join(commands), timeout=10 + 2 * len(commands))
+        self.adb.waiter.invalidate()
+        if not res or res.returncode not in (0, None):
+            print(f"⚠️ Ввод текста ({method}) не выполнился")
+            return False
+        if not verify:
+            return True
+        if self.adb.waiter.wait(lambda tree: self.field_has(tree, text), timeout) is None:
+            focused = self.adb.waiter.tree.focused() if self.adb.waiter.tree else None
+            print(f"⚠️ Текст не появился в поле ({method}): {focused.text if focused else 'нет поля в фокусе'!r}")
+            return False
+        return True
+
+    @staticmethod
+    def field_has(tree, text):
+        node = tree.focused()
+        return bool(node) and _normalize(text) in _normalize(node.text)
+
+
+class InputBatch:
+    """
+    Собирает последовательность tap/keyevent/text/pause и отправляет ее
+    одной shell-командой. Подряд идущие keyevent склеиваются в один
+    `input keyevent 67 67 67`. После каждой команды печатается код возврата,
+    поэтому результат известен по каждому шагу.
+
+        with adb.batch() as b:
+            b.tap(100, 200).pause(0.5).keyevent(67, repeat=5).text("7")
+        b.results  # [{'step': 'tap', 'args': (100, 200), 'rc': 0, 'ok': True}, ...]
+    """
+
+    def __init__(self, adb):
+        self.adb = adb
+        self.steps = []
+        self.results = None
+
+    def tap(self, x, y):
+        self.steps.append(("tap", (x, y)))
+        return self
+
+    def keyevent(self, keycode, repeat=1):
+        for _ in range(repeat):
+            self.steps.append(("keyevent", (keycode,)))
+        return self
+
+    def text(self, text):
+        self.steps.append(("text", (text,)))
+        return self
+
+    def pause(self, seconds):
+        """Пауза на устройстве (без лишнего round trip)"""
+        self.steps.append(("pause", (seconds,)))
+        return self
+
+    def build(self):
+        """
+        Строит скрипт. Возвращает (script, groups), где groups - списки
+        индексов шагов, выполняемых одной командой.
+        """
+        commands = []
+        groups = []
+        for i, (kind, args) in enumerate(self.steps):
+            if kind == "keyevent" and groups and self.steps[groups[-1][-1]][0] == "keyevent":
+                commands[-1] += f" {args[0]}"
+                groups[-1].append(i)
+                continue
+            if kind == "tap":
+                commands.append(f"input tap {args[0]} {args[1]}")
+            elif kind == "keyevent":
+                commands.append(f"input keyevent {args[0]}")
+            elif kind == "text":
+                _, text_cmds = self.adb.text_input.plan(args[0])
+                # Пустая строка - ничего не делаем, невводимая - шаг с ошибкой
+                commands.append(" && ".join(text_cmds) or ("false" if args[0] else "true"))
+            elif kind == "pause":
+                commands.append(f"sleep {args[0]}")
+            groups.append([i])
+        script = ";".join(f"{cmd};echo {STEP_MARKER} {n} $?" for n, cmd in enumerate(commands))
+        return script, groups
+
+    def run(self):
+        """Выполнить накопленные шаги. Возвращает результат по каждому шагу."""
+        if not self.steps:
+            self.results = []
+            return self.results
+
+        script, groups = self.build()
+        pauses = sum(args[0] for kind, args in self.steps if kind == "pause")
+        res = self.adb.run_shell(script, timeout=10 + pauses)
+        self.adb.waiter.invalidate()
+
+        codes = {}
+        if res and res.stdout:
+            for n, rc in STEP_RE.findall(res.stdout):
+                codes[int(n)] = int(rc)
+
+        self.results = []
+        for n, group in enumerate(groups):
+            rc = codes.get(n)
+            for i in group:
+                kind, args = self.steps[i]
+                self.results.append({"step": kind, "args": args, "rc": rc, "ok": rc == 0})
+        self.steps = []
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.run()
+        return False
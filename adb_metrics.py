@@ -0,0 +1,172 @@
+import atexit
+import cProfile
+import http.server
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# ==========================================
+# МЕТРИКИ ГОРЯЧИХ ПУТЕЙ ADB
+# ==========================================
+#
+# Включается переменными окружения (по умолчанию выключено, накладные
+# расходы - одна проверка METRICS.enabled):
+#   ADB_METRICS_FILE=metrics.jsonl   - каждое событие строкой JSON
+#   ADB_METRICS_PROM=metrics.prom    - Prometheus text format (перезаписывается)
+#   ADB_METRICS_PORT=9108            - Prometheus endpoint http://127.0.0.1:9108/metrics
+#   ADB_PROFILE=cprofile|tracemalloc - профилирование всего прогона
+#   ADB_PROFILE_OUT=adb_profile      - куда сохранить профиль (.prof / .txt)
+
+
+def command_kind(cmd):
+    """Вид команды для меток: "input tap", "uiautomator dump", "dumpsys", ..."""
+    words = cmd.split()
+    if not words:
+        return ""
+    if ";" in cmd:
+        # Склеенный скрипт (InputBatch и т.п.)
+        return f"script {words[0]}"
+    if words[0] in ("input", "am", "pm", "uiautomator", "settings") and len(words) > 1:
+        return f"{words[0]} {words[1]}"
+    return words[0]
+
+
+def _labels(labels):
+    return ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " "))
+                    for k, v in sorted(labels.items()))
+
+
+class Metrics:
+    def __init__(self, jsonl_path=None, prom_path=None, port=None):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.port = port
+        self.enabled = bool(jsonl_path or prom_path or port)
+        self.lock = threading.Lock()
+        # (name, labels) -> [count, sum, max]
+        self.summaries = {}
+        # (name, labels) -> value
+        self.counters = {}
+        self.jsonl = None
+        self.server = None
+        if self.enabled:
+            self._start()
+
+    @classmethod
+    def from_env(cls):
+        port = os.getenv("ADB_METRICS_PORT")
+        return cls(os.getenv("ADB_METRICS_FILE"), os.getenv("ADB_METRICS_PROM"), int(port) if port else None)
+
+    def _start(self):
+        if self.jsonl_path:
+            self.jsonl = open(self.jsonl_path, "a", encoding="utf-8", buffering=1)
+        if self.port:
+            self._serve(self.port)
+        atexit.register(self.flush)
+
+    # --- запись ---
+
+    def observe(self, name, seconds, **labels):
+        """Длительность операции (сек) -> count/sum/max в Prometheus"""
+        key = (name, _labels(labels))
+        with self.lock:
+            s = self.summaries.setdefault(key, [0, 0.0, 0.0])
+            s[0] += 1
+            s[1] += seconds
+            s[2] = max(s[2], seconds)
+
+    def count(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def event(self, event_type, /, **fields):
+        """Событие в JSON-lines"""
+        if self.jsonl:
+            line = json.dumps({"ts": round(time.time(), 4), "type": event_type, **fields}, ensure_ascii=False, default=str)
+            with self.lock:
+                self.jsonl.write(line + "\n")
+
+    # --- экспорт ---
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            summaries = dict(self.summaries)
+            counters = dict(self.counters)
+        for name in sorted({n for n, _ in summaries}):
+            rows = [(labels, value) for (n, labels), value in sorted(summaries.items()) if n == name]
+            lines.append(f"# TYPE {name} summary")
+            for labels, (count, total, _) in rows:
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}_count{suffix} {count}")
+                lines.append(f"{name}_sum{suffix} {total:.6f}")
+            # Максимум - не часть summary, отдельная метрика-gauge
+            lines.append(f"# TYPE {name}_max gauge")
+            for labels, (_, _, peak) in rows:
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}_max{suffix} {peak:.6f}")
+        for name in sorted({n for n, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        if self.prom_path:
+            tmp = self.prom_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.replace(tmp, self.prom_path)
+        if self.jsonl:
+            self.jsonl.flush()
+
+    def _serve(self, port):
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode("utf-8")
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"📈 Метрики: http://127.0.0.1:{port}/metrics")
+
+
+def start_profiling():
+    """ADB_PROFILE=cprofile|tracemalloc: профиль всего прогона, сохраняется при выходе"""
+    mode = (os.getenv("ADB_PROFILE") or "").lower()
+    out = os.getenv("ADB_PROFILE_OUT") or "adb_profile"
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def save():
+            profiler.disable()
+            profiler.dump_stats(out + ".prof")
+            print(f"🧪 cProfile: {out}.prof")
+        atexit.register(save)
+    elif mode == "tracemalloc":
+        tracemalloc.start(25)
+
+        def save():
+            top = tracemalloc.take_snapshot().statistics("lineno")[:30]
+            with open(out + ".txt", "w", encoding="utf-8") as f:
+                f.write("\n".join(str(stat) for stat in top) + "\n")
+            print(f"🧪 tracemalloc: {out}.txt")
+        atexit.register(save)
+
+
+METRICS = Metrics.from_env()
@@ -0,0 +1,210 @@
+import os
+import re
+import socket
+import subprocess
+import threading
+import uuid
+
+# ==========================================
+# ТРАНСПОРТ ДО ADB-СЕРВЕРА
+# ==========================================
+#
+# Вместо `adb -s <dev> shell ...` на каждую команду держим одно долгоживущее
+# соединение с adb-сервером (smart-socket протокол, порт 5037) и в нем
+# интерактивный `sh`. Команды пишем в stdin, конец вывода и код возврата
+# определяем по маркеру, который печатаем после каждой команды.
+
+# Путь к ADB (для Windows с MEMU)
+ADB_PATH = os.getenv("ADB_PATH") or r"C:\Program Files\Microvirt\MEmu\adb.exe"
+ADB_SERVER_HOST = os.getenv("ADB_SERVER_HOST") or "127.0.0.1"
+ADB_SERVER_PORT = int(os.getenv("ADB_SERVER_PORT") or 5037)
+
+
+class AdbTransportError(Exception):
+    """Ошибка протокола или соединения с adb-сервером"""
+
+
+def encode_request(payload: str) -> bytes:
+    """Запрос smart-socket протокола: 4 hex-символа длины + payload"""
+    data = payload.encode("utf-8")
+    return b"%04x" % len(data) + data
+
+
+def frame_command(cmd: str, token: str) -> str:
+    """
+    Оборачивает команду для выполнения в общей sh-сессии.
+    stdin отрезаем, чтобы команда не съела следующие команды сессии.
+    """
+    return f"( {cmd} ) </dev/null 2>/dev/null; __rc=$?; echo; echo {token} $__rc\n"
+
+
+# Используется и фейковым сервером, чтобы вытащить команду и маркер из кадра
+FRAME_RE = re.compile(r"^\( (?P<cmd>.*) \) </dev/null 2>/dev/null; __rc=\$\?; echo; echo (?P<token>\S+) \$__rc$")
+
+
+def recv_exact(sock, size):
+    """Читает ровно size байт из сокета"""
+    buf = b""
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise AdbTransportError("adb-сервер закрыл соединение")
+        buf += chunk
+    return buf
+
+
+def read_status(sock):
+    """Читает OKAY/FAIL после запроса"""
+    status = recv_exact(sock, 4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        length = int(recv_exact(sock, 4), 16)
+        message = recv_exact(sock, length).decode("utf-8", errors="ignore")
+        raise AdbTransportError(message)
+    raise AdbTransportError(f"Неожиданный ответ adb-сервера: {status!r}")
+
+
+def open_service(serial, service, timeout=10, host=None, port=None):
+    """
+    Открывает соединение с adb-сервером, переключает его на устройство
+    и запрашивает сервис (shell:..., exec:...). Возвращает сокет.
+    """
+    try:
+        sock = socket.create_connection((host or ADB_SERVER_HOST, port or ADB_SERVER_PORT), timeout=timeout)
+    except OSError as e:
+        raise AdbTransportError(f"adb-сервер недоступен: {e}") from e
+    try:
+        sock.sendall(encode_request(f"host:transport:{serial}"))
+        read_status(sock)
+        sock.sendall(encode_request(service))
+        read_status(sock)
+    except socket.timeout:
+        sock.close()
+        raise
+    except AdbTransportError:
+        sock.close()
+        raise
+    except OSError as e:
+        # Сброс соединения на рукопожатии (adbd перезапускается) - как недоступный транспорт
+        sock.close()
+        raise AdbTransportError(f"{service}: {e}") from e
+    return sock
+
+
+def host_request(service, timeout=10, host=None, port=None):
+    """
+    Разовый host-сервис (host:connect:..., host:devices): ответ adb-сервера
+    строкой (4 hex-символа длины + payload).
+    """
+    try:
+        sock = socket.create_connection((host or ADB_SERVER_HOST, port or ADB_SERVER_PORT), timeout=timeout)
+    except OSError as e:
+        raise AdbTransportError(f"adb-сервер недоступен: {e}") from e
+    try:
+        sock.sendall(encode_request(service))
+        read_status(sock)
+        length = int(recv_exact(sock, 4), 16)
+        return recv_exact(sock, length).decode("utf-8", errors="ignore")
+    except OSError as e:
+        raise AdbTransportError(str(e)) from e
+    finally:
+        sock.close()
+
+
+class AdbShellSession:
+    """Долгоживущая sh-сессия на устройстве поверх одного соединения с adb-сервером"""
+
+    def __init__(self, serial, host=None, port=None):
+        self.serial = serial
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.buffer = b""
+        self.lock = threading.Lock()
+
+    def connect(self, timeout=10):
+        self.close()
+        self.sock = open_service(self.serial, "shell:sh", timeout=timeout, host=self.host, port=self.port)
+        self.buffer = b""
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+
+    def run(self, cmd, timeout=10):
+        """
+        Выполняет команду в сессии. Возвращает (stdout bytes, код возврата).
+        При таймауте сессия закрывается (вывод рассинхронизирован) и
+        пробрасывается socket.timeout.
+        """
+        with self.lock:
+            token = f"__ADB_RC_{uuid.uuid4().hex[:12]}__"
+            marker = re.compile(rb"\n" + token.encode() + rb" (\d+)\r?\n")
+            try:
+                if self.sock is None:
+                    self.connect(timeout=timeout)
+                self.sock.settimeout(timeout)
+                self.sock.sendall(frame_command(cmd, token).encode("utf-8"))
+                while True:
+                    m = marker.search(self.buffer)
+                    if m:
+                        out = self.buffer[:m.start()]
+                        self.buffer = self.buffer[m.end():]
+                        return out, int(m.group(1))
+                    chunk = self.sock.recv(65536)
+                    if not chunk:
+                        raise AdbTransportError("sh-сессия закрыта устройством")
+                    self.buffer += chunk
+            except socket.timeout:
+                self.close()
+                raise
+            except (OSError, AdbTransportError):
+                self.close()
+                raise AdbTransportError(f"Сессия {self.serial} оборвалась")
+
+
+class SocketTransport:
+    """
+    Транспорт ADBController через adb-сервер.
+    Результат совместим с subprocess.run (CompletedProcess), stderr не сохраняется.
+    """
+
+    def __init__(self, serial, host=None, port=None):
+        self.serial = serial
+        self.session = AdbShellSession(serial, host=host, port=port)
+
+    def shell(self, cmd, timeout=10):
+        try:
+            out, rc = self.session.run(cmd, timeout=timeout)
+        except socket.timeout:
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        return subprocess.CompletedProcess(cmd, rc, out.decode("utf-8", errors="ignore"), "")
+
+    def exec_out(self, cmd, timeout=10):
+        """Бинарный вывод команды без декодирования: (bytes, код возврата)"""
+        try:
+            return self.session.run(cmd, timeout=timeout)
+        except socket.timeout:
+            raise subprocess.TimeoutExpired(cmd, timeout)
+
+    def open_stream(self, service, timeout=10):
+        """Отдельное соединение под потоковый сервис (logcat, events...)"""
+        return open_service(self.serial, service, timeout=timeout, host=self.session.host, port=self.session.port)
+
+    def close(self):
+        self.session.close()
+
+
+def make_transport(serial, host=None, port=None):
+    """
+    Транспорт по умолчанию. ADB_TRANSPORT=subprocess отключает сокетный
+    транспорт (тогда ADBController работает как раньше, через процессы adb).
+    """
+    if (os.getenv("ADB_TRANSPORT") or "socket").lower() == "subprocess":
+        return None
+    return SocketTransport(serial, host=host, port=port)
@@ -0,0 +1,139 @@
+import re
+import time
+
+import flow_budget
+from adb_metrics import METRICS
+from session_trace import TRACE
+
+# ==========================================
+# ЗАПУСК ПРИЛОЖЕНИЙ И ГОТОВНОСТЬ ACTIVITY
+# ==========================================
+#
+# Вместо "am start + sleep(3)" и "клик + sleep(1) на анимацию":
+#   launch        - `am start -W`: возвращается, когда activity отрисована,
+#                   и сообщает время запуска (TotalTime, холодный/теплый старт)
+#   wait_activity - ждет, пока нужный пакет/activity в фокусе и переход окон закончен
+#   wait_idle     - ждет конца перехода окон (mAppTransitionState) и стабильного фокуса
+# Фокус и состояние перехода - один `dumpsys window | grep` на опрос.
+#
+#     info = launch(adb, "com.whatsapp/.Main")   # {"ok", "activity", "total_ms", "state", ...}
+#     wait_activity(adb, "org.proxydroid", timeout=5)
+
+PROBE_CMD = "dumpsys window | grep -E 'mCurrentFocus|mFocusedApp|mAppTransitionState'"
+
+FOCUS_RE = re.compile(r"mCurrentFocus=Window\{\S+ \S+ ([^}\s]+)\}")
+FOCUSED_APP_RE = re.compile(r"mFocusedApp=.*?ActivityRecord\{\S+ \S+ ([^}\s]+)")
+TRANSITION_RE = re.compile(r"mAppTransitionState=(\w+)")
+AM_START_RE = re.compile(r"^(Status|Activity|ThisTime|TotalTime|WaitTime|LaunchState|Error):\s*(.*)$", re.MULTILINE)
+
+# Переход окон закончен (на старых прошивках поля нет - считаем, что закончен)
+IDLE_TRANSITIONS = ("APP_STATE_IDLE", "APP_STATE_TIMEOUT", None)
+
+POLL_START = 0.1
+POLL_MAX = 0.5
+
+
+def parse_am_start(output):
+    """Вывод `am start -W` -> {"status", "activity", "total_ms", "wait_ms", "state", "error"}"""
+    fields = dict(AM_START_RE.findall(output or ""))
+    total = fields.get("TotalTime") or fields.get("ThisTime")
+    return {
+        "status": fields.get("Status"),
+        "activity": fields.get("Activity"),
+        "total_ms": int(total) if total and total.isdigit() else None,
+        "wait_ms": int(fields["WaitTime"]) if fields.get("WaitTime", "").isdigit() else None,
+        "state": (fields.get("LaunchState") or "").lower() or None,
+        "error": fields.get("Error"),
+    }
+
+
+def parse_probe(output):
+    """Вывод PROBE_CMD -> (окно в фокусе, activity в фокусе, состояние перехода)"""
+    output = output or ""
+    focus = FOCUS_RE.search(output)
+    app = FOCUSED_APP_RE.search(output)
+    transition = TRANSITION_RE.search(output)
+    return (focus.group(1) if focus else None, app.group(1) if app else None,
+            transition.group(1) if transition else None)
+
+
+def probe(adb):
+    res = adb.run_shell(PROBE_CMD, timeout=5)
+    return parse_probe(res.stdout if res else "")
+
+
+def _poll(condition, timeout):
+    """condition() -> значение или None; опрос с нарастающим интервалом в пределах бюджета фазы"""
+    deadline = time.time() + flow_budget.cap(timeout)
+    interval = POLL_START
+    while True:
+        result = condition()
+        if result:
+            return result
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        TRACE.sleep(flow_budget.poll_interval(interval, remaining), "запуск приложения")
+        interval = min(interval * 2, POLL_MAX)
+
+
+def _matches(name, target):
+    return bool(name) and (name == target or name.startswith(target + "/") or name.startswith(target + "."))
+
+
+def wait_activity(adb, target, timeout=10):
+    """
+    Ждет, пока target (пакет или "пакет/.Activity") в фокусе и переход окон закончен.
+    Возвращает activity в фокусе или None по таймауту.
+    """
+    def ready():
+        focus, app, transition = probe(adb)
+        if transition in IDLE_TRANSITIONS and (_matches(app, target) or _matches(focus, target)):
+            return app or focus
+        return None
+
+    started = time.time()
+    activity = _poll(ready, timeout)
+    if METRICS.enabled:
+        METRICS.observe("app_activity_wait_seconds", time.time() - started, target=target, found=bool(activity))
+    return activity
+
+
+def wait_idle(adb, timeout=2):
+    """Ждет конца анимации перехода: переход окон idle и фокус не менялся между опросами"""
+    last = {}
+
+    def idle():
+        focus, app, transition = probe(adb)
+        stable = last.get("focus", ()) == (focus, app)
+        last["focus"] = (focus, app)
+        return transition in IDLE_TRANSITIONS and stable
+
+    return bool(_poll(idle, timeout))
+
+
+def launch(adb, component, timeout=20):
+    """
+    `am start -W -n component`: ждет отрисовки activity и пишет время запуска.
+    Если -W не дал ответа (старый am, таймаут) - ждем фокус пакета опросом.
+    """
+    package = component.split("/", 1)[0]
+    started = time.time()
+    res = adb.run_shell(f"am start -W -n {component}", timeout=flow_budget.cap(timeout) or 1)
+    info = parse_am_start(res.stdout if res else "")
+    info["ok"] = info["status"] == "ok" and not info["error"]
+    if not info["ok"]:
+        info["activity"] = wait_activity(adb, package, timeout=max(timeout - (time.time() - started), 0))
+        info["ok"] = info["activity"] is not None
+    info["seconds"] = time.time() - started
+
+    if info["ok"]:
+        launch_time = f"{info['total_ms']} мс" if info["total_ms"] is not None else f"{info['seconds']:.1f} сек"
+        print(f"🚀 {component} запущен за {launch_time}" + (f" ({info['state']})" if info["state"] else ""))
+    else:
+        print(f"⚠️ {component} не запустился за {timeout} сек: {info['error'] or info['status']}")
+    if METRICS.enabled:
+        METRICS.observe("app_launch_seconds", info["seconds"], component=component, state=info["state"] or "")
+        METRICS.event("launch", component=component, ok=info["ok"], total_ms=info["total_ms"],
+                      wait_ms=info["wait_ms"], state=info["state"], seconds=round(info["seconds"], 3))
+    return info
@@ -0,0 +1,326 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import uuid
+
+from adb_input import escape_text
+from adb_transport import ADB_PATH, ADB_SERVER_HOST, ADB_SERVER_PORT, AdbTransportError, encode_request, frame_command
+from ui_dump import decode_dump, dump_command
+from ui_selector import first_match
+from ui_tree import UITree
+from ui_wait import POLL_MAX, POLL_MIN
+
+# ==========================================
+# ASYNCIO ADB CONTROLLER
+# ==========================================
+#
+# Тот же API, что у ADBController (tap, text, keyevent, get_ui_dump,
+# find_element, wait_for_element, click_element, find_any), но на asyncio:
+# ожидание элементов не блокирует HTTP-запросы и наоборот.
+# Таймауты через asyncio.wait_for: отмена корректно закрывает сессию.
+#
+#     adb = AsyncADBController("127.0.0.1:21503")
+#     code, _ = await asyncio.gather(
+#         asyncio.to_thread(wait_for_voice_call_code, phone),
+#         adb.click_element(text="Not now", timeout=30))
+#
+# Для синхронного кода - BlockingADBController (свой event loop в потоке),
+# а для блокирующего HTTP посреди сценария main.py - wait_dismissing:
+#
+#     call_result = wait_dismissing(adb, wait_for_voice_call_code, phone,
+#                                   selectors=adb.catalog.selectors("not_now"))
+
+
+async def _read_status(reader):
+    status = await reader.readexactly(4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        length = int(await reader.readexactly(4), 16)
+        raise AdbTransportError((await reader.readexactly(length)).decode("utf-8", errors="ignore"))
+    raise AdbTransportError(f"Неожиданный ответ adb-сервера: {status!r}")
+
+
+async def open_service(serial, service, host=None, port=None):
+    """asyncio-версия adb_transport.open_service: (reader, writer)"""
+    try:
+        reader, writer = await asyncio.open_connection(host or ADB_SERVER_HOST, port or ADB_SERVER_PORT)
+    except OSError as e:
+        raise AdbTransportError(f"adb-сервер недоступен: {e}") from e
+    try:
+        writer.write(encode_request(f"host:transport:{serial}"))
+        await _read_status(reader)
+        writer.write(encode_request(service))
+        await _read_status(reader)
+    except (OSError, asyncio.IncompleteReadError, AdbTransportError) as e:
+        writer.close()
+        raise AdbTransportError(str(e)) from e
+    return reader, writer
+
+
+class AsyncShellSession:
+    """Долгоживущая sh-сессия (тот же формат кадров, что в adb_transport)"""
+
+    def __init__(self, serial, host=None, port=None):
+        self.serial = serial
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def run(self, cmd, timeout=10):
+        """(stdout bytes, rc). При таймауте/отмене сессия закрывается."""
+        async with self.lock:
+            try:
+                return await asyncio.wait_for(self._run(cmd), timeout)
+            except asyncio.TimeoutError:
+                self.close()
+                raise
+            except asyncio.CancelledError:
+                # Ответ на отмененную команду придет в сокет позже - сессию не переиспользуем
+                self.close()
+                raise
+            except AdbTransportError:
+                # Сессия закрыта устройством/сервером - следующая команда откроет новую
+                self.close()
+                raise
+            except (OSError, asyncio.IncompleteReadError) as e:
+                self.close()
+                raise AdbTransportError(f"Сессия {self.serial} оборвалась: {e}") from e
+
+    async def _run(self, cmd):
+        if self.writer is None:
+            self.reader, self.writer = await open_service(self.serial, "shell:sh", self.host, self.port)
+        token = f"__ADB_RC_{uuid.uuid4().hex[:12]}__"
+        self.writer.write(frame_command(cmd, token).encode("utf-8"))
+        await self.writer.drain()
+        marker = re.compile(rb"\n" + token.encode() + rb" (\d+)\r?\n")
+        buf = b""
+        while True:
+            m = marker.search(buf)
+            if m:
+                return buf[:m.start()], int(m.group(1))
+            chunk = await self.reader.read(65536)
+            if not chunk:
+                raise AdbTransportError("sh-сессия закрыта устройством")
+            buf += chunk
+
+
+class AsyncADBController:
+    def __init__(self, device_name, adb_path=None, host=None, port=None, dump_mode="stream", agent=None):
+        self.device_name = device_name
+        self.adb = adb_path or ADB_PATH
+        # Режим дампа UI ("stream"/"file", см. ADBController.get_ui_dump) - от синхронного
+        # контроллера, если он уже выяснил, что stdout на этой прошивке не работает
+        self.dump_mode = dump_mode
+        # HierarchyAgent синхронного контроллера (его запросы - в отдельном потоке)
+        self.agent = agent
+        self.session = AsyncShellSession(device_name, host=host, port=port)
+        self.use_socket = True
+        self.tree = None
+        self.dump_hash = None
+        self.dumps = 0
+
+    async def close(self):
+        self.session.close()
+
+    async def exec_out(self, cmd, timeout=10):
+        """(bytes, rc) или (None, None) при таймауте"""
+        if self.use_socket:
+            try:
+                return await self.session.run(cmd, timeout=timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Timeout команды: {cmd}")
+                return None, None
+            except AdbTransportError as e:
+                print(f"⚠️ Сокетный транспорт недоступен ({e}), перехожу на adb subprocess")
+                self.use_socket = False
+
+        token = f"__RC_{uuid.uuid4().hex[:8]}__"
+        proc = await asyncio.create_subprocess_exec(
+            self.adb, "-s", self.device_name, "exec-out", f"{cmd}; echo; echo {token} $?",
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            proc.kill()
+            await proc.wait()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            print(f"⚠️ Timeout команды: {cmd}")
+            return None, None
+        m = re.search(rb"\n" + token.encode() + rb" (\d+)\s*$", out)
+        if not m:
+            return out, proc.returncode or None
+        return out[:m.start()], int(m.group(1))
+
+    async def run_shell(self, cmd, timeout=10):
+        """Выполнить shell команду. Возвращает stdout (str) или None при таймауте."""
+        out, rc = await self.exec_out(cmd, timeout=timeout)
+        return None if rc is None else out.decode("utf-8", errors="ignore")
+
+    async def tap(self, x, y):
+        await self.run_shell(f"input tap {x} {y}")
+        self.tree = None
+
+    async def text(self, text):
+        await self.run_shell(f"input text {escape_text(text)}")
+        self.tree = None
+
+    async def keyevent(self, keycode):
+        await self.run_shell(f"input keyevent {keycode}")
+        self.tree = None
+
+    async def get_ui_dump(self):
+        """XML экрана; при битом выводе в stdout - переход на дамп через файл (как в ADBController)"""
+        malformed = 0
+        for _ in range(2):
+            data, rc = await self.exec_out(dump_command(self.dump_mode), timeout=15)
+            xml = decode_dump(data) if rc == 0 else ""
+            if xml:
+                return xml
+            if rc == 0:
+                malformed += 1
+            await asyncio.sleep(0.5)
+        if self.dump_mode == "stream" and malformed == 2:
+            print("⚠️ Дамп в stdout не работает, перехожу на дамп через файл")
+            self.dump_mode = "file"
+            return await self.get_ui_dump()
+        return ""
+
+    async def get_ui_tree(self):
+        """Снимок экрана (у агента - без XML); неизменившийся дамп повторно не разбирается"""
+        if self.agent is not None and self.agent.enabled:
+            tree = await asyncio.to_thread(self.agent.tree)
+            if tree is not None:
+                self.dumps += 1
+                self.tree = tree
+                return tree
+        xml = await self.get_ui_dump()
+        self.dumps += 1
+        dump_hash = hashlib.md5(xml.encode("utf-8", errors="ignore")).digest()
+        if self.tree is None or dump_hash != self.dump_hash:
+            self.tree = UITree.parse(xml)
+            self.dump_hash = dump_hash
+        return self.tree
+
+    async def find_element(self, text=None, resource_id=None, class_name=None, index=0, **selector):
+        selector.update(text=text, resource_id=resource_id, class_name=class_name)
+        selector = {k: v for k, v in selector.items() if v is not None}
+        node = (await self.get_ui_tree()).get(index=index, **selector)
+        return node.as_element() if node else None
+
+    async def find_any(self, selectors, timeout=0):
+        """(selector, element) или None; опрос с нарастающим интервалом, таймаут общий"""
+        deadline = time.time() + timeout
+        interval = POLL_MIN
+        while True:
+            tree = await self.get_ui_tree()
+            for selector in selectors:
+                node = first_match(tree, selector)
+                if node:
+                    return selector, node.as_element()
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 2, POLL_MAX)
+
+    async def wait_for_element(self, text=None, resource_id=None, class_name=None, timeout=20, **selector):
+        selector.update(text=text, resource_id=resource_id, class_name=class_name)
+        selector = {k: v for k, v in selector.items() if v is not None}
+        return await self.find_any([selector], timeout=timeout) is not None
+
+    async def click_element(self, text=None, resource_id=None, timeout=10, **selector):
+        selector.update(text=text, resource_id=resource_id)
+        selector = {k: v for k, v in selector.items() if v is not None}
+        found = await self.find_any([selector], timeout=timeout)
+        if found:
+            _, el = found
+            print(f"✓ Клик по '{text or resource_id}' ({el['x']}, {el['y']})")
+            await self.tap(el['x'], el['y'])
+            return True
+        print(f"⚠️ Элемент '{text or resource_id}' не найден за {timeout} сек")
+        return False
+
+
+async def dismiss_while(adb, awaitable, selectors, poll=1.0):
+    """
+    Ждет awaitable (например, HTTP-запрос через asyncio.to_thread) и параллельно
+    закрывает всплывающие диалоги по selectors. Возвращает результат awaitable.
+    """
+    task = asyncio.ensure_future(awaitable)
+    while not task.done():
+        found = await adb.find_any(selectors)
+        if found:
+            _, el = found
+            await adb.tap(el['x'], el['y'])
+        await asyncio.wait([task], timeout=poll)
+    return task.result()
+
+
+def wait_dismissing(adb, func, *args, selectors, poll=2.0, **kwargs):
+    """
+    Синхронно: func(*args, **kwargs) в отдельном потоке (HTTP API), а пока она
+    ждет - закрываем всплывающие диалоги по selectors своей asyncio-сессией к
+    тому же устройству. adb - ADBController: устройство, адрес adb-сервера,
+    выясненный режим дампа и агент иерархии; переход на дамп через файл,
+    случившийся здесь, возвращается в adb. Возвращает результат func.
+    """
+    session = getattr(adb.transport, "session", None)
+
+    async def run():
+        async_adb = AsyncADBController(adb.device_name, adb_path=adb.adb,
+                                       host=session.host if session else None,
+                                       port=session.port if session else None,
+                                       dump_mode=adb.dump_mode, agent=adb.agent)
+        try:
+            return await dismiss_while(async_adb, asyncio.to_thread(func, *args, **kwargs), selectors, poll)
+        finally:
+            adb.dump_mode = async_adb.dump_mode
+            await async_adb.close()
+
+    try:
+        return asyncio.run(run())
+    finally:
+        # Диалоги могли закрыться - снимок синхронного контроллера устарел
+        adb.waiter.invalidate()
+
+
+class BlockingADBController:
+    """
+    Синхронная обертка над AsyncADBController: event loop в фоновом потоке,
+    методы вызываются как обычные функции (adb.tap(1, 2), adb.find_element(...)).
+    """
+
+    def __init__(self, device_name, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.async_adb = self.call(self._create(device_name, kwargs))
+
+    @staticmethod
+    async def _create(device_name, kwargs):
+        # asyncio.Lock сессии должен создаваться внутри своего loop
+        return AsyncADBController(device_name, **kwargs)
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def __getattr__(self, name):
+        attr = getattr(self.async_adb, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+        return lambda *args, **kwargs: self.call(attr(*args, **kwargs))
+
+    def close(self):
+        self.call(self.async_adb.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
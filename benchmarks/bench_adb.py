@@ -0,0 +1,238 @@
+# ==========================================
+# ОФЛАЙН БЕНЧМАРК ГОРЯЧИХ ПУТЕЙ ADBController
+# ==========================================
+#
+# Без MEmu: дампы берутся из benchmarks/fixtures/*.xml (записанные экраны
+# от маленького диалога до длинного списка чатов), устройство изображает
+# fake_adb_server с настраиваемой задержкой на команду.
+#
+#   python benchmarks/bench_adb.py                         # все замеры, сводка
+#   python benchmarks/bench_adb.py --out new.json          # + результаты в JSON
+#   python benchmarks/bench_adb.py --compare old.json      # сравнить с прошлым прогоном
+#   python benchmarks/bench_adb.py --latency 0.2 --appear 1.5
+#   python benchmarks/bench_adb.py --fixtures trace/dumps  # дампы, снятые с ADB_TRACE
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from adb_transport import SocketTransport  # noqa: E402
+from coord_cache import CoordCache  # noqa: E402
+from fake_adb_server import DEFAULT_SERIAL, FAKE_BUTTON_RGB, FakeAdbServer, fake_frame  # noqa: E402
+from adb_controller import ADBController  # noqa: E402
+from ui_tree import UITree  # noqa: E402
+from ui_wait import UIWaiter  # noqa: E402
+from visual_locator import Frame, VisualLocator, VisualLocatorError  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+# Что ищем на каждом экране (первый селектор - "целевой" элемент экрана)
+FIXTURE_SELECTORS = {
+    "dialog_confirm": [{"text_exact": "Да"}, {"resource_id": "android:id/button1"}, {"text": "Изменить"}],
+    "eula": [{"resource_id": "com.whatsapp:id/eula_accept"}, {"text": "принять"}, {"class_name": "android.widget.Button"}],
+    "phone_entry": [{"resource_id": "com.whatsapp:id/registration_submit"}, {"class_name": "android.widget.EditText"},
+                    {"text": "Далее"}],
+    "chat_list": [{"text": "Чаты"}, {"resource_id": "com.whatsapp:id/fab"}, {"text": "Telegram code"}],
+}
+
+
+def load_fixtures(directory=FIXTURES_DIR):
+    return {p.stem: p.read_text(encoding="utf-8") for p in sorted(Path(directory).glob("*.xml"))}
+
+
+def timed(fn, iterations):
+    """Список длительностей (мс) для fn()"""
+    samples = []
+    # Логи ADBController (✓ Клик ...) в замерах не нужны
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summary(name, fixture, samples, **extra):
+    ordered = sorted(samples)
+    return {
+        "name": name,
+        "fixture": fixture,
+        "n": len(samples),
+        "median_ms": round(statistics.median(ordered), 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "mean_ms": round(statistics.fmean(ordered), 4),
+        **extra,
+    }
+
+
+class ScreenHandler:
+    """Устройство для fake_adb_server: отдает дамп текущего экрана, экран можно подменить по времени"""
+
+    def __init__(self, xml):
+        self.xml = xml
+        self.next_xml = None
+        self.switch_at = None
+        self.dumps = 0
+
+    def show_later(self, xml, delay):
+        self.next_xml = xml
+        self.switch_at = time.time() + delay
+
+    def __call__(self, cmd):
+        if self.switch_at and time.time() >= self.switch_at:
+            self.xml, self.next_xml, self.switch_at = self.next_xml, None, None
+        if cmd.startswith("uiautomator dump"):
+            self.dumps += 1
+            return self.xml.encode("utf-8"), 0
+        if cmd.startswith("echo "):
+            return cmd[5:].encode("utf-8") + b"\n", 0
+        return b"", 0
+
+
+def make_controller(server):
+    adb = ADBController(DEFAULT_SERIAL, transport=SocketTransport(DEFAULT_SERIAL, port=server.port))
+    # Фейковый сервер не отдает поток событий - меряем чистый опрос
+    adb.waiter = UIWaiter(adb, source="off")
+    # Кэш координат - только в памяти, файл в рабочей папке не пишем
+    adb.coords = CoordCache(adb, path=None)
+    return adb
+
+
+def bench_parsing(fixtures, iterations):
+    results = []
+    for name, xml in fixtures.items():
+        selectors = FIXTURE_SELECTORS.get(name, [])
+        results.append(summary("parse", name, timed(lambda: UITree.parse(xml), iterations),
+                               bytes=len(xml.encode("utf-8")), nodes=len(UITree.parse(xml))))
+        if selectors:
+            first = selectors[0]
+            results.append(summary("first_match_stream", name, timed(lambda: UITree.first(xml, **first), iterations)))
+            tree = UITree.parse(xml)
+            results.append(summary("selector_match", name,
+                                   timed(lambda: [tree.get(**sel) for sel in selectors], iterations),
+                                   selectors=len(selectors)))
+    return results
+
+
+def bench_device(fixtures, iterations, latency, appear):
+    results = []
+    if "dialog_confirm" in fixtures:
+        blank = fixtures["dialog_confirm"].replace('text="Да"', 'text=""').replace("android:id/button1", "")
+    else:
+        # Дампы из трассы: пока элемент не появился, экран пустой
+        blank = '<?xml version="1.0" encoding="UTF-8"?><hierarchy rotation="0"></hierarchy>'
+    for name, xml in fixtures.items():
+        selector = FIXTURE_SELECTORS.get(name, [{}])[0]
+        handler = ScreenHandler(xml)
+        with FakeAdbServer(handler=handler, latency=latency) as server:
+            adb = make_controller(server)
+
+            results.append(summary("get_ui_dump", name, timed(adb.get_ui_dump, iterations), latency_s=latency))
+
+            before = len(server.commands)
+            samples = timed(lambda: adb.click_element(timeout=5, **selector), iterations)
+            results.append(summary("click_element", name, samples, latency_s=latency,
+                                   round_trips=(len(server.commands) - before) / iterations))
+
+            # Элемент появляется через appear сек: сколько лишнего ждем и сколько дампов тратим
+            waits, dumps = [], []
+            for _ in range(max(1, iterations // 10)):
+                handler.xml = blank
+                handler.show_later(xml, appear)
+                dumps_before = handler.dumps
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    adb.wait_for_element(timeout=appear + 10, **selector)
+                waits.append((time.perf_counter() - start - appear) * 1000)
+                dumps.append(handler.dumps - dumps_before)
+            results.append(summary("wait_for_element_overshoot", name, waits, latency_s=latency,
+                                   appear_s=appear, dumps_per_wait=statistics.fmean(dumps)))
+            adb.transport.close()
+    return results
+
+
+def bench_visual(iterations):
+    """Разбор сырого кадра и поиск кнопки по цвету (нужен numpy)"""
+    raw = fake_frame()
+    locator = VisualLocator(adb=None)
+    try:
+        frame = Frame.from_raw(raw)
+        frame.rgba
+    except VisualLocatorError as e:
+        print(f"⚠️ Визуальный поиск пропущен: {e}")
+        return []
+
+    def decode():
+        Frame.from_raw(raw).rgba
+
+    return [
+        summary("frame_decode", "fake_frame", timed(decode, iterations), bytes=len(raw)),
+        summary("find_color", "fake_frame",
+                timed(lambda: locator.find_color(FAKE_BUTTON_RGB, roi=(0, 0.6, 1, 1), frame=frame), iterations)),
+    ]
+
+
+def compare(results, baseline_path):
+    """Сводка изменений медианы относительно прошлого прогона"""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    old = {(r["name"], r["fixture"]): r for r in baseline["results"]}
+    print(f"\n📊 Сравнение с {baseline_path}:")
+    for r in results:
+        prev = old.get((r["name"], r["fixture"]))
+        if not prev or not prev["median_ms"]:
+            continue
+        ratio = r["median_ms"] / prev["median_ms"]
+        mark = "🔴" if ratio > 1.1 else ("🟢" if ratio < 0.9 else "  ")
+        print(f"{mark} {r['name']:<28} {r['fixture']:<16} {prev['median_ms']:>10.3f} -> {r['median_ms']:>10.3f} мс (x{ratio:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк ADBController на записанных дампах")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка фейкового устройства на команду, сек")
+    parser.add_argument("--appear", type=float, default=0.5, help="через сколько сек появляется элемент в wait-замере")
+    parser.add_argument("--offline-only", action="store_true", help="только разбор/поиск, без фейкового устройства")
+    parser.add_argument("--fixtures", default=str(FIXTURES_DIR),
+                        help="папка с дампами (например, dumps/ из трассы ADB_TRACE)")
+    parser.add_argument("--out", help="записать результаты в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    results = bench_parsing(fixtures, args.iterations) + bench_visual(args.iterations)
+    if not args.offline_only:
+        results += bench_device(fixtures, args.iterations, args.latency, args.appear)
+
+    for r in results:
+        extra = {k: v for k, v in r.items() if k not in ("name", "fixture", "n", "median_ms", "p95_ms", "mean_ms")}
+        print(f"{r['name']:<28} {r['fixture']:<16} median {r['median_ms']:>10.3f} мс  p95 {r['p95_ms']:>10.3f} мс  {extra or ''}")
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "latency_s": args.latency,
+            "appear_s": args.appear,
+        },
+        "results": results,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n💾 Результаты: {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
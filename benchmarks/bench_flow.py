@@ -0,0 +1,186 @@
+# ==========================================
+# ОФЛАЙН ПРОГОН СЦЕНАРИЕВ main.py НА ФЕЙКОВОМ УСТРОЙСТВЕ
+# ==========================================
+#
+# register_whatsapp и setup_proxydroid целиком, без MEmu: экраны - записанные
+# дампы benchmarks/fixtures + собранные node_xml, переходы по тапам/вводу
+# (fake_device). Удаленные API (MTT, ожидание звонка) подменяются заглушками.
+# На выходе - время прогона, дампы, сбои дампов и round trip'ы к устройству.
+#
+#   python benchmarks/bench_flow.py                              # оба сценария, 1 прогон
+#   python benchmarks/bench_flow.py --runs 5 --latency 0.05 --dump-latency 0.8
+#   python benchmarks/bench_flow.py --dump-failures 0.2 --out flow.json
+#   python benchmarks/bench_flow.py --flow proxydroid --agent
+#   python benchmarks/bench_flow.py --runs 3 --coord-cache /tmp/coords.json   # 2-й прогон и далее - из кэша
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import main  # noqa: E402
+from fake_device import FakeDevice, FakeDeviceSession, FakeScreen, node_xml, screen_xml  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+PHONE_NUMBER = "79000000000"
+CALL_CODE = "123456"
+
+
+def fixture(name):
+    return (FIXTURES_DIR / f"{name}.xml").read_text(encoding="utf-8")
+
+
+def button(text, resource_id="", bounds=(48, 1100, 672, 1196), package="com.whatsapp"):
+    return node_xml(text, resource_id, "android.widget.Button", bounds, package=package, clickable=True)
+
+
+def whatsapp_device(**options):
+    """Регистрация: EULA -> номер -> подтверждение -> другой способ -> звонок -> код -> имя -> главный"""
+    wa = "com.whatsapp:id/"
+    screens = [
+        FakeScreen("launcher", screen_xml(node_xml("Рабочий стол", package="com.android.launcher3")),
+                   activity="com.android.launcher3/.Launcher"),
+        FakeScreen("eula", fixture("eula"), taps=[({"resource_id": wa + "eula_accept"}, "phone_entry")]),
+        FakeScreen("phone_entry", fixture("phone_entry"),
+                   taps=[({"resource_id": wa + "registration_submit"}, "confirm_dialog")]),
+        FakeScreen("confirm_dialog", fixture("dialog_confirm"), taps=[
+            ({"resource_id": "android:id/button1"}, "verify_another_way"),
+            ({"resource_id": "android:id/button2"}, "phone_entry"),
+        ]),
+        FakeScreen("verify_another_way", screen_xml(
+            node_xml("Введите 6-значный код", bounds=(40, 200, 680, 260)),
+            button("Подтвердить другим способом", bounds=(120, 900, 600, 980)),
+        ), taps=[({"text": "другим способом"}, "call_method")]),
+        FakeScreen("call_method", screen_xml(
+            node_xml("SMS", wa + "reg_method_name", bounds=(40, 300, 600, 380)),
+            node_xml("", wa + "reg_method_checkbox", "android.widget.RadioButton", (600, 300, 680, 380), clickable=True),
+            node_xml("Аудиозвонок", wa + "reg_method_name", bounds=(40, 400, 600, 480)),
+            node_xml("", wa + "reg_method_checkbox", "android.widget.RadioButton", (600, 400, 680, 480), clickable=True),
+            button("Продолжить", wa + "continue_button"),
+        ), taps=[({"resource_id": wa + "continue_button"}, "code_entry")]),
+        FakeScreen("code_entry", screen_xml(
+            node_xml("", wa + "verify_sms_code_input", "android.widget.EditText", (160, 300, 560, 380), focused=True),
+        ), texts=[(r"^\d{6}$", "name_entry")]),
+        FakeScreen("name_entry", screen_xml(
+            node_xml("", wa + "registration_name", "android.widget.EditText", (40, 400, 680, 480), clickable=True),
+            button("Далее", wa + "register_name_accept"),
+        ), taps=[({"resource_id": wa + "register_name_accept"}, "passkey")]),
+        FakeScreen("passkey", screen_xml(
+            node_xml("Создать ключ доступа", bounds=(40, 300, 680, 360)),
+            button("Пропустить", bounds=(48, 1100, 340, 1196)),
+        ), taps=[({"text_exact": "Пропустить"}, "initializing")]),
+        FakeScreen("initializing", screen_xml(node_xml("Инициализация…", bounds=(40, 600, 680, 660))),
+                   after=(1.0, "home")),
+        FakeScreen("home", fixture("chat_list")),
+    ]
+    return FakeDevice(screens, "launcher", commands=[(r"am start .*-n com\.whatsapp/", "eula")],
+                      props={"persist.sys.locale": "ru-RU"}, **options)
+
+
+def proxydroid_device(**options):
+    """ProxyDroid: главный экран -> диалог "Хорошо" -> запрос root -> работает"""
+    pkg = "org.proxydroid"
+    screens = [
+        FakeScreen("launcher", screen_xml(node_xml("Рабочий стол", package="com.android.launcher3")),
+                   activity="com.android.launcher3/.Launcher"),
+        FakeScreen("proxydroid_dialog", screen_xml(
+            node_xml("ProxyDroid нужны права root", package=pkg, bounds=(60, 500, 660, 600)),
+            button("Хорошо", "android:id/button1", (420, 700, 640, 790), package=pkg),
+        ), taps=[({"text": "Хорошо"}, "su_request")], activity=f"{pkg}/.MainActivity"),
+        FakeScreen("su_request", screen_xml(
+            node_xml("Разрешить ProxyDroid доступ root?", package="com.android.settings", bounds=(60, 500, 660, 600)),
+            button("Разрешить", "android:id/button1", (420, 700, 640, 790), package="com.android.settings"),
+        ), taps=[({"text": "Разрешить"}, "proxydroid_running")], activity="com.android.settings/.SuRequest"),
+        FakeScreen("proxydroid_running", screen_xml(node_xml("Прокси включен", package=pkg)),
+                   activity=f"{pkg}/.MainActivity"),
+    ]
+    return FakeDevice(screens, "launcher", commands=[(r"am start .*-n org\.proxydroid/", "proxydroid_dialog")],
+                      props={"persist.sys.locale": "ru-RU"}, **options)
+
+
+def run_register(adb):
+    return main.register_whatsapp(adb, PHONE_NUMBER)
+
+
+def run_proxydroid(adb):
+    return main.setup_proxydroid(adb)
+
+
+FLOWS = {
+    "register": (whatsapp_device, run_register, "home"),
+    "proxydroid": (proxydroid_device, run_proxydroid, "proxydroid_running"),
+}
+
+
+@contextlib.contextmanager
+def offline_api():
+    """Удаленные API сценария -> мгновенные заглушки"""
+    saved = main.redirect_calls_to_sip, main.wait_for_voice_call_code
+    main.redirect_calls_to_sip = lambda phone_number: True
+    main.wait_for_voice_call_code = lambda phone_number, timeout=120: {"status": "success", "code": CALL_CODE}
+    try:
+        yield
+    finally:
+        main.redirect_calls_to_sip, main.wait_for_voice_call_code = saved
+
+
+def run_flow(name, latency, dump_latency, dump_failures, agent, seed, verbose, coord_cache="off"):
+    make_device, scenario, final = FLOWS[name]
+    device = make_device(dump_latency=dump_latency, dump_failures=dump_failures, seed=seed)
+    log = io.StringIO()
+    with offline_api(), contextlib.redirect_stdout(sys.stdout if verbose else log):
+        with FakeDeviceSession(device, latency=latency, agent=agent, coord_cache=coord_cache) as session:
+            result = scenario(session.adb)
+    report = session.report()
+    report.update(flow=name, result=result, ok=report["final"] == final)
+    return report
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Сценарии main.py на фейковом устройстве")
+    parser.add_argument("--flow", choices=[*FLOWS, "all"], default="all")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка на каждую команду, сек")
+    parser.add_argument("--dump-latency", type=float, default=0.3, help="длительность uiautomator dump, сек")
+    parser.add_argument("--dump-failures", type=float, default=0.0, help="доля падающих дампов (0..1)")
+    parser.add_argument("--agent", action="store_true", help="снимки через заглушку агента иерархии")
+    parser.add_argument("--coord-cache", default="off", help="файл кэша координат (общий для прогонов), off - без кэша")
+    parser.add_argument("--verbose", action="store_true", help="показывать лог сценария")
+    parser.add_argument("--out", help="записать отчеты в JSON")
+    args = parser.parse_args()
+
+    flows = list(FLOWS) if args.flow == "all" else [args.flow]
+    reports = []
+    for name in flows:
+        for run in range(args.runs):
+            report = run_flow(name, args.latency, args.dump_latency, args.dump_failures, args.agent,
+                              seed=run, verbose=args.verbose, coord_cache=args.coord_cache)
+            reports.append(report)
+            mark = "✓" if report["ok"] else "❌"
+            print(f"{mark} {name:<11} прогон {run + 1}: {report['wall_s']:>7.2f} сек, round trip {report['round_trips']:>4}, "
+                  f"дампов {report['dumps']:>3} (сбоев {report['dump_failures']}), "
+                  f"тапов {report['taps']} (без перехода {report['noop_taps']}), "
+                  f"из кэша {report['coord_cache']['hits']}, финал: {report['final']}")
+            if not report["ok"]:
+                print(f"   путь: {' -> '.join(report['path'])}")
+        walls = [r["wall_s"] for r in reports if r["flow"] == name]
+        if len(walls) > 1:
+            print(f"  {name}: median {statistics.median(walls):.2f} сек, max {max(walls):.2f} сек")
+
+    if args.out:
+        meta = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **{k: v for k, v in vars(args).items() if k != "out"}}
+        Path(args.out).write_text(json.dumps({"meta": meta, "runs": reports}, ensure_ascii=False, indent=2),
+                                  encoding="utf-8")
+        print(f"\n💾 Отчеты: {args.out}")
+    sys.exit(0 if all(r["ok"] for r in reports) else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
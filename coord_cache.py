@@ -0,0 +1,201 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from adb_metrics import METRICS
+from ui_selector import first_match
+
+# ==========================================
+# КЭШ КООРДИНАТ ЭЛЕМЕНТОВ ПО ПОСЛЕДНЕМУ СНИМКУ
+# ==========================================
+#
+# Сценарий кликает по одним и тем же шагам: на экране ввода номера вводит
+# текст и жмет Next, на экране имени - вводит имя и жмет Далее. После нашего
+# ввода снимок UIWaiter сброшен, и click_any дампит экран заново ради тех же
+# bounds (клавиатура могла сдвинуть кнопку).
+#
+# Ключ кэша - то, что у сценария уже есть к моменту клика, без запросов к устройству:
+#   (хеш структуры последнего снимка UIWaiter, селектор)
+# Последний снимок - тот, что был до наших tap/text (UIWaiter.last_snapshot),
+# хеш структуры - пакеты, классы, resource-id и bounds узлов без текста
+# (введенный номер/имя отпечаток не меняет; разрешение - в bounds).
+# Значение - координаты, по которым элемент нашелся обычным поиском после
+# наших действий на этом экране.
+#
+# Клик из кэша - только если:
+#   - последний снимок не старше SNAPSHOT_MAX_AGE и элемент в нем был;
+#   - прошлый клик из кэша уже проверен (не больше одного тапа вслепую на снимок).
+# Иначе - обычный поиск find_any; найденное запоминается (тоже без запросов).
+#
+# Проверка - на следующем снимке, который сценарий и так делает
+# (UIWaiter.snapshot, тот же поток): элемент на экране в других bounds -
+# запись сбрасывается и тап повторяется по настоящим координатам.
+#
+# Файл пишется целиком при записи и сбросе, порядок LRU после попаданий - при выходе.
+# Кэш общий для всех устройств и прогонов (JSON файл), вытеснение LRU.
+# UI_COORD_CACHE=путь (по умолчанию ui_coord_cache.json), off - выключить.
+# UI_COORD_CACHE_SIZE - сколько записей держать (по умолчанию 256).
+
+UI_COORD_CACHE = os.getenv("UI_COORD_CACHE") or "ui_coord_cache.json"
+UI_COORD_CACHE_SIZE = int(os.getenv("UI_COORD_CACHE_SIZE") or 256)
+
+# Снимок старше этого (сек) для клика из кэша не годится - экран мог смениться сам
+SNAPSHOT_MAX_AGE = 5.0
+
+
+def structure_hash(tree):
+    """Хеш структуры экрана: пакеты, классы, resource-id и bounds узлов (без текста)"""
+    digest = hashlib.md5()
+    for node in tree.nodes:
+        digest.update(f"{node.package}|{node.class_name}|{node.resource_id}|{node.bounds}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def selector_key(selector):
+    """Селектор (словарь, строка UiSelector, Selector) -> строка для ключа"""
+    if isinstance(selector, dict):
+        return json.dumps(selector, sort_keys=True, ensure_ascii=False)
+    return str(getattr(selector, "source", selector))
+
+
+class CoordCache:
+    """Кэш координат для одного ADBController (файл общий)"""
+
+    def __init__(self, adb, path=UI_COORD_CACHE, size=UI_COORD_CACHE_SIZE):
+        self.adb = adb
+        # path=None - только в памяти (офлайн прогоны)
+        self.path = path
+        self.enabled = path != "off" and size > 0
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.loaded = False
+        # Клик из кэша, ждущий проверки на следующем снимке: (ключ, селектор, запись)
+        self.pending = None
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0}
+        # Порядок LRU поменялся от попаданий - файл допишется при выходе
+        self.dirty = False
+        if self.enabled and self.path:
+            atexit.register(self.save)
+
+    # --- поиск и запись ---
+
+    def lookup(self, selectors, tree):
+        """
+        (селектор, элемент {x, y, bounds}) из кэша или None.
+        tree - последний снимок (UIWaiter.last_snapshot); нет снимка - нет и попадания.
+        """
+        if not self.enabled or tree is None:
+            return None
+        if self.pending is not None:
+            # Прошлый клик из кэша еще не проверен - ищем обычным снимком (он же его и проверит)
+            return self._count("misses", "miss")
+        self._load()
+        structure = structure_hash(tree)
+        for selector in selectors:
+            key = (structure, selector_key(selector))
+            with self.lock:
+                entry = self.entries.get(key)
+            if entry is None or first_match(tree, selector) is None:
+                continue
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.dirty = True
+            self.pending = (key, selector, entry)
+            self._count("hits", "hit")
+            return selector, {"x": entry["x"], "y": entry["y"], "bounds": tuple(entry["bounds"]), "node": None}
+        return self._count("misses", "miss")
+
+    def store(self, selector, element, before):
+        """Запомнить элемент, найденный обычным поиском; before - снимок до поиска (ключ)"""
+        if not self.enabled or before is None or not element.get("bounds"):
+            return
+        if first_match(before, selector) is None:
+            # Элемента на прошлом снимке не было (диалог появился после) - вслепую его не жмем
+            return
+        key = (structure_hash(before), selector_key(selector))
+        with self.lock:
+            self.entries[key] = {"x": element["x"], "y": element["y"], "bounds": list(element["bounds"])}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        self._count("stores")
+        self._save()
+
+    def verify(self, tree):
+        """
+        Проверка клика из кэша по следующему снимку сценария. Элемент в других
+        bounds - запись сбрасывается и тап повторяется по настоящим координатам.
+        True - был повторный тап (снимок устарел).
+        """
+        if self.pending is None:
+            return False
+        key, selector, entry = self.pending
+        self.pending = None
+        node = first_match(tree, selector)
+        if node is None or list(node.bounds) == entry["bounds"]:
+            # Экран сменился (тап сработал) или элемент там, куда тапнули
+            return False
+        print(f"⚠️ Кэш координат: '{key[1]}' теперь в {node.bounds}, а не {tuple(entry['bounds'])} - "
+              f"запись сброшена, повторяю тап")
+        self.invalidate(key)
+        x, y = node.center
+        self.adb.tap(x, y)
+        return True
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+        self._count("invalidated", "invalidated")
+        self._save()
+
+    def _count(self, stat, outcome=None):
+        """Счетчик stats (под замком) и метрика ui_coord_cache_total{outcome}; всегда None"""
+        with self.lock:
+            self.stats[stat] += 1
+        if outcome and METRICS.enabled:
+            METRICS.count("ui_coord_cache_total", outcome=outcome)
+        return None
+
+    # --- файл ---
+
+    def _load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                rows = json.load(f)
+            with self.lock:
+                for key, entry in rows[-self.size:]:
+                    # Ключи старого формата (activity, разрешение, язык, ...) не подходят
+                    if len(key) == 2:
+                        self.entries[tuple(key)] = entry
+        except (OSError, ValueError, TypeError) as e:
+            print(f"⚠️ Кэш координат не прочитан ({e}), начинаю с пустого")
+
+    def save(self):
+        """Дописать порядок LRU после попаданий (при выходе)"""
+        if self.dirty:
+            self._save()
+
+    def _save(self):
+        """Файл целиком, в порядке LRU (последние - самые свежие)"""
+        if not self.path:
+            return
+        with self.lock:
+            self.dirty = False
+            rows = [[list(key), entry] for key, entry in self.entries.items()]
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Кэш координат не сохранен ({e})")
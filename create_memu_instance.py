@@ -2,11 +2,29 @@ import subprocess
 import os
 import sys
 import re
-import time
+
+from device_ready import wait_ready
+from memu_config import ROOT_FILE_SETTINGS, ROOT_SETTINGS, configure_instance
 
 # Путь к memuc.exe (CLI для управления MEmu)
 # Обычно лежит там же, где и MEmu.exe
 MEMUC_PATH = r"C:\Program Files\Microvirt\MEmu\memuc.exe"
+ADB_PATH = os.getenv("ADB_PATH") or r"C:\Program Files\Microvirt\MEmu\adb.exe"
+# Сколько ждем загрузки Android после запуска инстанса
+BOOT_TIMEOUT = 180
+
+# Настройки нового инстанса (ключи как у memuc setconfigex)
+# graphics_render_mode: 0 = OpenGL, 1 = DirectX
+INSTANCE_SETTINGS = {
+    "cpus": "2",
+    "memory": "1536",
+    "is_custom_resolution": "1",
+    "resolution_width": "720",
+    "resolution_height": "1280",
+    "v_dpi": "240",
+    "graphics_render_mode": "1",
+    **ROOT_SETTINGS,
+}
 
 def run_memuc(args):
     """Запуск команды memuc и возврат вывода"""
@@ -47,24 +65,11 @@ def create_one_instance():
     index = int(match.group(1))
     print(f"✓ Инстанс создан. Индекс: {index}")
 
-    # 2. Настраиваем производительность (2 CPU, 1536 RAM)
-    print("⚙️  Настраиваю CPU/RAM...")
-    run_memuc(["setconfigex", "-i", str(index), "cpus", "2"])
-    run_memuc(["setconfigex", "-i", str(index), "memory", "1536"])
-
-    # 3. Настраиваем разрешение (720x1280, 240dpi, Mobile)
-    print("⚙️  Настраиваю экран...")
-    run_memuc(["setconfigex", "-i", str(index), "is_custom_resolution", "1"])
-    run_memuc(["setconfigex", "-i", str(index), "resolution_width", "720"])
-    run_memuc(["setconfigex", "-i", str(index), "resolution_height", "1280"])
-    run_memuc(["setconfigex", "-i", str(index), "v_dpi", "240"])
-
-    # 4. Настраиваем рендер (DirectX) и Root
-    # graphics_render_mode: 0 = OpenGL, 1 = DirectX
-    print("⚙️  Включаю DirectX и Root...")
-    run_memuc(["setconfigex", "-i", str(index), "graphics_render_mode", "1"])
-    run_memuc(["setconfigex", "-i", str(index), "is_root_mode", "1"])
-    run_memuc(["setconfigex", "-i", str(index), "root_mode", "1"])
+    # 2-4. CPU/RAM, экран (720x1280, 240dpi), рендер DirectX и Root, пока инстанс
+    # еще не запущен: ключи, которые есть в .memu, - правкой файла, остальные - memuc
+    print("⚙️  Настраиваю CPU/RAM, экран, DirectX и Root...")
+    # enable_root - только если он есть в файле (через memuc не отправляется)
+    configure_instance(index, INSTANCE_SETTINGS, memuc_path=MEMUC_PATH, file_only=ROOT_FILE_SETTINGS)
 
     # 5. Запускаем (один раз)
     print(f"▶️  Запускаю инстанс {index}...")
@@ -95,80 +100,16 @@ def create_one_instance():
         print(f"⚠️  Файл {apk_wa} не найден, пропуск установки WhatsApp")
 
     # 9. Настраиваем ProxyDroid (Config + Start)
-    # ...
-    # 9.1 Сразу после создания пробуем включить ROOT принудительно через правку файла конфига
-    # (потому что memuc иногда не включает)
-    try:
-        # Пытаемся найти папку с VM конфигами
-        # Обычно: C:\Program Files\Microvirt\MEmu\MemuHyperv VMs\MEmu_{index}\MEmu_{index}.memu
-        # Но у нас index может быть любым.
-        # Проще найти папку VMs
-        vms_dir = r"C:\Program Files\Microvirt\MEmu\MemuHyperv VMs"
-        if not os.path.exists(vms_dir):
-             # Попробуем альтернативу
-             vms_dir = os.path.expanduser("~\\Documents\\MEmu Hyperv VMs")
-        
-        if os.path.exists(vms_dir):
-             # Ищем файл конфига для нашего индекса
-             # Папка может называться MEmu_{index} или просто лежать там
-             # Попробуем найти файл MEmu_{index}.memu
-             target_file = None
-             import glob
-             # Ищем рекурсивно
-             print(f"🔎 Ищу конфиг MEmu_{index}.memu в {vms_dir}...")
-             candidates = glob.glob(os.path.join(vms_dir, f"**", f"MEmu_{index}.memu"), recursive=True)
-             if not candidates:
-                 print(f"⚠️ Конфиг не найден рекурсивно. Пробую искать просто по имени папки...")
-                 # Попробуем предсказать путь: MemuHyperv VMs\MEmu_{index}\MEmu_{index}.memu
-                 predicted = os.path.join(vms_dir, f"MEmu_{index}", f"MEmu_{index}.memu")
-                 if os.path.exists(predicted):
-                     candidates = [predicted]
-                 else:
-                     print(f"⚠️ И по пути {predicted} тоже нет.")
-             
-             if candidates:
-                 target_file = candidates[0]
-                 print(f"🔧 Найден файл конфига: {target_file}")
-                 
-                 # Читаем и правим
-                 with open(target_file, 'r', encoding='utf-8', errors='ignore') as f:
-                     content = f.read()
-                 
-                 new_content = content
-                 if 'enable_root" value="0"' in content:
-                     new_content = new_content.replace('enable_root" value="0"', 'enable_root" value="1"')
-                     print("  ✓ Исправлено: enable_root -> 1")
-                 if 'root_mode" value="0"' in content:
-                     new_content = new_content.replace('root_mode" value="0"', 'root_mode" value="1"')
-                     print("  ✓ Исправлено: root_mode -> 1")
-                 if 'is_root_mode" value="0"' in content:
-                     new_content = new_content.replace('is_root_mode" value="0"', 'is_root_mode" value="1"')
-                     print("  ✓ Исправлено: is_root_mode -> 1")
-                     
-                 if new_content != content:
-                     with open(target_file, 'w', encoding='utf-8') as f:
-                         f.write(new_content)
-                     print("✅ Root включен принудительно в файле!")
-                     
-                     # Перезагружаем эмулятор чтобы применилось
-                     print("🔄 Перезапускаю эмулятор для применения Root...")
-                     run_memuc(["stop", "-i", str(index)])
-                     time.sleep(2)
-                     run_memuc(["start", "-i", str(index)])
-                     time.sleep(5)
-                 else:
-                     print("  (Root уже включен в файле)")
-    except Exception as e:
-        print(f"⚠️ Ошибка принудительного включения Root: {e}")
-
+    # Root уже включен в .memu до первого запуска - перезапуск для него не нужен
     print("🌍 Настраиваю конфиг ProxyDroid...")
-    ADB_PATH = r"C:\Program Files\Microvirt\MEmu\adb.exe" # Или из env
     local_conf = "proxydroid_prefs.xml"
     remote_conf = "/data/data/org.proxydroid/shared_prefs/org.proxydroid_preferences.xml"
     
-    # Ждем загрузки
-    print("⏳ Жду загрузки Android (10 сек)...")
-    time.sleep(10)
+    # Ждем загрузки (adb, boot_completed, bootanim, pm) вместо фиксированной паузы
+    print("⏳ Жду загрузки Android...")
+    if not wait_ready(device_name, timeout=BOOT_TIMEOUT, adb_path=ADB_PATH)["ready"]:
+        print("⚠️ Android не загрузился, пропускаю настройку ProxyDroid")
+        return
 
     if os.path.exists(local_conf):
         try:
@@ -0,0 +1,109 @@
+import os
+import subprocess
+import time
+
+from adb_transport import AdbTransportError, make_transport
+from device_registry import get_registry
+
+# ==========================================
+# ГОТОВНОСТЬ УСТРОЙСТВА ПОСЛЕ ЗАПУСКА
+# ==========================================
+#
+# Вместо фиксированных sleep после `memuc start`: ждем по стадиям
+#   adb             - устройство в состоянии device (по реестру, без процессов)
+#   boot_completed  - getprop sys.boot_completed == 1
+#   bootanim        - init.svc.bootanim остановлен
+#   package_manager - pm отвечает (можно ставить/чистить приложения)
+# с общим дедлайном и нарастающим интервалом опроса. Все getprop/pm за
+# один вызов shell на опрос.
+#
+#     report = wait_ready("127.0.0.1:21503", timeout=180)
+#     report["ready"], report["stages"]   # True, {'adb': 1.2, 'boot_completed': 24.8, ...}
+
+STAGES = ("adb", "boot_completed", "bootanim", "package_manager")
+
+POLL_START = 0.5
+POLL_MAX = 5.0
+
+PROBE_CMD = "getprop sys.boot_completed;getprop init.svc.bootanim;pm path android 2>/dev/null | head -1"
+
+
+def _probe(serial, transport, adb_path):
+    """Вывод PROBE_CMD построчно или None, если устройство не ответило"""
+    if transport:
+        try:
+            return transport.shell(PROBE_CMD, timeout=10).stdout.splitlines()
+        except (AdbTransportError, subprocess.TimeoutExpired):
+            # Сессия оборвалась на перезагрузке - при следующем опросе откроется заново
+            return None
+    try:
+        res = subprocess.run([adb_path, "-s", serial, "shell", PROBE_CMD], capture_output=True, text=True,
+                             encoding='utf-8', errors='ignore', timeout=10)
+    except subprocess.TimeoutExpired:
+        return None
+    return res.stdout.splitlines() if res.returncode == 0 else None
+
+
+def _passed(lines):
+    """Какие стадии после adb уже пройдены (по порядку)"""
+    lines = [line.strip() for line in lines] + ["", "", ""]
+    boot_completed, bootanim, pm = lines[:3]
+    done = []
+    if boot_completed == "1":
+        done.append("boot_completed")
+        # На части образов службы bootanim нет вовсе - пустое значение тоже считаем остановкой
+        if bootanim in ("stopped", ""):
+            done.append("bootanim")
+            if pm.startswith("package:"):
+                done.append("package_manager")
+    return done
+
+
+def wait_ready(serial, timeout=180, registry=None, adb_path=None):
+    """
+    Ждет, пока устройство полностью загрузится.
+    Возвращает {"ready": bool, "stages": {стадия: сек от начала}, "total": сек}.
+    """
+    adb_path = adb_path or os.getenv("ADB_PATH") or "adb"
+    registry = registry or get_registry(adb_path)
+    start = time.time()
+    deadline = start + timeout
+    stages = {}
+
+    def report(ready):
+        total = time.time() - start
+        timing = ", ".join(f"{name} {seconds:.1f}с" for name, seconds in stages.items())
+        if ready:
+            print(f"✓ {serial} готов за {total:.1f} сек ({timing})")
+        else:
+            missing = [name for name in STAGES if name not in stages]
+            print(f"❌ {serial} не готов за {timeout} сек, не пройдено: {', '.join(missing)} ({timing or 'нет стадий'})")
+        return {"ready": ready, "stages": stages, "total": total}
+
+    # adb: TCP-устройство после старта VM надо подключить, дальше реестр держит его сам
+    if registry.state(serial) != "device":
+        print(f"⏳ Жду {serial} в adb...")
+        registry.connect(serial)
+    if not registry.wait_for(serial, timeout=max(deadline - time.time(), 0)):
+        return report(False)
+    stages["adb"] = time.time() - start
+
+    transport = make_transport(serial, host=registry.host, port=registry.port)
+    interval = POLL_START
+    try:
+        while True:
+            lines = _probe(serial, transport, adb_path)
+            for name in _passed(lines or []):
+                if name not in stages:
+                    stages[name] = time.time() - start
+                    print(f"   ✓ {name} ({stages[name]:.1f} сек)")
+            if len(stages) == len(STAGES):
+                return report(True)
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return report(False)
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 1.5, POLL_MAX)
+    finally:
+        if transport:
+            transport.close()
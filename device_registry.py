@@ -0,0 +1,230 @@
+import os
+import re
+import socket
+import subprocess
+import threading
+import time
+
+from adb_controller import ADBController
+from adb_transport import (ADB_SERVER_HOST, ADB_SERVER_PORT, AdbTransportError, encode_request, host_request,
+                           make_transport, read_status, recv_exact)
+
+# ==========================================
+# РЕЕСТР УСТРОЙСТВ (host:track-devices)
+# ==========================================
+#
+# Вместо `adb devices` + регулярки на каждый запуск - одна подписка на
+# поток host:track-devices adb-сервера. Состояния устройств (device /
+# offline / unauthorized) всегда в памяти, отвалившиеся TCP-устройства
+# (MEmu) переподключаются сами через host:connect.
+#
+#     registry = get_registry()
+#     adb = registry.controller()          # первый MEmu, без лишних процессов
+#     registry.states()                    # {'127.0.0.1:21503': 'device'}
+
+# MEmu: 127.0.0.1:21503, 127.0.0.1:21513, ...
+MEMU_SERIAL_RE = re.compile(r"127\.0\.0\.1:2\d{4}$")
+# Дефолт для первого инстанса MEmu
+DEFAULT_SERIAL = "127.0.0.1:21503"
+# TCP-устройства (host:port) можно переподключить, USB - нет
+TCP_SERIAL_RE = re.compile(r"^[\w.-]+:\d+$")
+
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 30.0
+
+
+def parse_devices(body):
+    """Ответ host:devices / track-devices -> {serial: state}"""
+    devices = {}
+    for line in body.splitlines():
+        parts = line.split("\t")
+        if len(parts) >= 2 and parts[0]:
+            devices[parts[0]] = parts[1].strip()
+    return devices
+
+
+class DeviceRegistry:
+    def __init__(self, host=None, port=None, adb_path=None, reconnect=True):
+        self.host = host or ADB_SERVER_HOST
+        self.port = port or ADB_SERVER_PORT
+        self.adb_path = adb_path or os.getenv("ADB_PATH") or "adb"
+        self.reconnect = reconnect
+        self.devices = {}
+        # Номер версии списка - растет на каждом сообщении track-devices
+        self.generation = 0
+        self.cond = threading.Condition()
+        # TCP-устройства, которые держим подключенными: serial -> (следующая попытка, пауза)
+        self.watched = {}
+        self.connected = False
+        self.stopped = False
+        self.server_started = False
+        self.threads = []
+
+    def start(self, timeout=5):
+        """Подписаться на adb-сервер и дождаться первого списка устройств"""
+        if not self.threads:
+            for target in (self._track, self._maintain):
+                thread = threading.Thread(target=target, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        with self.cond:
+            self.cond.wait_for(lambda: self.generation > 0, timeout)
+        return self
+
+    def stop(self):
+        self.stopped = True
+        with self.cond:
+            self.cond.notify_all()
+
+    # --- состояние ---
+
+    def states(self):
+        with self.cond:
+            return dict(self.devices)
+
+    def state(self, serial):
+        with self.cond:
+            return self.devices.get(serial)
+
+    def online(self, pattern=None):
+        """Устройства в состоянии device (по pattern, если задан)"""
+        with self.cond:
+            return [s for s, state in self.devices.items()
+                    if state == "device" and (pattern is None or pattern.search(s))]
+
+    def wait_for(self, serial=None, pattern=MEMU_SERIAL_RE, timeout=10):
+        """Ждет устройство serial (или первое по pattern) в состоянии device. Serial или None."""
+        def ready():
+            if serial is not None:
+                return serial if self.devices.get(serial) == "device" else None
+            found = [s for s, state in self.devices.items() if state == "device" and pattern.search(s)]
+            return sorted(found)[0] if found else None
+
+        with self.cond:
+            return self.cond.wait_for(ready, timeout)
+
+    def first_device(self, pattern=MEMU_SERIAL_RE, default=DEFAULT_SERIAL, timeout=10):
+        """Первое онлайн-устройство по pattern; если нет - подключаем default и ждем его"""
+        serial = self.wait_for(pattern=pattern, timeout=0)
+        if serial:
+            return serial
+        print(f"⚠️ Девайс не найден в списке, подключаю дефолт: {default}")
+        self.connect(default)
+        return self.wait_for(pattern=pattern, timeout=timeout)
+
+    def controller(self, serial=None, timeout=10):
+        """ADBController для serial (или первого MEmu) без вызовов adb.exe"""
+        serial = self.wait_for(serial, timeout=timeout) if serial else self.first_device(timeout=timeout)
+        if not serial:
+            raise AdbTransportError("Нет подключенных устройств")
+        return ADBController(serial, transport=make_transport(serial, host=self.host, port=self.port))
+
+    # --- подключение ---
+
+    def watch(self, serial):
+        """Держать TCP-устройство подключенным"""
+        if TCP_SERIAL_RE.match(serial):
+            with self.cond:
+                # Первая попытка - сам вызывающий (connect), фоновая - после паузы
+                self.watched.setdefault(serial, (time.time() + RECONNECT_MIN, RECONNECT_MIN))
+
+    def connect(self, serial):
+        """host:connect (аналог `adb connect`) + переподключение в будущем"""
+        self.watch(serial)
+        try:
+            if self.state(serial) == "offline":
+                # Зависшее соединение adb сам не переоткроет
+                host_request(f"host:disconnect:{serial}", host=self.host, port=self.port)
+            reply = host_request(f"host:connect:{serial}", host=self.host, port=self.port)
+        except AdbTransportError as e:
+            print(f"⚠️ Не удалось подключить {serial}: {e}")
+            return False
+        return "connected" in reply
+
+    def _start_server(self):
+        """adb-сервер не запущен - один раз поднимаем его (единственный запуск adb.exe)"""
+        if self.server_started:
+            return
+        self.server_started = True
+        try:
+            subprocess.run([self.adb_path, "start-server"], capture_output=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️ Не удалось запустить adb-сервер: {e}")
+
+    # --- фоновые потоки ---
+
+    def _track(self):
+        """Поток track-devices; при обрыве (перезапуск adb-сервера) подписывается заново"""
+        delay = RECONNECT_MIN
+        while not self.stopped:
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=5)
+            except OSError:
+                self._start_server()
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+                continue
+            try:
+                sock.sendall(encode_request("host:track-devices"))
+                read_status(sock)
+                sock.settimeout(None)
+                self.connected = True
+                delay = RECONNECT_MIN
+                while not self.stopped:
+                    length = int(recv_exact(sock, 4), 16)
+                    self._update(parse_devices(recv_exact(sock, length).decode("utf-8", errors="ignore")))
+            except (OSError, ValueError, AdbTransportError):
+                pass
+            finally:
+                self.connected = False
+                sock.close()
+            if not self.stopped:
+                print("⚠️ Потеряна связь с adb-сервером, переподписываюсь")
+                time.sleep(delay)
+
+    def _update(self, devices):
+        with self.cond:
+            old = self.devices
+            self.devices = devices
+            self.generation += 1
+            for serial, state in devices.items():
+                if state == "device" and TCP_SERIAL_RE.match(serial):
+                    self.watched.setdefault(serial, (0.0, RECONNECT_MIN))
+            self.cond.notify_all()
+        for serial, state in devices.items():
+            if old.get(serial) != state:
+                print(f"📱 {serial}: {state}")
+        for serial in old.keys() - devices.keys():
+            print(f"📱 {serial}: отключен")
+
+    def _maintain(self):
+        """Переподключение отвалившихся TCP-устройств с нарастающей паузой"""
+        while not self.stopped:
+            with self.cond:
+                self.cond.wait(RECONNECT_MIN)
+                if not self.reconnect or not self.connected:
+                    continue
+                now = time.time()
+                due = [(serial, pause) for serial, (at, pause) in self.watched.items()
+                       if self.devices.get(serial) != "device" and now >= at]
+            for serial, pause in due:
+                print(f"🔌 Переподключаю {serial}...")
+                self.connect(serial)
+                with self.cond:
+                    self.watched[serial] = (time.time() + pause, min(pause * 2, RECONNECT_MAX))
+            with self.cond:
+                # Устройство снова онлайн - сбрасываем паузу
+                for serial, (at, pause) in list(self.watched.items()):
+                    if self.devices.get(serial) == "device" and pause != RECONNECT_MIN:
+                        self.watched[serial] = (0.0, RECONNECT_MIN)
+
+
+_registry = None
+
+
+def get_registry(adb_path=None):
+    """Общий реестр процесса (поднимается при первом обращении)"""
+    global _registry
+    if _registry is None:
+        _registry = DeviceRegistry(adb_path=adb_path).start()
+    return _registry
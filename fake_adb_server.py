@@ -0,0 +1,336 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+from adb_transport import FRAME_RE, SocketTransport, encode_request, read_status, recv_exact
+from hierarchy_agent import AGENT_SOCKET, AGENT_VERSION
+from ui_tree import UITree, node_matches
+
+# ==========================================
+# ФЕЙКОВЫЙ ADB-СЕРВЕР
+# ==========================================
+#
+# Локальная замена adb-сервера (smart-socket протокол) для отладки без MEmu
+# и для сравнения задержек транспорта. Понимает host:version, host:devices,
+# host:transport:<serial>, shell:<cmd> и долгоживущую сессию shell:sh.
+# agent=True - еще и заглушка агента иерархии (localabstract:uiagent), которая
+# отвечает по дампу того же handler; FakeAgentServer - та же заглушка на TCP-порту.
+#
+#   python fake_adb_server.py --bench 200     # сравнить subprocess и сокет
+#   python fake_adb_server.py --serve 5038    # просто поднять сервер
+
+DEFAULT_SERIAL = "127.0.0.1:21503"
+
+FAKE_DUMP = (
+    "<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>"
+    '<hierarchy rotation="0">'
+    '<node index="0" text="AGREE AND CONTINUE" resource-id="com.whatsapp:id/eula_accept" '
+    'class="android.widget.Button" package="com.whatsapp" content-desc="" clickable="true" '
+    'enabled="true" bounds="[48,1100][672,1196]" />'
+    "</hierarchy>"
+)
+
+# Кадр screencap к FAKE_DUMP: серый фон и зеленая кнопка в тех же границах
+FAKE_SCREEN = (720, 1280)
+FAKE_BUTTON = (48, 1100, 672, 1196)
+FAKE_BUTTON_RGB = (0, 168, 132)
+
+
+def fake_frame(width=FAKE_SCREEN[0], height=FAKE_SCREEN[1]):
+    """Сырой вывод screencap (заголовок Android 9+, RGBA_8888)"""
+    left, top, right, bottom = FAKE_BUTTON
+    bg = bytes((236, 236, 236, 255))
+    button = bytes(FAKE_BUTTON_RGB + (255,))
+    plain = bg * width
+    striped = bg * left + button * (right - left) + bg * (width - right)
+    rows = [striped if top <= y < bottom else plain for y in range(height)]
+    return struct.pack("<IIII", width, height, 1, 0) + b"".join(rows)
+
+
+def default_handler(cmd):
+    """Ответы устройства по умолчанию: (stdout bytes, код возврата)"""
+    if cmd.startswith("uiautomator dump"):
+        target = cmd.split()[-1]
+        if target in ("/dev/tty", "/dev/stdout"):
+            return FAKE_DUMP.encode("utf-8") + f"UI hierchary dumped to: {target}\n".encode(), 0
+        return f"UI hierchary dumped to: {target}\n".encode(), 0
+    if cmd.startswith("cat /data/local/tmp/window_dump.xml"):
+        return FAKE_DUMP.encode("utf-8"), 0
+    if cmd == "screencap":
+        return fake_frame(), 0
+    if cmd.startswith("echo "):
+        return cmd[5:].encode("utf-8") + b"\n", 0
+    return b"", 0
+
+
+def serve_agent(sock, dump):
+    """Протокол hierarchy_agent поверх сокета; dump() -> XML текущего экрана"""
+    reader = sock.makefile("rb")
+    for line in reader:
+        request = json.loads(line)
+        op = request.get("op")
+        if op == "ping":
+            reply = {"ok": True, "version": AGENT_VERSION}
+        elif op == "hierarchy":
+            reply = {"ok": True, "rows": UITree.parse(dump()).to_rows()}
+        elif op == "query":
+            limit = request.get("limit") or None
+            found = [node for node in UITree.parse(dump()).nodes
+                     if any(node_matches(node, **selector) for selector in request["selectors"])]
+            reply = {"ok": True, "rows": [node.as_row() for node in found[:limit]]}
+        else:
+            reply = {"ok": False, "error": f"unknown op: {op}"}
+        sock.sendall(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+class FakeAgentServer:
+    """Заглушка агента на локальном порту (как после `adb forward`); dump() -> XML"""
+
+    def __init__(self, dump=lambda: FAKE_DUMP, port=0):
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    serve_agent(self.request, dump)
+                except (OSError, ValueError):
+                    pass
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeAdbServer:
+    """
+    Фейковый adb-сервер в отдельном потоке.
+    handler(cmd) -> (bytes, rc) отвечает за поведение устройства,
+    latency - искусственная задержка на каждую команду (сек).
+    """
+
+    def __init__(self, port=0, serials=(DEFAULT_SERIAL,), handler=None, latency=0.0, agent=False):
+        # serial -> состояние (device / offline / unauthorized), как в host:devices
+        self.states = {serial: "device" for serial in serials}
+        self.states_changed = threading.Condition()
+        self.handler = handler or default_handler
+        self.latency = latency
+        self.agent = agent
+        self.commands = []
+        owner = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                owner.handle_connection(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def serials(self):
+        return [serial for serial, state in self.states.items() if state == "device"]
+
+    def set_state(self, serial, state):
+        """Сменить состояние устройства (None - отключить) и оповестить track-devices"""
+        with self.states_changed:
+            if state is None:
+                self.states.pop(serial, None)
+            else:
+                self.states[serial] = state
+            self.states_changed.notify_all()
+
+    def devices_body(self):
+        return "".join(f"{serial}\t{state}\n" for serial, state in self.states.items()).encode()
+
+    def execute(self, cmd):
+        self.commands.append(cmd)
+        if self.latency:
+            time.sleep(self.latency)
+        if ";" not in cmd and "&&" not in cmd:
+            return self.handler(cmd)
+        # Скрипт вида "cmd1;echo X $?;cmd2 && cmd3" - выполняем по частям
+        out, rc = b"", 0
+        for part in cmd.split(";"):
+            for i, sub in enumerate(part.split("&&")):
+                if i and rc != 0:
+                    break
+                sub = sub.strip().replace("$?", str(rc))
+                quiet = sub.endswith(">/dev/null")
+                o, rc = self.handler(sub[:-len(">/dev/null")].strip() if quiet else sub)
+                if not quiet:
+                    out += o
+        return out, rc
+
+    # --- протокол ---
+
+    def read_request(self, sock):
+        length = int(recv_exact(sock, 4), 16)
+        return recv_exact(sock, length).decode("utf-8")
+
+    def fail(self, sock, message):
+        data = message.encode("utf-8")
+        sock.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+    def handle_connection(self, sock):
+        try:
+            request = self.read_request(sock)
+            if request == "host:version":
+                sock.sendall(b"OKAY" + b"0004" + b"%04x" % 41)
+                return
+            if request == "host:devices":
+                body = self.devices_body()
+                sock.sendall(b"OKAY" + b"%04x" % len(body) + body)
+                return
+            if request == "host:track-devices":
+                sock.sendall(b"OKAY")
+                self.serve_tracking(sock)
+                return
+            if request.startswith("host:connect:") or request.startswith("host:disconnect:"):
+                action, serial = request[len("host:"):].split(":", 1)
+                self.set_state(serial, "device" if action == "connect" else None)
+                body = (f"connected to {serial}" if action == "connect" else f"disconnected {serial}").encode()
+                sock.sendall(b"OKAY" + b"%04x" % len(body) + body)
+                return
+            if not request.startswith("host:transport:"):
+                self.fail(sock, f"unknown host service: {request}")
+                return
+            serial = request[len("host:transport:"):]
+            if serial not in self.serials:
+                self.fail(sock, f"device '{serial}' not found")
+                return
+            sock.sendall(b"OKAY")
+
+            service = self.read_request(sock)
+            if service == "shell:sh":
+                sock.sendall(b"OKAY")
+                self.serve_session(sock)
+            elif service == f"localabstract:{AGENT_SOCKET}" and self.agent:
+                sock.sendall(b"OKAY")
+                serve_agent(sock, lambda: self.handler("uiautomator dump /dev/tty")[0].decode("utf-8"))
+            elif service.startswith("shell:") or service.startswith("exec:"):
+                sock.sendall(b"OKAY")
+                out, _ = self.execute(service.split(":", 1)[1])
+                sock.sendall(out)
+            else:
+                self.fail(sock, f"unknown service: {service}")
+        except Exception:
+            pass
+        finally:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def serve_tracking(self, sock):
+        """host:track-devices: полный список при подключении и на каждое изменение"""
+        while True:
+            with self.states_changed:
+                body = self.devices_body()
+            sock.sendall(b"%04x" % len(body) + body)
+            with self.states_changed:
+                self.states_changed.wait_for(lambda: self.devices_body() != body)
+
+    def serve_session(self, sock):
+        """Долгоживущая sh-сессия: разбираем кадры из adb_transport.frame_command"""
+        buf = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return
+            buf += chunk
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                m = FRAME_RE.match(line.decode("utf-8", errors="ignore"))
+                if not m:
+                    continue
+                out, rc = self.execute(m.group("cmd"))
+                sock.sendall(out + b"\n" + f"{m.group('token')} {rc}\n".encode())
+
+
+# ==========================================
+# МИНИ-КЛИЕНТ (аналог `adb -s <dev> shell <cmd>`)
+# ==========================================
+
+def client_main(port, serial, cmd):
+    """Один вызов как у adb.exe: соединиться, выполнить, напечатать вывод"""
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(encode_request(f"host:transport:{serial}"))
+    read_status(sock)
+    sock.sendall(encode_request(f"shell:{cmd}"))
+    read_status(sock)
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        sys.stdout.buffer.write(chunk)
+    sock.close()
+
+
+def bench(iterations=100, latency=0.0):
+    """Сравнение задержки: процесс на команду vs долгоживущая сессия"""
+    with FakeAdbServer(latency=latency) as server:
+        cmd = "input keyevent 67"
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--client", str(server.port), DEFAULT_SERIAL, cmd],
+                           capture_output=True)
+        per_process = (time.perf_counter() - start) / iterations
+
+        transport = SocketTransport(DEFAULT_SERIAL, port=server.port)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            transport.shell(cmd)
+        per_session = (time.perf_counter() - start) / iterations
+        transport.close()
+
+    print(f"subprocess на команду: {per_process * 1000:.2f} мс")
+    print(f"сокетная сессия:       {per_session * 1000:.2f} мс")
+    print(f"ускорение:             x{per_process / per_session:.1f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["--client"]:
+        client_main(int(args[1]), args[2], " ".join(args[3:]))
+    elif args[:1] == ["--serve"]:
+        port = int(args[1]) if len(args) > 1 else 5038
+        with FakeAdbServer(port=port) as server:
+            print(f"🧪 Фейковый adb-сервер на 127.0.0.1:{server.port} (устройство {DEFAULT_SERIAL})")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+    else:
+        n = int(args[1]) if args[:1] == ["--bench"] and len(args) > 1 else 100
+        bench(n)
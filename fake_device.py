@@ -0,0 +1,252 @@
+import random
+import re
+import threading
+import time
+from xml.sax.saxutils import quoteattr
+
+from fake_adb_server import DEFAULT_SERIAL, FakeAdbServer
+from ui_tree import UITree, node_matches
+
+# ==========================================
+# СКРИПТУЕМОЕ ФЕЙКОВОЕ УСТРОЙСТВО
+# ==========================================
+#
+# Граф экранов поверх fake_adb_server: каждый экран - дамп (записанный или
+# собранный из node_xml) и переходы по tap / keyevent / input text / времени.
+# Задержки команд и дампов, а также сбои uiautomator dump ("could not get
+# idle state") настраиваются, поэтому сценарии main.py (register_whatsapp,
+# setup_proxydroid) прогоняются целиком без MEmu.
+#
+#     device = FakeDevice([
+#         FakeScreen("eula", EULA_XML, taps=[({"resource_id": "com.whatsapp:id/eula_accept"}, "phone")]),
+#         FakeScreen("phone", PHONE_XML, ...),
+#     ], start="eula", dump_latency=0.3, dump_failures=0.1)
+#     with FakeDeviceSession(device, latency=0.02) as session:
+#         register_whatsapp(session.adb, "79000000000")
+#     print(session.report())
+#
+# Готовые графы WhatsApp / ProxyDroid и прогон с отчетом - benchmarks/bench_flow.py
+
+DUMP_FAILURE = b"ERROR: could not get idle state.\n"
+DUMP_FILE = "/data/local/tmp/window_dump.xml"
+
+
+def node_xml(text="", resource_id="", class_name="android.widget.TextView", bounds=(0, 0, 720, 100),
+             content_desc="", package="com.whatsapp", clickable=False, focused=False, children=""):
+    """Узел дампа uiautomator (для экранов без записанной фикстуры)"""
+    x1, y1, x2, y2 = bounds
+    attrs = {
+        "index": "0", "text": text, "resource-id": resource_id, "class": class_name, "package": package,
+        "content-desc": content_desc, "clickable": str(clickable).lower(), "enabled": "true",
+        "focused": str(focused).lower(), "bounds": f"[{x1},{y1}][{x2},{y2}]",
+    }
+    head = "<node " + " ".join(f"{k}={quoteattr(v)}" for k, v in attrs.items())
+    return f"{head}>{children}</node>" if children else head + " />"
+
+
+def screen_xml(*nodes):
+    """Дамп экрана 720x1280 из узлов node_xml"""
+    root = node_xml(resource_id="android:id/content", class_name="android.widget.FrameLayout",
+                    bounds=(0, 50, 720, 1280), children="".join(nodes))
+    return f"<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">{root}</hierarchy>"
+
+
+def unescape_text(arg):
+    """Аргумент `input text` (см. adb_input.escape_text) -> исходная строка"""
+    arg = arg.strip()
+    if len(arg) >= 2 and arg[0] == arg[-1] == "'":
+        arg = arg[1:-1].replace("'\\''", "'")
+    return arg.replace("%s", " ")
+
+
+class FakeScreen:
+    """
+    name     - имя экрана (для переходов и отчета)
+    xml      - дамп экрана
+    taps     - [(селектор ui_tree, экран)] - тап внутрь bounds узла -> переход
+    keys     - {keycode: экран}
+    texts    - [(regex, экран)] - `input text`, совпавший с regex -> переход
+    after    - (сек, экран) - сам сменяется через время (загрузка, "Инициализация...")
+    activity - окно в фокусе для dumpsys window и ответа am start -W
+    """
+
+    def __init__(self, name, xml, taps=(), keys=None, texts=(), after=None, activity=None):
+        self.name = name
+        self.xml = xml
+        self.tree = UITree.parse(xml)
+        self.taps = list(taps)
+        self.keys = keys or {}
+        self.texts = [(re.compile(pattern), target) for pattern, target in texts]
+        self.after = after
+        self.activity = activity or f"com.whatsapp/.{name}"
+
+    def tap_target(self, x, y):
+        for selector, target in self.taps:
+            for node in self.tree.nodes:
+                if node.bounds and node_matches(node, **selector):
+                    x1, y1, x2, y2 = node.bounds
+                    if x1 <= x < x2 and y1 <= y < y2:
+                        return target
+        return None
+
+
+class FakeDevice:
+    """
+    handler для FakeAdbServer: текущий экран графа + учет команд.
+    commands     - [(regex, экран)] для shell-команд вне экранов (am start, pm clear)
+    dump_latency - сколько "думает" uiautomator dump (сек)
+    dump_failures- доля дампов, падающих с "could not get idle state" (0..1)
+    props        - ответы getprop
+    """
+
+    def __init__(self, screens, start, commands=(), dump_latency=0.0, dump_failures=0.0, props=None, seed=0):
+        self.screens = {screen.name: screen for screen in screens}
+        self.commands = [(re.compile(pattern), target) for pattern, target in commands]
+        self.dump_latency = dump_latency
+        self.dump_failures = dump_failures
+        self.props = props or {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"dumps": 0, "dump_failures": 0, "taps": 0, "noop_taps": 0, "keys": 0, "texts": 0}
+        self.typed = []
+        self.path = []
+        self.go(start)
+
+    @property
+    def screen(self):
+        return self.screens[self.current]
+
+    def go(self, name):
+        self.current = name
+        self.entered = time.time()
+        self.path.append(name)
+
+    def _tick(self):
+        """Переходы по времени (экран мог смениться, пока к нему не обращались)"""
+        while self.screen.after and time.time() - self.entered >= self.screen.after[0]:
+            self.go(self.screen.after[1])
+
+    def __call__(self, cmd):
+        with self.lock:
+            self._tick()
+        if cmd.startswith("uiautomator dump"):
+            return self._dump(cmd)
+        with self.lock:
+            return self._command(cmd)
+
+    def _dump(self, cmd):
+        if self.dump_latency:
+            time.sleep(self.dump_latency)
+        with self.lock:
+            self._tick()
+            self.stats["dumps"] += 1
+            if self.dump_failures and self.random.random() < self.dump_failures:
+                self.stats["dump_failures"] += 1
+                return DUMP_FAILURE, 1
+            self.last_dump = self.screen.xml
+        target = cmd.split()[-1]
+        if target in ("/dev/tty", "/dev/stdout"):
+            return self.last_dump.encode("utf-8") + f"UI hierchary dumped to: {target}\n".encode(), 0
+        return f"UI hierchary dumped to: {target}\n".encode(), 0
+
+    def _command(self, cmd):
+        parts = cmd.split()
+        if cmd.startswith("cat " + DUMP_FILE):
+            return getattr(self, "last_dump", "").encode("utf-8"), 0
+        if parts[:2] == ["input", "tap"]:
+            self.stats["taps"] += 1
+            target = self.screen.tap_target(int(float(parts[2])), int(float(parts[3])))
+            if target:
+                self.go(target)
+            else:
+                self.stats["noop_taps"] += 1
+            return b"", 0
+        if parts[:2] == ["input", "keyevent"]:
+            # InputBatch склеивает подряд идущие keyevent в одну команду
+            for code in parts[2:]:
+                self.stats["keys"] += 1
+                target = self.screen.keys.get(int(code))
+                if target:
+                    self.go(target)
+            return b"", 0
+        if parts[:2] == ["input", "text"]:
+            self.stats["texts"] += 1
+            text = unescape_text(cmd.split(None, 2)[2])
+            self.typed.append((self.current, text))
+            for pattern, target in self.screen.texts:
+                if pattern.search(text):
+                    self.go(target)
+                    break
+            return b"", 0
+        if cmd.startswith("echo "):
+            return cmd[5:].encode("utf-8") + b"\n", 0
+        if parts[:1] == ["getprop"]:
+            return "".join(f"{self.props.get(name, '')}\n" for name in parts[1:2]).encode("utf-8"), 0
+        if cmd.startswith("wm size"):
+            return b"Physical size: 720x1280\n", 0
+        if cmd.startswith("dumpsys window"):
+            activity = self.screen.activity
+            return (f"  mCurrentFocus=Window{{1 u0 {activity}}}\n"
+                    f"  mFocusedApp=AppWindowToken{{2 token=Token{{3 ActivityRecord{{4 u0 {activity} t1}}}}}}\n"
+                    f"    mAppTransitionState=APP_STATE_IDLE\n").encode(), 0
+        for pattern, target in self.commands:
+            if pattern.search(cmd):
+                self.go(target)
+                break
+        if parts[:3] == ["am", "start", "-W"]:
+            return self._am_start_output().encode(), 0
+        return b"", 0
+
+    def _am_start_output(self):
+        """Ответ `am start -W` (время запуска - условное)"""
+        return (f"Starting: Intent {{ cmp={self.screen.activity} }}\nStatus: ok\nLaunchState: COLD\n"
+                f"Activity: {self.screen.activity}\nTotalTime: 250\nWaitTime: 260\nComplete\n")
+
+
+class FakeDeviceSession:
+    """FakeAdbServer с FakeDevice + ADBController к нему; report() - сводка прогона"""
+
+    def __init__(self, device, latency=0.0, agent=False, serial=DEFAULT_SERIAL, coord_cache="off"):
+        self.device = device
+        # Кэш координат: "off" (по умолчанию) или путь к файлу - общий для нескольких прогонов
+        self.coord_cache = coord_cache
+        self.server = FakeAdbServer(serials=(serial,), handler=device, latency=latency, agent=agent)
+        self.serial = serial
+        self.adb = None
+        self.started = None
+        self.ended = None
+
+    def __enter__(self):
+        from adb_transport import SocketTransport
+        from coord_cache import CoordCache
+        from adb_controller import ADBController
+        from ui_wait import UIWaiter
+
+        self.server.start()
+        self.adb = ADBController(self.serial, transport=SocketTransport(self.serial, port=self.server.port))
+        # Поток событий фейковый сервер не отдает - работаем опросом
+        self.adb.waiter = UIWaiter(self.adb, source="off")
+        self.adb.agent.enabled = self.server.agent
+        self.adb.coords = CoordCache(self.adb, path=self.coord_cache)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ended = time.perf_counter()
+        self.adb.coords.save()
+        self.adb.close()
+        self.adb.transport.close()
+        self.server.stop()
+        return False
+
+    def report(self):
+        """Время, round trip'ы к устройству, дампы, путь по экранам"""
+        wall = (self.ended or time.perf_counter()) - self.started
+        return {
+            "wall_s": round(wall, 3),
+            "round_trips": len(self.server.commands),
+            **self.device.stats,
+            "coord_cache": self.adb.coords.stats,
+            "final": self.device.current,
+            "path": self.device.path,
+        }
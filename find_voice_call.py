@@ -1,103 +1,77 @@
 import os
 import sys
-import subprocess
-from appium import webdriver
-from appium.webdriver.common.appiumby import AppiumBy
 
+from selector_catalog import SelectorCatalog
+from ui_backend import open_backend
 
-def connect_driver(device_name: str):
-    caps = {
-        "platformName": "Android",
-        "automationName": "UiAutomator2",
-        "deviceName": device_name,
-        "udid": device_name,
-        "appPackage": "com.whatsapp",
-        "appActivity": "com.whatsapp.Main",
-        "autoLaunch": False,
-        "appWaitActivity": "*",
-        "noReset": True,
-        "fullReset": False,
-        "newCommandTimeout": 1200,
-    }
-    return webdriver.Remote("http://localhost:4723", caps)
+# Строка списка способов: подпись reg_method_name с нужным текстом -> чекбокс той же строки
+METHOD_NAME = 'new UiSelector().resourceId("com.whatsapp:id/reg_method_name").text("{label}")'
+METHOD_CHECKBOX = '.fromParent(new UiSelector().resourceId("com.whatsapp:id/reg_method_checkbox"))'
 
 
-def try_find_voice_call(driver, device):
+def call_method_selectors(ui):
+    """{селектор чекбокса: подпись} для подписей "call_method" из каталога (язык - с устройства у adb)"""
+    catalog = getattr(getattr(ui, "adb", None), "catalog", None) or SelectorCatalog(None)
+    return {METHOD_NAME.format(label=label) + METHOD_CHECKBOX: label for label in catalog.labels("call_method")}
+
+
+def try_find_voice_call(ui):
     """
     Кликаем вариант "Аудиозвонок":
-    - перечисляем все reg_method_name и reg_method_checkbox
-    - находим индекс с текстом "Аудиозвонок"
-    - тапаем по центру соответствующего checkbox через adb (MEmu adb)
+    - один селектор на подпись из каталога: reg_method_name с этим текстом и
+      reg_method_checkbox из той же строки (fromParent)
+    - все подписи проверяются по одному снимку (find_any)
+    - тапаем по центру найденного checkbox
     """
-    adb = r"C:\Program Files\Microvirt\MEmu\adb.exe"
     try:
-        names = driver.find_elements(AppiumBy.ANDROID_UIAUTOMATOR, 'new UiSelector().resourceId("com.whatsapp:id/reg_method_name")')
-        boxes = driver.find_elements(AppiumBy.ANDROID_UIAUTOMATOR, 'new UiSelector().resourceId("com.whatsapp:id/reg_method_checkbox")')
-        if not names or not boxes:
-            print("MISS: нет reg_method_name или reg_method_checkbox")
-            return False
-
-        target_idx = None
-        for idx, el in enumerate(names):
-            try:
-                txt = el.text
-            except Exception:
-                txt = ""
-            print(f"[{idx}] reg_method_name = '{txt}'")
-            if txt.strip() == "Аудиозвонок":
-                target_idx = idx
-
-        if target_idx is None or target_idx >= len(boxes):
-            print("MISS: 'Аудиозвонок' не найден среди reg_method_name")
+        selectors = call_method_selectors(ui)
+        found = ui.find_any(list(selectors))
+        if not found:
+            print(f"MISS: нет reg_method_checkbox рядом с {list(selectors.values())}")
             return False
 
-        box = boxes[target_idx].rect
-        tap_x = box["x"] + box["width"] // 2
-        tap_y = box["y"] + box["height"] // 2
-        subprocess.run([adb, "-s", device, "shell", "input", "tap", str(tap_x), str(tap_y)], check=True)
-        print(f"✓ adb tap 'Аудиозвонок' @ ({tap_x},{tap_y}) через {adb}")
+        selector, box = found
+        ui.tap(box["x"], box["y"])
+        print(f"✓ tap '{selectors[selector]}' @ ({box['x']},{box['y']}) через {ui.name}")
         return True
     except Exception as e:
         print(f"MISS 'Аудиозвонок': {e}")
         return False
 
 
-def try_find_continue(driver):
+def try_find_continue(ui):
     selectors = [
         'new UiSelector().resourceId("com.whatsapp:id/continue_button").clickable(true)',
         'new UiSelector().text("ПРОДОЛЖИТЬ").clickable(true)',
         'new UiSelector().text("Продолжить").clickable(true)',
         'new UiSelector().text("CONTINUE").clickable(true)',
     ]
-    for sel in selectors:
-        try:
-            el = driver.find_element(AppiumBy.ANDROID_UIAUTOMATOR, sel)
-            print(f"FOUND continue by: {sel}")
-            el.click()
-            print("CLICKED continue")
-            return True
-        except Exception as e:
-            print(f"MISS  continue by: {sel} -> {e}")
-    return False
+    found = ui.find_any(selectors)
+    if not found:
+        print(f"MISS  continue: ни один из {len(selectors)} селекторов")
+        return False
+    sel, el = found
+    print(f"FOUND continue by: {sel}")
+    ui.click(el)
+    print("CLICKED continue")
+    return True
 
 
 def main():
     device = os.getenv("MEMU_DEVICE", "127.0.0.1:21613")
     try:
-        driver = connect_driver(device)
+        # UI_BACKEND=appium - по-старому через Appium-сервер
+        ui = open_backend(device_name=device, caps={"newCommandTimeout": 1200, "appWaitActivity": "*"})
     except Exception as e:
         print(f"Cannot connect driver: {e}")
         sys.exit(1)
 
     try:
-        ok_voice = try_find_voice_call(driver, device)
+        ok_voice = try_find_voice_call(ui)
         if not ok_voice:
             print("Voice call NOT clicked")
     finally:
-        try:
-            driver.quit()
-        except Exception:
-            pass
+        ui.close()
 
 
 if __name__ == "__main__":
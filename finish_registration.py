@@ -1,41 +1,16 @@
-import subprocess
 import time
 import os
-import sys
-from appium import webdriver
-from appium.webdriver.common.appiumby import AppiumBy
+
+from device_registry import DEFAULT_SERIAL, get_registry
+from ui_backend import open_backend
 
 # Путь к ADB
 ADB_PATH = os.getenv("ADB_PATH") or r"C:\Program Files\Microvirt\MEmu\adb.exe"
 
 def get_first_device():
-    try:
-        res = subprocess.run([ADB_PATH, "devices"], capture_output=True, text=True)
-        import re
-        match = re.search(r"(127\.0\.0\.1:2\d{4})\s+device", res.stdout)
-        if match:
-            return match.group(1)
-    except:
-        pass
-    return "127.0.0.1:21503"
+    return get_registry(ADB_PATH).first_device() or DEFAULT_SERIAL
 
-def connect_driver(device_name):
-    print(f"🔌 Подключаюсь к {device_name}...")
-    caps = {
-        "platformName": "Android",
-        "automationName": "UiAutomator2",
-        "deviceName": device_name,
-        "udid": device_name,
-        "appPackage": "com.whatsapp",
-        "appActivity": "com.whatsapp.Main",
-        "autoLaunch": False,
-        "noReset": True,
-        "fullReset": False,
-        "newCommandTimeout": 600,
-    }
-    return webdriver.Remote("http://localhost:4723", caps)
-
-def finish_reg(driver):
+def finish_reg(ui):
     print("⏳ Ищу поле ввода имени...")
     
     # 1. Ввод имени
@@ -50,19 +25,14 @@ def finish_reg(driver):
             'new UiSelector().textContains("Введите ваше имя")',
         ]
         
-        for sel in selectors:
-            try:
-                els = driver.find_elements(AppiumBy.ANDROID_UIAUTOMATOR, sel)
-                if els:
-                    name_input = els[0]
-                    print(f"✓ Найдено поле имени по селектору: {sel}")
-                    break
-            except: pass
+        # Все селекторы проверяются по одному снимку экрана
+        found = ui.find_any(selectors)
+        if found:
+            sel, name_input = found
+            print(f"✓ Найдено поле имени по селектору: {sel}")
             
         if name_input:
-            name_input.click()
-            name_input.clear()
-            name_input.send_keys("Alex")
+            ui.type_text(name_input, "Alex")
             print("✓ Имя 'Alex' введено")
             time.sleep(1)
             
@@ -70,7 +40,7 @@ def finish_reg(driver):
             # или 'Enter'
             try:
                 # 66 = ENTER / Action Down
-                driver.press_keycode(66)
+                ui.keyevent(66)
                 print("✓ Нажат Enter (код 66)")
             except: pass
             
@@ -92,17 +62,13 @@ def finish_reg(driver):
             'new UiSelector().text("Далее")',
         ]
         
-        for sel in selectors:
-            try:
-                els = driver.find_elements(AppiumBy.ANDROID_UIAUTOMATOR, sel)
-                if els:
-                    next_btn = els[0]
-                    print(f"✓ Найдена кнопка Next по селектору: {sel}")
-                    break
-            except: pass
+        found = ui.find_any(selectors)
+        if found:
+            sel, next_btn = found
+            print(f"✓ Найдена кнопка Next по селектору: {sel}")
             
         if next_btn:
-            next_btn.click()
+            ui.click(next_btn)
             print("✓ Кнопка Next нажата")
             time.sleep(3)
         else:
@@ -120,15 +86,16 @@ def main():
     device = get_first_device()
     print(f"📱 Device: {device}")
     
-    driver = None
+    ui = None
     try:
-        driver = connect_driver(device)
-        finish_reg(driver)
+        # UI_BACKEND=appium - по-старому через Appium-сервер
+        ui = open_backend(device_name=device)
+        finish_reg(ui)
     except Exception as e:
         print(f"❌ Error: {e}")
     finally:
-        if driver:
-            driver.quit()
+        if ui:
+            ui.close()
 
 if __name__ == "__main__":
     main()
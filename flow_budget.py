@@ -0,0 +1,135 @@
+import contextlib
+import contextvars
+import time
+
+from adb_metrics import METRICS
+from session_trace import TRACE
+
+# ==========================================
+# БЮДЖЕТЫ ВРЕМЕНИ ФАЗ СЦЕНАРИЯ
+# ==========================================
+#
+# Каждая фаза объявляет общий бюджет; все вложенные ожидания (UIWaiter.wait,
+# ScreenMachine.run, sleep, ожидание звонка) берут таймаут из остатка
+# текущей фазы, а не складывают свои. Вложенная фаза не может пережить
+# родительскую. Одиночная adb-команда не обрывается, поэтому превышение
+# бюджета ограничено таймаутом одной команды.
+#
+#     with StepScheduler("регистрация", 500) as steps:
+#         with steps.phase("экраны", 120) as phase:
+#             machine.run(timeout=phase.remaining())
+#             adb.click_any([...], timeout=5)     # не дольше остатка фазы
+#
+# По выходу печатается таблица: фаза, бюджет, факт.
+
+# Опрос у дедлайна: интервал не больше доли остатка, но не чаще POLL_FLOOR
+POLL_SHARE = 0.25
+POLL_FLOOR = 0.05
+# Превышение меньше этого - погрешность (хвост последней команды), не перерасход
+OVERRUN_SLACK = 0.5
+
+# Стек фаз - в contextvars, а не в threading.local: asyncio.to_thread копирует
+# контекст, и функция в рабочем потоке (ожидание звонка в wait_dismissing)
+# видит фазу вызывающего
+_phases = contextvars.ContextVar("flow_budget_phases", default=())
+
+
+def current():
+    """Текущая фаза или None (вне бюджета)"""
+    stack = _phases.get()
+    return stack[-1] if stack else None
+
+
+def cap(timeout):
+    """Таймаут, урезанный остатком текущей фазы (вне фаз - как есть)"""
+    phase = current()
+    return phase.cap(timeout) if phase else timeout
+
+
+def poll_interval(interval, remaining):
+    """Интервал опроса, подогнанный под остаток ожидания"""
+    return max(min(interval, remaining * POLL_SHARE), min(POLL_FLOOR, remaining))
+
+
+def sleep(seconds, reason=""):
+    """TRACE.sleep в пределах бюджета текущей фазы"""
+    seconds = cap(seconds)
+    if seconds > 0:
+        TRACE.sleep(seconds, reason)
+
+
+class Phase:
+    def __init__(self, name, budget, parent=None):
+        self.name = name
+        self.budget = budget
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 0
+        self.started = time.time()
+        self.deadline = self.started + budget
+        if parent:
+            self.deadline = min(self.deadline, parent.deadline)
+        self.ended = None
+
+    @property
+    def elapsed(self):
+        return (self.ended or time.time()) - self.started
+
+    def remaining(self):
+        return max(self.deadline - time.time(), 0.0)
+
+    def cap(self, timeout):
+        return min(timeout, self.remaining())
+
+    @property
+    def expired(self):
+        return time.time() >= self.deadline
+
+
+class StepScheduler:
+    """Корневая фаза сценария + учет вложенных фаз для отчета"""
+
+    def __init__(self, name, budget):
+        self.name = name
+        self.budget = budget
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name, budget):
+        parent = current()
+        phase = Phase(name, budget, parent)
+        self.phases.append(phase)
+        token = _phases.set(_phases.get() + (phase,))
+        started = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            _phases.reset(token)
+            phase.ended = time.time()
+            if TRACE.enabled:
+                TRACE.record(name, "phase", started, time.perf_counter(), budget=budget)
+            if METRICS.enabled:
+                METRICS.observe("flow_phase_seconds", phase.elapsed, phase=name)
+                METRICS.event("phase", phase=name, budget=budget, seconds=round(phase.elapsed, 3),
+                              overrun=phase.elapsed > budget)
+
+    def __enter__(self):
+        self._root = self.phase(self.name, self.budget)
+        self._root.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._root.__exit__(*exc)
+        self.report()
+        return False
+
+    def report(self):
+        """Фаза, бюджет, факт; исчерпанные и превышенные помечены"""
+        print(f"⏱️ Бюджеты фаз ({self.name}):")
+        for phase in self.phases:
+            mark = "✓"
+            if phase.elapsed > phase.budget + OVERRUN_SLACK:
+                mark = f"⚠️ +{phase.elapsed - phase.budget:.1f} сек"
+            elif phase.ended and phase.ended >= phase.deadline:
+                mark = "⏱️ исчерпан"
+            label = "  " * phase.depth + phase.name
+            print(f"   {label:<24} бюджет {phase.budget:>6.1f} сек, факт {phase.elapsed:>6.1f} сек  {mark}")
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+
+from adb_metrics import METRICS
+from adb_transport import AdbTransportError
+from session_trace import TRACE
+from ui_tree import UINode, UITree
+
+# ==========================================
+# АГЕНТ ИЕРАРХИИ НА УСТРОЙСТВЕ (ОПЦИОНАЛЬНО)
+# ==========================================
+#
+# `uiautomator dump` стоит секунду и больше и падает на "could not get idle
+# state". Агент (app_process jar с постоянным accessibility-соединением)
+# держит abstract-сокет на устройстве и отдает иерархию компактным JSON.
+# Снимок берется у агента, если он отвечает, иначе как раньше через
+# uiautomator dump - для кода выше (UIWaiter, find_element) разницы нет.
+#
+# Подключение: сервис localabstract:<AGENT_SOCKET> через то же соединение с
+# adb-сервером (то, что делает `adb forward`, без порта на хосте); без
+# сокетного транспорта - `adb forward tcp:0`; UI_AGENT_ADDR=host:port -
+# готовый проброшенный порт (или локальная заглушка для отладки).
+#
+# Протокол - JSON по строке на запрос и ответ:
+#   {"op": "ping"}                               -> {"ok": true, "version": 1}
+#   {"op": "hierarchy"}                          -> {"ok": true, "rows": [...]}
+#   {"op": "query", "selectors": [{...}], "limit": 1}
+#                                                -> {"ok": true, "rows": [...]}  только совпавшие
+#   ошибка                                       -> {"ok": false, "error": "..."}
+# Строки узлов - формат ui_tree (UINode.as_row), селекторы - словари ui_tree.
+#
+# Сам агент (исходники и сборка uiagent.jar) в репозиторий еще не добавлен -
+# это следующий шаг. Поэтому по умолчанию клиент выключен и сессия не тратит
+# время на заливку несуществующего jar и повторные попытки подключения.
+#
+# UI_AGENT=off (по умолчанию) - только uiautomator.
+# UI_AGENT=auto - агент, если отвечает; если нет и рядом есть uiagent.jar -
+# один раз заливаем и запускаем его.
+
+UI_AGENT = (os.getenv("UI_AGENT") or "off").lower()
+UI_AGENT_ADDR = os.getenv("UI_AGENT_ADDR")
+
+AGENT_SOCKET = "uiagent"
+AGENT_JAR = os.getenv("UI_AGENT_JAR") or "uiagent.jar"
+AGENT_REMOTE = "/data/local/tmp/uiagent.jar"
+AGENT_MAIN = "com.wajusttest.uiagent.Main"
+AGENT_VERSION = 1
+
+# Таймаут запроса, ожидание запуска и пауза перед новой попыткой после отказа (сек)
+AGENT_TIMEOUT = 5
+AGENT_START_TIMEOUT = 5
+AGENT_RETRY = 60
+
+
+class HierarchyAgent:
+    """Клиент агента для одного ADBController; None из методов = агента нет, идем в uiautomator"""
+
+    def __init__(self, adb, connect=None, mode=UI_AGENT):
+        self.adb = adb
+        # connect() -> сокет; по умолчанию см. _open
+        self.connect = connect
+        self.enabled = mode != "off"
+        self.sock = None
+        self.reader = None
+        self.lock = threading.Lock()
+        self.retry_at = 0.0
+        self.start_tried = False
+        self.announced = False
+        self.reported_missing = False
+        # Порт `adb forward tcp:0` (режим без сокетного транспорта): один на сессию, снимается в close
+        self.forward_port = None
+        # md5 последнего ответа hierarchy - по нему UIWaiter не пересобирает дерево
+        self.digest = None
+
+    # --- запросы ---
+
+    def tree(self):
+        """UITree всего экрана или None"""
+        reply = self.request({"op": "hierarchy"})
+        if reply is None:
+            return None
+        return UITree.from_rows(reply["rows"])
+
+    def query(self, selectors, limit=0):
+        """Только совпавшие узлы (любой из селекторов-словарей) или None"""
+        reply = self.request({"op": "query", "selectors": selectors, "limit": limit})
+        if reply is None:
+            return None
+        return [UINode.from_row(i, None, row) for i, row in enumerate(reply["rows"])]
+
+    def request(self, payload, timeout=AGENT_TIMEOUT):
+        """Ответ агента (dict) или None, если агент недоступен"""
+        if not self.enabled or time.time() < self.retry_at:
+            return None
+        started = time.perf_counter()
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self._connect()
+                self.sock.settimeout(timeout)
+                self.sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+                line = self.reader.readline()
+                if not line:
+                    raise ConnectionError("агент закрыл соединение")
+                reply = json.loads(line)
+                if not isinstance(reply, dict):
+                    raise ValueError(f"ответ агента не объект: {line[:80]!r}")
+            except (OSError, ValueError, AdbTransportError, subprocess.SubprocessError) as e:
+                self._drop(e)
+                return None
+        ended = time.perf_counter()
+        if payload["op"] == "hierarchy":
+            self.digest = hashlib.md5(line).digest()
+        if TRACE.enabled:
+            TRACE.record(f"agent {payload['op']}", "dump", started, ended, bytes=len(line), ok=reply.get("ok"))
+        if METRICS.enabled:
+            METRICS.observe("adb_agent_seconds", ended - started, op=payload["op"])
+            METRICS.count("adb_agent_bytes_total", len(line), op=payload["op"])
+        if not reply.get("ok"):
+            print(f"⚠️ Агент иерархии: {reply.get('error')}")
+            return None
+        return reply
+
+    # --- соединение ---
+
+    def _open(self):
+        if self.connect:
+            return self.connect()
+        if UI_AGENT_ADDR:
+            host, port = UI_AGENT_ADDR.rsplit(":", 1)
+            return socket.create_connection((host, int(port)), timeout=AGENT_TIMEOUT)
+        if self.adb.transport:
+            return self.adb.transport.open_stream(f"localabstract:{AGENT_SOCKET}", timeout=AGENT_TIMEOUT)
+        if self.forward_port is None:
+            res = subprocess.run([self.adb.adb, "-s", self.adb.device_name, "forward", "tcp:0",
+                                  f"localabstract:{AGENT_SOCKET}"], capture_output=True, text=True, timeout=10)
+            if res.returncode != 0 or not res.stdout.strip().isdigit():
+                raise AdbTransportError(f"adb forward: {res.stderr.strip() or res.stdout.strip()}")
+            self.forward_port = int(res.stdout)
+        return socket.create_connection(("127.0.0.1", self.forward_port), timeout=AGENT_TIMEOUT)
+
+    def _remove_forward(self):
+        if self.forward_port is None:
+            return
+        try:
+            subprocess.run([self.adb.adb, "-s", self.adb.device_name, "forward", "--remove",
+                            f"tcp:{self.forward_port}"], capture_output=True, text=True, timeout=10)
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"⚠️ Не удалось снять adb forward tcp:{self.forward_port} ({e})")
+        self.forward_port = None
+
+    def _handshake(self):
+        sock = self._open()
+        reader = sock.makefile("rb")
+        try:
+            sock.settimeout(AGENT_TIMEOUT)
+            sock.sendall(b'{"op": "ping"}\n')
+            reply = json.loads(reader.readline() or b"{}")
+            if not isinstance(reply, dict):
+                raise ValueError(f"ответ агента не объект: {reply!r}")
+        except (OSError, ValueError):
+            sock.close()
+            raise
+        if reply.get("version") != AGENT_VERSION:
+            sock.close()
+            raise ConnectionError(f"неподдерживаемая версия агента: {reply.get('version')}")
+        self.sock, self.reader = sock, reader
+
+    def _connect(self):
+        try:
+            self._handshake()
+        except (OSError, ValueError, AdbTransportError):
+            if self.start_tried or not self.start():
+                raise
+        if not self.announced:
+            print("🤖 Агент иерархии подключен - снимки без uiautomator dump")
+            self.announced = True
+
+    def start(self):
+        """Залить и запустить агент (один раз за сессию, если есть AGENT_JAR). True - отвечает."""
+        self.start_tried = True
+        if not os.path.exists(AGENT_JAR):
+            return False
+        print(f"🤖 Запускаю агент иерархии ({AGENT_JAR})...")
+        res = subprocess.run([self.adb.adb, "-s", self.adb.device_name, "push", AGENT_JAR, AGENT_REMOTE],
+                             capture_output=True, text=True, timeout=30)
+        if res.returncode != 0:
+            print(f"⚠️ Не удалось залить агент: {res.stderr.strip()}")
+            return False
+        self.adb.run_shell(f"CLASSPATH={AGENT_REMOTE} nohup app_process / {AGENT_MAIN} {AGENT_SOCKET} "
+                           f">/dev/null 2>&1 &")
+        deadline = time.time() + AGENT_START_TIMEOUT
+        while time.time() < deadline:
+            try:
+                self._handshake()
+                return True
+            except (OSError, ValueError, AdbTransportError):
+                time.sleep(0.2)
+        return False
+
+    def _drop(self, error):
+        if self.sock is not None:
+            print(f"⚠️ Агент иерархии отвалился ({error}), снимки через uiautomator")
+        elif not self.reported_missing:
+            print("ℹ️ Агент иерархии не найден - снимки через uiautomator dump")
+            self.reported_missing = True
+        self.close()
+        self.retry_at = time.time() + AGENT_RETRY
+        if METRICS.enabled:
+            METRICS.count("adb_agent_failures_total")
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.reader = None
+        self._remove_forward()
@@ -7,123 +7,26 @@ import requests
 import threading
 from pathlib import Path
 
-# ==========================================
-# КОНФИГУРАЦИЯ
-# ==========================================
-
-# Путь к ADB (для Windows с MEMU)
-ADB_PATH = os.getenv("ADB_PATH") or r"C:\Program Files\Microvirt\MEmu\adb.exe"
+import app_launch
+import flow_budget
+from adb_metrics import start_profiling
+from adb_controller import ADBController
+from adb_transport import ADB_PATH, AdbTransportError
+from async_adb import wait_dismissing
+from device_ready import wait_ready
+from device_registry import get_registry
+from flow_budget import StepScheduler
+from screen_flow import STOP, Screen, ScreenMachine
+from session_trace import TRACE
+from ui_selector import select
+from visual_locator import VisualLocatorError
 
 # ==========================================
-# ADB CONTROLLER (ЗАМЕНА APPIUM)
+# КОНФИГУРАЦИЯ
 # ==========================================
 
-class ADBController:
-    def __init__(self, device_name):
-        self.device_name = device_name
-        self.adb = ADB_PATH
-
-    def run_shell(self, cmd, timeout=10):
-        """Выполнить shell команду"""
-        full_cmd = [self.adb, "-s", self.device_name, "shell"] + cmd.split()
-        try:
-            return subprocess.run(full_cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=timeout)
-        except subprocess.TimeoutExpired:
-            print(f"⚠️ Timeout команды: {cmd}")
-            return None
-
-    def tap(self, x, y):
-        """Клик по координатам"""
-        self.run_shell(f"input tap {x} {y}")
-
-    def text(self, text):
-        """Ввод текста"""
-        # Экранирование пробелов и спецсимволов для ADB
-        escaped_text = text.replace(" ", "%s").replace("'", r"\'")
-        self.run_shell(f"input text {escaped_text}")
-
-    def keyevent(self, keycode):
-        """Нажатие кнопки (66=ENTER, 67=BACKSPACE, 3=HOME)"""
-        self.run_shell(f"input keyevent {keycode}")
-
-    def get_ui_dump(self):
-        """Получить XML текущего экрана через uiautomator"""
-        remote_dump = "/data/local/tmp/window_dump.xml"
-        
-        # 1. Создаем дамп на устройстве
-        # Иногда uiautomator падает, поэтому пробуем пару раз
-        for _ in range(2):
-            res = self.run_shell(f"uiautomator dump {remote_dump}", timeout=15)
-            if res and "UI hierchary dumped to" in res.stdout:
-                break
-            time.sleep(1)
-
-        # 2. Читаем файл прямо через cat (быстрее, чем pull)
-        res = self.run_shell(f"cat {remote_dump}", timeout=5)
-        if res and res.stdout:
-            return res.stdout
-        return ""
-
-    def find_element(self, text=None, resource_id=None, class_name=None, index=0):
-        """
-        Ищет элемент в XML дампе.
-        Возвращает словарь {x, y, bounds} или None.
-        """
-        xml = self.get_ui_dump()
-        if not xml:
-            return None
-
-        # Формируем паттерн поиска
-        # Пример: <node index="0" text="AGREE" resource-id="id" ... bounds="[0,0][100,100]" />
-        
-        # Простой парсинг регулярками (быстрее lxml для простых задач)
-        # Ищем все ноды
-        nodes = re.findall(r'<node [^>]*>', xml)
-        
-        matches = []
-        for node in nodes:
-            # Проверяем условия
-            if text and text.lower() not in node.lower():
-                continue
-            if resource_id and resource_id not in node:
-                continue
-            if class_name and class_name not in node:
-                continue
-            
-            # Если совпало, достаем координаты
-            bounds_match = re.search(r'bounds="\[(\d+),(\d+)\]\[(\d+),(\d+)\]"', node)
-            if bounds_match:
-                x1, y1, x2, y2 = map(int, bounds_match.groups())
-                center_x = (x1 + x2) // 2
-                center_y = (y1 + y2) // 2
-                matches.append({'x': center_x, 'y': center_y, 'raw': node})
-
-        if len(matches) > index:
-            return matches[index]
-        return None
-
-    def click_element(self, text=None, resource_id=None, timeout=10):
-        """Ждет элемент и кликает по нему"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            el = self.find_element(text=text, resource_id=resource_id)
-            if el:
-                print(f"✓ Клик по '{text or resource_id}' ({el['x']}, {el['y']})")
-                self.tap(el['x'], el['y'])
-                return True
-            time.sleep(1)
-        print(f"⚠️ Элемент '{text or resource_id}' не найден за {timeout} сек")
-        return False
-
-    def wait_for_element(self, text=None, resource_id=None, class_name=None, timeout=20):
-        """Ждет появления элемента"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            el = self.find_element(text=text, resource_id=resource_id, class_name=class_name)
-            if el:
-                return True
-            time.sleep(1)
-        return False
+# Путь к ADB - adb_transport.ADB_PATH, настройки дампа UI - ui_dump,
+# сам ADBController - adb_controller
 
 # ==========================================
 # ЛОГИКА WHATSAPP
@@ -138,156 +41,206 @@ def setup_proxydroid(adb: ADBController):
     if os.path.exists(local_conf):
         print("📂 Загружаю конфиг...")
         adb.run_shell("am force-stop org.proxydroid")
-        subprocess.run([ADB_PATH, "-s", adb.device_name, "push", local_conf, "/data/data/org.proxydroid/shared_prefs/org.proxydroid_preferences.xml"], capture_output=True)
+        try:
+            subprocess.run([ADB_PATH, "-s", adb.device_name, "push", local_conf, "/data/data/org.proxydroid/shared_prefs/org.proxydroid_preferences.xml"], capture_output=True)
+        except OSError as e:
+            print(f"⚠️ Не удалось залить конфиг ({e})")
         adb.run_shell("chmod 777 /data/data/org.proxydroid/shared_prefs/org.proxydroid_preferences.xml")
     
     # 2. Запускаем приложение (GUI), чтобы точно триггернуть запрос прав
-    adb.run_shell("am start -n org.proxydroid/.MainActivity")
-    time.sleep(3)
+    app_launch.launch(adb, "org.proxydroid/.MainActivity")
 
     # 2.1 Запускаем сервис (на всякий случай)
     adb.run_shell("am startservice -n org.proxydroid/.ProxyDroidService")
     adb.run_shell("am broadcast -a org.proxydroid.intent.action.START")
-    time.sleep(2)
+    # Диалог прав появляется с анимацией - ждем ее конца, а не фиксированные 2 сек
+    app_launch.wait_idle(adb, timeout=2)
     
     # 3. Обработка диалогов (Хорошо -> Grant)
     print("🕵️ Проверяю диалоги прав...")
     
     # Кнопка "Хорошо" / "OK" в первом диалоге
-    if adb.click_element(text="Хорошо", timeout=5) or adb.click_element(text="OK", timeout=1):
-        time.sleep(1)
+    if adb.click_any(adb.catalog.selectors("ok"), timeout=5):
+        app_launch.wait_idle(adb, timeout=1)
     
     # Кнопка "Grant" / "Разрешить" (Root)
-    # Ищем по разным словам
-    for txt in ["Grant", "Allow", "Разрешить", "Предоставить"]:
-        if adb.click_element(text=txt, timeout=2):
-            break
+    adb.click_any(adb.catalog.selectors("grant"), timeout=4)
 
     print("✓ ProxyDroid настроен (надеюсь)")
 
+# ==========================================
+# ЭКРАНЫ WHATSAPP
+# ==========================================
+
+def on_tap(message=None):
+    """Обработчик: тап по найденному элементу-подписи"""
+    def handler(machine, tree, el):
+        machine.adb.tap(el['x'], el['y'])
+        if message:
+            print(message)
+    return handler
+
+# Поля ввода на экране номера: [0] - код страны, [1] - телефон
+PHONE_FIELDS = 'new UiSelector().className("android.widget.EditText")'
+
+def has_phone_fields(tree):
+    return len(select(tree, PHONE_FIELDS)) >= 2 or \
+        tree.get(resource_id="com.whatsapp:id/registration_submit") is not None
+
+def on_phone_entry(machine, tree, el):
+    """Код страны + телефон, затем Next"""
+    adb = machine.adb
+    if not machine.context.get('phone_typed'):
+        # Оба поля из одного снимка
+        fields = select(tree, PHONE_FIELDS)
+        if len(fields) < 2:
+            print("❌ Не удалось найти координаты полей ввода")
+            return None
+        cc_field, phone_field = fields[0].as_element(), fields[1].as_element()
+
+        print("   Ввожу код страны и телефон...")
+        phone_number = machine.context['phone_number']
+        phone_clean = phone_number.replace("+7", "").replace("7", "", 1) if phone_number.startswith("7") or phone_number.startswith("+7") else phone_number
+        # Тап -> очистка (несколько раз Backspace) -> код -> тап -> телефон одним вызовом
+        with adb.batch() as b:
+            b.tap(cc_field['x'], cc_field['y']).pause(0.5)
+            b.keyevent(67, repeat=5).text("7")
+            b.tap(phone_field['x'], phone_field['y']).pause(0.5)
+            b.text(phone_clean)
+        if not all(r['ok'] for r in b.results):
+            print(f"⚠️ Часть шагов ввода не выполнилась: {[r['step'] for r in b.results if not r['ok']]}")
+        machine.context['phone_typed'] = True
+
+    # Next - один раз за заход на экран: если экран не сменился за settle, это
+    # обычно долгое "Подключение…", а не пропущенный клик
+    if machine.repeats > 1 and machine.context.get('phone_next'):
+        print("⏳ 'Next' уже нажат, жду смены экрана...")
+        return None
+
+    # Жмем NEXT (клавиатура могла сдвинуть кнопку - берем свежий снимок)
+    print("⏳ Жму 'Next'...")
+    machine.context['phone_next'] = adb.click_any(adb.catalog.selectors("next"), timeout=5) is not None
+
+def on_call_method(machine, tree, el):
+    """Выбираем Call Me и жмем "Продолжить" (если есть кнопка)"""
+    machine.adb.tap(el['x'], el['y'])
+    print("✓ Запрошен звонок (выбран пункт)")
+    # Иногда это радиобаттон и нужна кнопка внизу
+    if machine.adb.click_any(machine.adb.catalog.selectors("continue"), timeout=2):
+        print("✓ Нажата кнопка 'Продолжить'")
+    return STOP
+
+def on_code_entry(machine, tree, el):
+    """Экран ввода кода без ссылки 'Verify another way' - ждем ее немного и идем дальше"""
+    since = machine.context.setdefault('code_entry_since', time.time())
+    if time.time() - since > 10:
+        return STOP
+
+def on_name_entry(machine, tree, el):
+    """Ввод имени и Далее"""
+    adb = machine.adb
+    if not machine.context.get('name_typed'):
+        # Клик в поле (на всякий случай)
+        adb.tap(el['x'], el['y'])
+        with adb.batch() as b:
+            b.text("Alex").keyevent(66) # ENTER (скрыть клаву / подтвердить)
+        print("✓ Имя 'Alex' введено")
+        machine.context['name_typed'] = True
+
+    if adb.click_any(adb.catalog.selectors("next"), timeout=5):
+        print("✓ Нажато 'Далее'")
+
+# Цвет основных кнопок WhatsApp ("AGREE AND CONTINUE", "Next") для поиска по скриншоту
+WA_BUTTON_RGB = (0, 168, 132)
+
+# Подписи экранов - действия из selector_catalog (раскрываются по языку устройства)
+# До звонка: EULA -> номер -> подтверждение -> другой способ -> звонок
+REGISTRATION_SCREENS = [
+    # Диалоги поверх экранов - первыми
+    Screen("confirm_dialog", "confirm", handler=on_tap("✓ Подтвердил номер")),
+    # Иногда просит доступ к SMS
+    Screen("sms_permission", "not_now", handler=on_tap()),
+    Screen("eula", "agree", handler=on_tap()),
+    Screen("call_method", "call_method", handler=on_call_method),
+    Screen("verify_another_way", "verify_another_way", handler=on_tap("✓ Выбрал другой способ")),
+    Screen("code_entry", "code_input", handler=on_code_entry),
+    Screen("phone_entry", when=has_phone_fields, handler=on_phone_entry),
+]
+
+# После ввода кода: имя -> помехи (Passkey / Email / ...) -> главный экран
+PROFILE_SCREENS = [
+    # Появление вкладок Чаты/Calls
+    Screen("home", "home", terminal=True),
+    Screen("name_entry", "name_input", handler=on_name_entry),
+    Screen("skip_dialog", "skip", handler=on_tap("✓ Нажата кнопка пропуска")),
+]
+
+# Бюджеты фаз регистрации (сек): вложенные ожидания берут время из них (см. flow_budget)
+REGISTRATION_BUDGETS = {
+    "launch": 5,
+    "screens": 120,
+    "call": 130,
+    "profile": 130,
+    "telegram_code": 120,
+}
+
 def register_whatsapp(adb: ADBController, phone_number: str):
-    """Регистрация WhatsApp на чистом ADB"""
+    """Регистрация WhatsApp на чистом ADB (по фазам с бюджетом времени)"""
+    with StepScheduler("регистрация", sum(REGISTRATION_BUDGETS.values())) as steps:
+        return _register_whatsapp(adb, phone_number, steps)
+
+def _register_whatsapp(adb: ADBController, phone_number: str, steps: StepScheduler):
+    budgets = REGISTRATION_BUDGETS
     print(f"\n📱 Начинаю регистрацию номера {phone_number}...")
     
     # 1. Запуск WhatsApp
-    adb.run_shell("am start -n com.whatsapp/.Main")
-    time.sleep(3)
+    with steps.phase("launch", budgets["launch"]):
+        # am start -W возвращается после отрисовки первого кадра
+        app_launch.launch(adb, "com.whatsapp/.Main", timeout=budgets["launch"])
     
-    # 2. Кнопка "Принять и продолжить"
-    print("⏳ Ищу кнопку согласия...")
-    if not adb.click_element(resource_id="com.whatsapp:id/eula_accept", timeout=10):
-        # Фолбэк по тексту
-        if not adb.click_element(text="AGREE", timeout=2):
-             print("⚠️ Кнопка согласия не найдена! Пробую тапнуть в низ экрана.")
-             adb.tap(360, 1150) # Примерно низ экрана 720x1280
-    
-    # 3. Ввод номера
-    print("⏳ Ввожу номер...")
-    if not adb.wait_for_element(class_name="android.widget.EditText", timeout=10):
+    # 2-7. EULA, номер, подтверждение, "Verify another way", "Call Me"
+    def tap_agree_blind(machine):
+        print("⚠️ Кнопка согласия не найдена в дампе! Ищу ее на скриншоте.")
+        el = None
+        try:
+            el = adb.visual.find_color(WA_BUTTON_RGB, roi=(0, 0.6, 1, 1))
+        except VisualLocatorError as e:
+            print(f"⚠️ {e}")
+        if el:
+            print(f"✓ Кнопка найдена на скриншоте ({el['x']}, {el['y']})")
+            adb.tap(el['x'], el['y'])
+            return
+        # Кнопки не видно - тапаем в низ экрана с учетом реального разрешения
+        try:
+            size = adb.visual.screen_size() or (720, 1280)
+        except VisualLocatorError:
+            size = (720, 1280)
+        adb.tap(size[0] // 2, int(size[1] * 0.9))
+
+    with steps.phase("screens", budgets["screens"]) as phase:
+        machine = ScreenMachine(adb, REGISTRATION_SCREENS)
+        machine.context['phone_number'] = phone_number
+        last = machine.run(timeout=phase.remaining(), on_idle=tap_agree_blind, idle_after=10)
+        machine.report()
+    if 'phone_entry' not in machine.visits:
         print("❌ Поля ввода не найдены")
         return False
-    
-    # Находим поля. Обычно [0] - код страны, [1] - телефон
-    # Но find_element возвращает одно. Нужно найти все.
-    # Для простоты используем логику:
-    # 1. Тапаем в левое поле (код)
-    # 2. Чистим
-    # 3. Пишем код
-    # 4. Тапаем в правое (телефон)
-    # 5. Пишем телефон
-    
-    # Получаем координаты полей через дамп
-    cc_field = adb.find_element(class_name="android.widget.EditText", index=0)
-    phone_field = adb.find_element(class_name="android.widget.EditText", index=1)
-    
-    if cc_field and phone_field:
-        # Вводим код страны (7)
-        print("   Ввожу код страны...")
-        adb.tap(cc_field['x'], cc_field['y'])
-        time.sleep(0.5)
-        # Очищаем (несколько раз Backspace)
-        for _ in range(5): adb.keyevent(67)
-        adb.text("7")
-        
-        # Вводим номер
-        print("   Ввожу телефон...")
-        adb.tap(phone_field['x'], phone_field['y'])
-        time.sleep(0.5)
-        phone_clean = phone_number.replace("+7", "").replace("7", "", 1) if phone_number.startswith("7") or phone_number.startswith("+7") else phone_number
-        adb.text(phone_clean)
-        time.sleep(1)
-    else:
-        print("❌ Не удалось найти координаты полей ввода")
-        return False
-
-    # 4. Жмем NEXT
-    print("⏳ Жму 'Next'...")
-    if not adb.click_element(text="Далее", timeout=5):
-        adb.click_element(text="Next", timeout=1)
-        # Фолбэк по ID
-        adb.click_element(resource_id="com.whatsapp:id/registration_submit", timeout=1)
-    
-    # 5. Обработка "Connecting..." и "Yes"
-    print("⏳ Жду 'Connecting' и подтверждение...")
-    # Ждем пока Connecting уйдет (просто ждем кнопку Yes/Switch)
-    # Ищем кнопку "Yes" / "OK" / "Да" в диалоге подтверждения
-    confirmed = False
-    for _ in range(20):
-        if adb.click_element(text="Yes", timeout=1) or \
-           adb.click_element(text="Да", timeout=0.5) or \
-           adb.click_element(text="OK", timeout=0.5) or \
-           adb.click_element(resource_id="android:id/button1", timeout=0.5):
-            confirmed = True
-            print("✓ Подтвердил номер")
-            break
-        time.sleep(1)
-        
-    if not confirmed:
-        print("⚠️ Не удалось подтвердить номер (диалог не появился или пропущен)")
+    if last != "call_method":
+        print("⚠️ Кнопка 'Verify another way' не найдена (возможно, сразу перешло к коду)")
 
-    # 5.1 Настраиваем переадресацию (пока WA думает)
-    # redirect_calls_to_sip(phone_number)
+    with steps.phase("call", budgets["call"]):
+        redirect_calls_to_sip(phone_number)
 
-    # 6. Verify another way
-    print("⏳ Ищу 'Verify another way'...")
-    time.sleep(2) # Даем время анимации
-    
-    # Сначала проверим, не просит ли он доступ к SMS (иногда бывает)
-    adb.click_element(text="Not now", timeout=1)
-    adb.click_element(text="Не сейчас", timeout=0.5)
-
-    if adb.click_element(text="Подтвердить другим способом", timeout=10) or \
-       adb.click_element(text="Verify another way", timeout=2) or \
-       adb.click_element(text="другим способом", timeout=1):
-        print("✓ Выбрал другой способ")
-        time.sleep(1)
+        # 8. Ждем звонка
+        print("\n📞 Ожидание звонка и ввод кода...")
+        # API ожидания звонка блокирует до двух минут - пока ждем, закрываем всплывающие "Не сейчас"
+        call_result = wait_dismissing(adb, wait_for_voice_call_code, phone_number,
+                                      selectors=adb.catalog.selectors("not_now"))
         
-        # 7. Выбираем Call Me
-        print("⏳ Выбираем 'Call Me'...")
-        if adb.click_element(text="Аудиозвонок", timeout=5) or \
-           adb.click_element(text="Позвонить", timeout=1) or \
-           adb.click_element(text="Call me", timeout=1):
-            print("✓ Запрошен звонок (выбран пункт)")
-            time.sleep(1)
-            # Жмем "Продолжить" (если есть кнопка)
-            # Иногда это радиобаттон и нужна кнопка внизу
-            if adb.click_element(text="Continue", timeout=2) or \
-               adb.click_element(text="Продолжить", timeout=1) or \
-               adb.click_element(resource_id="com.whatsapp:id/continue_button", timeout=1):
-                print("✓ Нажата кнопка 'Продолжить'")
-        else:
-            print("⚠️ Кнопка звонка не найдена (возможно, таймер?)")
-    else:
-        print("⚠️ Кнопка 'Verify another way' не найдена (возможно, сразу перешло к коду)")
-
-    redirect_calls_to_sip(phone_number)
+        if not call_result or call_result.get('status') != 'success':
+            print("❌ Звонок не прошел")
+            return False
 
-    # 8. Ждем звонка
-    print("\n📞 Ожидание звонка и ввод кода...")
-    # Тут вызываем API ожидания звонка
-    call_result = wait_for_voice_call_code(phone_number)
-    
-    if call_result and call_result.get('status') == 'success':
         code = str(call_result.get('code'))
         print(f"✅ Код получен: {code}")
         
@@ -297,95 +250,46 @@ def register_whatsapp(adb: ADBController, phone_number: str):
         # Пробуем просто ввести текст
         adb.text(code)
         print("⌨️ Код введен")
-        
-        # 9. Финализация (Ввод имени)
-        print("\n⏳ Жду экран ввода имени (до 40 сек)...")
-        if adb.wait_for_element(resource_id="com.whatsapp:id/registration_name", timeout=40) or \
-           adb.wait_for_element(text="Type your name here", timeout=1) or \
-           adb.wait_for_element(text="Введите ваше имя", timeout=1):
-            
-            print("✓ Экран ввода имени найден")
-            time.sleep(1)
-            
-            # Клик в поле (на всякий случай)
-            adb.click_element(resource_id="com.whatsapp:id/registration_name", timeout=2)
-            
-            # Ввод имени
-            adb.text("Alex")
-            print("✓ Имя 'Alex' введено")
-            adb.keyevent(66) # ENTER (скрыть клаву / подтвердить)
-            time.sleep(1)
-            
-            # Жмем Далее
-            if adb.click_element(text="Next", timeout=5) or \
-               adb.click_element(text="Далее", timeout=1) or \
-               adb.click_element(resource_id="com.whatsapp:id/register_name_accept", timeout=1):
-                print("✓ Нажато 'Далее'")
-                
-                # 10. Финальное ожидание (Passkey / Email / Init)
-                print("\n⏳ Ожидание завершения настройки и ГЛАВНОГО ЭКРАНА...")
-                
-                # Поллим успешный вход (появление вкладок Чаты/Calls)
-                success_reg = False
-                for _ in range(60): 
-                    # 1. Проверка успеха
-                    if adb.find_element(text="Чаты") or \
-                       adb.find_element(text="Chats") or \
-                       adb.find_element(text="Звонки") or \
-                       adb.find_element(text="Calls"):
-                        print("\n🎉 УРА! Главный экран WhatsApp найден. Регистрация успешна!")
-                        success_reg = True
-                        break
-                    
-                    # 2. Проверка помех
-                    if adb.click_element(text="Пропустить", timeout=0.5) or \
-                       adb.click_element(text="Skip", timeout=0.5) or \
-                       adb.click_element(text="Не сейчас", timeout=0.5) or \
-                       adb.click_element(text="Not now", timeout=0.5) or \
-                       adb.click_element(text="Отмена", timeout=0.5) or \
-                       adb.click_element(text="Cancel", timeout=0.5):
-                         print("✓ Нажата кнопка пропуска")
-                         time.sleep(1)
-                         continue
-                    time.sleep(1)
-                
-                if success_reg:
-                    # 11. ОЖИДАНИЕ КОДА ДЛЯ ТЕЛЕГРАМА (ВНУТРИ ЧАТОВ)
-                    print("\n📩 Жду входящее сообщение с кодом (120 сек)...")
-                    start_wait = time.time()
-                    tg_code = None
-                    
-                    while time.time() - start_wait < 120:
-                        xml = adb.get_ui_dump()
-                        if xml:
-                            # Ищем код в превью сообщений на главном экране
-                            # Обычно это 5 цифр для ТГ
-                            # Ищем "Login code: 12345" или просто "12345" в тексте сообщений
-                            match = re.search(r'(?:code|код|login)[:\s-]*(\d{5})', xml, re.IGNORECASE)
-                            if match:
-                                tg_code = match.group(1)
-                                print(f"\n🚀 НАЙДЕН КОД ТЕЛЕГРАМА: {tg_code}")
-                                break
-                        time.sleep(2)
-                    
-                    if not tg_code:
-                        print("⚠️ Код Телеграма не пришел за 120 сек")
-                    
-                    return True
-                else:
-                    print("⚠️ Не удалось детектировать главный экран за 90 сек")
-                    return False
-
-            else:
-                print("⚠️ Кнопка 'Далее' не найдена")
-        else:
-            print("⚠️ Экран ввода имени не появился за 40 сек")
-
-        return True # Возвращаем True, если дошли до конца ввода имени (дальше уже поллинг)
-    else:
-        print("❌ Звонок не прошел")
+    
+    # 9-10. Ввод имени, помехи (Passkey / Email / Init) и ГЛАВНЫЙ ЭКРАН
+    print(f"\n⏳ Жду экран ввода имени и главный экран (до {budgets['profile']} сек)...")
+    with steps.phase("profile", budgets["profile"]) as phase:
+        machine = ScreenMachine(adb, PROFILE_SCREENS)
+        last = machine.run(timeout=phase.remaining())
+        machine.report()
+
+    if last != "home":
+        if 'name_entry' not in machine.visits:
+            print("⚠️ Экран ввода имени не появился")
+            return True # Возвращаем True, если дошли до конца ввода кода (дальше уже поллинг)
+        print("⚠️ Не удалось детектировать главный экран")
         return False
 
+    print("\n🎉 УРА! Главный экран WhatsApp найден. Регистрация успешна!")
+
+    # 11. ОЖИДАНИЕ КОДА ДЛЯ ТЕЛЕГРАМА (ВНУТРИ ЧАТОВ)
+    print(f"\n📩 Жду входящее сообщение с кодом ({budgets['telegram_code']} сек)...")
+    tg_code = None
+    
+    with steps.phase("telegram_code", budgets["telegram_code"]) as phase:
+        while not phase.expired:
+            xml = adb.get_ui_dump()
+            if xml:
+                # Ищем код в превью сообщений на главном экране
+                # Обычно это 5 цифр для ТГ
+                # Ищем "Login code: 12345" или просто "12345" в тексте сообщений
+                match = re.search(r'(?:code|код|login)[:\s-]*(\d{5})', xml, re.IGNORECASE)
+                if match:
+                    tg_code = match.group(1)
+                    print(f"\n🚀 НАЙДЕН КОД ТЕЛЕГРАМА: {tg_code}")
+                    break
+            flow_budget.sleep(2, "ожидание кода Telegram")
+    
+    if not tg_code:
+        print(f"⚠️ Код Телеграма не пришел за {budgets['telegram_code']} сек")
+    
+    return True
+
 # ==========================================
 # API МЕТОДЫ
 # ==========================================
@@ -426,7 +330,8 @@ def redirect_calls_to_sip(phone_number: str):
     }
     
     try:
-        response = requests.post(
+        response = TRACE.http(
+            requests.post,
             "https://api.mtt.ru/ipcr/",
             json=data,
             auth=(MTT_USERNAME, MTT_PASSWORD),
@@ -444,10 +349,13 @@ def redirect_calls_to_sip(phone_number: str):
 
 def wait_for_voice_call_code(phone_number: str, timeout=120):
     """API запрос (копия из старого скрипта)"""
+    # В фазе: сервер ждет звонок на 10 сек меньше, чем мы ждем его ответ
+    timeout = max(min(timeout, int(flow_budget.cap(timeout + 10)) - 10), 0)
     print(f"⏳ Жду звонок на {phone_number} ({timeout} сек)...")
     phone = phone_number.lstrip('+')
     try:
-        response = requests.post(
+        response = TRACE.http(
+            requests.post,
             "http://92.51.23.204:8000/api/wait-call",
             json={"phone_number": phone, "timeout": timeout},
             timeout=timeout + 10
@@ -464,26 +372,21 @@ def wait_for_voice_call_code(phone_number: str, timeout=120):
 
 def main():
     phone_number = "79014776794"
+    # ADB_PROFILE=cprofile|tracemalloc (см. adb_metrics)
+    start_profiling()
     
-    # 1. Определяем девайс (MEmu)
+    # 1. Определяем девайс (MEmu) - по живому списку adb-сервера
     print("🔍 Ищем MEmu девайс...")
-    res = subprocess.run([ADB_PATH, "devices"], capture_output=True, text=True)
-    
-    device_name = None
-    # Ищем 127.0.0.1:2xxxx
-    match = re.search(r"(127\.0\.0\.1:2\d{4})\s+device", res.stdout)
-    if match:
-        device_name = match.group(1)
-        print(f"✓ Найден девайс: {device_name}")
-    else:
-        # Дефолт для первого инстанса
-        device_name = "127.0.0.1:21503"
-        print(f"⚠️ Девайс не найден в списке, пробую дефолт: {device_name}")
-        # Пытаемся подключиться
-        subprocess.run([ADB_PATH, "connect", device_name], capture_output=True)
-
-    # Инициализация контроллера
-    adb = ADBController(device_name)
+    registry = get_registry(ADB_PATH)
+    try:
+        adb = registry.controller()
+    except AdbTransportError as e:
+        print(f"❌ {e}")
+        return
+    print(f"✓ Найден девайс: {adb.device_name}")
+    # Инстанс мог быть только что запущен - ждем загрузки (у загруженного это один опрос)
+    if not wait_ready(adb.device_name, timeout=120, registry=registry, adb_path=ADB_PATH)["ready"]:
+        return
     
     # 2. Очистка и подготовка
     print("🧹 Очистка...")
@@ -496,7 +399,11 @@ def main():
     redirect_calls_to_sip(phone_number)
     
     # 4. Регистрация
-    register_whatsapp(adb, phone_number)
+    try:
+        register_whatsapp(adb, phone_number)
+    finally:
+        # Клавиатуру (если переключали на ADBKeyBoard) возвращаем и при ошибке
+        adb.close()
     
     print("\n🏁 Скрипт завершен")
 
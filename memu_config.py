@@ -0,0 +1,293 @@
+import os
+import re
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, unescape
+
+# ==========================================
+# КОНФИГИ ИНСТАНСОВ MEmu (.memu)
+# ==========================================
+#
+# .memu - XML в формате VirtualBox. Почти все настройки memuc setconfigex
+# лежат там как <GuestProperty name="..." value="..."/>, CPU и память - в
+# <Hardware>. Пока VM остановлена, настройки, которые в файле уже есть,
+# правятся на месте (меняются только значения атрибутов, комментарии,
+# заголовок и форматирование файла остаются как были) и пишутся атомарной
+# заменой файла (вместо memuc-процесса на ключ). Новые свойства не
+# создаются: имя ключа memuc не обязано совпадать с именем свойства - такие
+# ключи идут через memuc.
+#
+#     configure_instance(5, {"cpus": "2", "memory": "1536", "root_mode": "1"})
+#     MEMU_INDEX.path(5)   # ...\MemuHyperv VMs\MEmu_5\MEmu_5.memu (без рекурсивного glob)
+#
+# Проверка на образце конфига (файл не меняется):
+#     python memu_config.py benchmarks/fixtures/MEmu_1.memu
+
+MEMU_DIR = r"C:\Program Files\Microvirt\MEmu"
+MEMUC_PATH = os.path.join(MEMU_DIR, "memuc.exe")
+
+VMS_DIR_CANDIDATES = [
+    os.path.join(MEMU_DIR, "MemuHyperv VMs"),
+    r"D:\Program Files\Microvirt\MEmu\MemuHyperv VMs",
+    os.path.expanduser("~\\Documents\\MEmu Hyperv VMs"),
+    os.path.expanduser("~\\MEmu Hyperv VMs"),
+]
+
+# Инстанс 0 - MEmu.memu, остальные - MEmu_<index>.memu
+CONFIG_NAME_RE = re.compile(r"^MEmu(?:_(\d+))?\.memu$", re.IGNORECASE)
+
+# Ключи setconfigex, которые живут не в GuestProperty: ключ -> (элемент, атрибут)
+HARDWARE_KEYS = {
+    "cpus": ("CPU", "count"),
+    "memory": ("Memory", "RAMSize"),
+}
+
+# Флаги root, которые create_memu_instance всегда ставил через memuc setconfigex
+ROOT_SETTINGS = {"root_mode": "1", "is_root_mode": "1"}
+# enable_root (старые версии MEmu) правится только в файле, если он там есть:
+# через memuc этот ключ никогда не отправлялся
+ROOT_FILE_SETTINGS = {**ROOT_SETTINGS, "enable_root": "1"}
+
+GUEST_PROPERTY_RE = re.compile(r"<GuestProperty\b[^>]*>")
+
+
+def find_vms_dir():
+    for candidate in VMS_DIR_CANDIDATES:
+        if os.path.isdir(candidate):
+            return candidate
+    return None
+
+
+def config_name(index):
+    return "MEmu.memu" if index == 0 else f"MEmu_{index}.memu"
+
+
+class MemuIndex:
+    """Кэш index инстанса -> путь к .memu; дерево сканируется, только если путь не угадан"""
+
+    def __init__(self, vms_dir=None):
+        self.vms_dir = vms_dir
+        self.paths = {}
+        self.scanned = False
+
+    def path(self, index):
+        cached = self.paths.get(index)
+        if cached and os.path.exists(cached):
+            return cached
+        vms_dir = self.vms_dir or find_vms_dir()
+        if not vms_dir:
+            return None
+        self.vms_dir = vms_dir
+        # Обычная раскладка: <VMs>\MEmu_5\MEmu_5.memu
+        name = config_name(index)
+        predicted = os.path.join(vms_dir, name[:-len(".memu")], name)
+        if os.path.exists(predicted):
+            self.paths[index] = predicted
+            return predicted
+        self.rescan()
+        return self.paths.get(index)
+
+    def rescan(self):
+        """Один уровень папок VMs (без рекурсивного glob по всему дереву)"""
+        self.paths = {}
+        vms_dir = self.vms_dir or find_vms_dir()
+        if not vms_dir:
+            return self.paths
+        self.vms_dir = vms_dir
+        for folder in [vms_dir] + [e.path for e in os.scandir(vms_dir) if e.is_dir()]:
+            for entry in os.scandir(folder):
+                m = CONFIG_NAME_RE.match(entry.name)
+                if m and entry.is_file():
+                    self.paths.setdefault(int(m.group(1) or 0), entry.path)
+        self.scanned = True
+        return self.paths
+
+    def all(self):
+        return dict(self.rescan() if not self.scanned else self.paths)
+
+
+MEMU_INDEX = MemuIndex()
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _find(root, name):
+    return next((el for el in root.iter() if _local(el.tag) == name), None)
+
+
+def _hardware(root, element):
+    hardware = _find(root, "Hardware")
+    return _find(hardware if hardware is not None else root, element)
+
+
+def read_config(path):
+    """{ключ: значение} - GuestProperty и CPU/память"""
+    root = ET.parse(path).getroot()
+    values = {el.get("name"): el.get("value") for el in root.iter() if _local(el.tag) == "GuestProperty"}
+    for key, (element, attr) in HARDWARE_KEYS.items():
+        el = _hardware(root, element)
+        if el is not None and el.get(attr) is not None:
+            values[key] = el.get(attr)
+    return values
+
+
+def _attr_re(attr):
+    return re.compile(rf'(\s{attr}=")([^"]*)(")')
+
+
+def _hardware_tag(text, element):
+    """Открывающий тег element внутри <Hardware> (или первый в файле) - match или None"""
+    hardware = re.search(r"<Hardware\b", text)
+    return re.compile(rf"<{element}\b[^>]*>").search(text, hardware.end() if hardware else 0)
+
+
+def apply_config(path, settings, write=True):
+    """
+    Записать настройки в .memu одним проходом. VM должна быть остановлена
+    (иначе MEmu перезапишет файл). Меняются только ключи, которые в файле
+    уже есть: под каким именем MEmu читает остальные, по файлу не узнать.
+    Правка точечная - заменяется только значение атрибута, остальной текст
+    файла (заголовок, комментарии, отступы) не трогается.
+    write=False - только посчитать (проверка на образце конфига).
+    Возвращает ({ключ: (было, стало)} по реально измененным, [ключи, которых в файле нет]).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    # Битый файл - ET.ParseError, как и раньше; сами значения берем из текста
+    ET.fromstring(data)
+    text = data.decode("utf-8")
+    value_re = _attr_re("value")
+    props = {}
+    for m in GUEST_PROPERTY_RE.finditer(text):
+        name = re.search(r'\sname="([^"]*)"', m.group(0))
+        if name:
+            props.setdefault(unescape(name.group(1), {"&quot;": '"'}), m)
+
+    changed = {}
+    missing = []
+    # (начало, конец, новое значение) - применяются с конца, чтобы смещения не съезжали
+    edits = []
+    for key, value in settings.items():
+        value = str(value)
+        if key in HARDWARE_KEYS:
+            element, attr = HARDWARE_KEYS[key]
+            tag, attr_re = _hardware_tag(text, element), _attr_re(attr)
+        else:
+            tag, attr_re = props.get(key), value_re
+        attr_match = attr_re.search(tag.group(0)) if tag else None
+        if attr_match is None:
+            missing.append(key)
+            continue
+        old = unescape(attr_match.group(2), {"&quot;": '"'})
+        if old != value:
+            changed[key] = (old, value)
+            edits.append((tag.start() + attr_match.start(2), tag.start() + attr_match.end(2),
+                          escape(value, {'"': "&quot;"})))
+
+    if changed and write:
+        for start, end, new in sorted(edits, reverse=True):
+            text = text[:start] + new + text[end:]
+        # Атомарно: временный файл рядом + os.replace, чтобы MEmu не увидел половину файла
+        fd, tmp = tempfile.mkstemp(prefix=".memu-", dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(text.encode("utf-8"))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    return changed, missing
+
+
+def memuc_setconfig(index, settings, memuc_path=MEMUC_PATH):
+    """memuc setconfigex по ключу на процесс. True - все ключи приняты."""
+    ok = True
+    for key, value in settings.items():
+        res = subprocess.run([memuc_path, "setconfigex", "-i", str(index), key, str(value)],
+                             capture_output=True, text=True, encoding='utf-8', errors='ignore')
+        if res.returncode != 0:
+            print(f"⚠️ memuc setconfigex {key}={value}: {(res.stdout + res.stderr).strip()}")
+        ok = ok and res.returncode == 0
+    return ok
+
+
+def configure_instance(index, settings, memuc_path=MEMUC_PATH, index_cache=MEMU_INDEX, file_only=None):
+    """
+    Настроить остановленный инстанс: ключи, которые уже есть в .memu, - правкой
+    файла одним проходом; остальные (или все, если конфиг не найден) - через
+    memuc setconfigex, как раньше. Затем ключи, созданные memuc, перечитываются
+    из файла: если memuc записал не то значение (бывает с root) - правим файл,
+    VM еще не запускалась, перезапуск не нужен.
+    file_only - ключи, которые правятся только в файле (если они там есть)
+    и в memuc не отправляются.
+    Возвращает True, если все настройки записаны.
+    """
+    path = index_cache.path(index)
+    rest = dict(settings)
+    if path:
+        try:
+            changed, missing = apply_config(path, {**(file_only or {}), **settings})
+        except (OSError, ET.ParseError) as e:
+            print(f"⚠️ Не удалось править {path}: {e}")
+        else:
+            total = len(set(settings) | set(file_only or {}))
+            print(f"✓ Конфиг {os.path.basename(path)}: изменено {len(changed)}, "
+                  f"уже как нужно {total - len(changed) - len(missing)}, нет в файле {len(missing)}")
+            rest = {key: settings[key] for key in missing if key in settings}
+    else:
+        print("⚠️ Конфиг инстанса не найден, настраиваю через memuc")
+    if not rest:
+        return True
+
+    print(f"⚙️  Через memuc: {', '.join(rest)}")
+    ok = memuc_setconfig(index, rest, memuc_path)
+    if path:
+        try:
+            fixed, still_missing = apply_config(path, rest)
+        except (OSError, ET.ParseError) as e:
+            print(f"⚠️ Не удалось перечитать {path}: {e}")
+        else:
+            for key, (old, new) in fixed.items():
+                print(f"  ✓ {key}: memuc записал {old}, исправлено на {new}")
+            if still_missing:
+                # Не ошибка: memuc мог хранить ключ в другом месте - но проверить это нечем
+                print(f"  ℹ️ В файле так и нет ключей: {', '.join(still_missing)}")
+    return ok
+
+
+def main():
+    """
+    Проверка на образце: python memu_config.py benchmarks/fixtures/MEmu_1.memu [ключ=значение ...]
+    Без ключей - настройки create_memu_instance. Файл не меняется.
+    """
+    import sys
+
+    if len(sys.argv) < 2:
+        print(main.__doc__.strip())
+        sys.exit(2)
+    file_only = {}
+    if len(sys.argv) > 2:
+        settings = dict(arg.split("=", 1) for arg in sys.argv[2:])
+    else:
+        from create_memu_instance import INSTANCE_SETTINGS
+        settings, file_only = INSTANCE_SETTINGS, ROOT_FILE_SETTINGS
+    memuc_keys = set(settings)
+    settings = {**file_only, **settings}
+    changed, missing = apply_config(sys.argv[1], settings, write=False)
+    for key, (old, new) in changed.items():
+        print(f"  ✎ {key}: {old} -> {new}")
+    for key in settings:
+        if key not in changed and key not in missing:
+            print(f"  = {key}: {settings[key]}")
+    for key in missing:
+        if key in memuc_keys:
+            print(f"  ✗ {key}: нет в файле - пойдет через memuc setconfigex")
+        else:
+            print(f"  ✗ {key}: нет в файле - пропуск (в memuc не отправляется)")
+
+
+if __name__ == "__main__":
+    main()
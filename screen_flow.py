@@ -0,0 +1,163 @@
+import time
+
+import flow_budget
+from adb_metrics import METRICS
+from session_trace import TRACE
+from ui_selector import first_match
+
+# ==========================================
+# ЭКРАНЫ И МАШИНА СОСТОЯНИЙ
+# ==========================================
+#
+# Каждый экран объявляется один раз: подпись (селекторы или предикат по UITree)
+# и обработчик. На каждом шаге один снимок экрана классифицируется и
+# управление передается обработчику найденного экрана. Так не нужно
+# "на всякий случай" искать кнопки экранов, которых сейчас быть не может.
+
+# Обработчик возвращает STOP, чтобы завершить прогон машины
+STOP = "stop"
+
+
+class Screen:
+    """
+    name      - имя экрана для логов и статистики
+    selectors - список селекторов (как в find_any, словари или строки UiSelector),
+                экран опознан, если сработал любой; или имя действия из
+                selector_catalog - раскрывается по языку устройства в ScreenMachine
+    when      - альтернатива selectors: предикат tree -> bool
+    handler   - handler(machine, tree, element) - что делать на экране
+    terminal  - дойдя до этого экрана, машина останавливается (после обработчика)
+    """
+
+    def __init__(self, name, selectors=None, when=None, handler=None, terminal=False):
+        self.name = name
+        self.selectors = selectors or []
+        self.when = when
+        self.handler = handler
+        self.terminal = terminal
+
+    def resolve(self, catalog):
+        """Экран с селекторами действия из каталога (если задано имя действия)"""
+        if not isinstance(self.selectors, str):
+            return self
+        return Screen(self.name, catalog.selectors(self.selectors), self.when, self.handler, self.terminal)
+
+    def match(self, tree):
+        """Элемент-подпись (dict как у find_element) или None"""
+        if self.when is not None:
+            return {} if self.when(tree) else None
+        for selector in self.selectors:
+            node = first_match(tree, selector)
+            if node:
+                return node.as_element()
+        return None
+
+
+class ScreenMachine:
+    """
+    Прогон по экранам. Экраны проверяются в порядке объявления
+    (диалоги поверх экранов объявлять раньше самих экранов).
+
+        machine = ScreenMachine(adb, [Screen(...), ...])
+        final = machine.run(timeout=60)
+    """
+
+    def __init__(self, adb, screens, settle=3.0, max_visits=5):
+        self.adb = adb
+        self.screens = [screen.resolve(adb.catalog) for screen in screens]
+        # Сколько ждем смены экрана после обработчика, прежде чем обработать его снова
+        self.settle = settle
+        # Защита от зацикливания: сколько раз подряд можно обработать один экран
+        self.max_visits = max_visits
+        self.visits = {}
+        self.history = []
+        self.context = {}
+        # Который раз подряд обрабатывается текущий экран (1 - только что пришли на него);
+        # обработчики с необратимыми действиями смотрят сюда, чтобы не повторять их
+        self.repeats = 0
+
+    def classify(self, tree):
+        """(screen, element) для текущего снимка или None"""
+        for screen in self.screens:
+            el = screen.match(tree)
+            if el is not None:
+                return screen, el
+        return None
+
+    def run(self, timeout, on_idle=None, idle_after=10):
+        """
+        Крутит машину до терминального экрана, STOP от обработчика или таймаута.
+        on_idle(machine) вызывается один раз, если за idle_after сек в начале
+        не опознан ни один экран.
+        Возвращает имя последнего обработанного экрана (или None).
+        timeout урезается остатком текущей фазы (см. flow_budget).
+        """
+        timeout = flow_budget.cap(timeout)
+        waiter = self.adb.waiter
+        deadline = time.time() + timeout
+        current = None
+        repeats = 0
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                print(f"⚠️ Машина экранов: таймаут {timeout:.0f} сек (последний экран: {current})")
+                return current
+
+            dumps_before = waiter.dumps
+            started = time.time()
+            if current is None:
+                if on_idle:
+                    found = waiter.wait(self.classify, min(idle_after, remaining))
+                    if found is None:
+                        on_idle(self)
+                        on_idle = None
+                        continue
+                else:
+                    found = waiter.wait(self.classify, remaining)
+            else:
+                # Ждем, пока экран сменится; если не сменился за settle - обрабатываем снова
+                found = waiter.wait(lambda tree: self._changed(tree, current), min(self.settle, remaining))
+                if found is None and waiter.tree is not None:
+                    found = self.classify(waiter.tree)
+            if not found:
+                continue
+
+            screen, el = found
+            visit = self.visits.get(screen.name, 0) + 1
+            self.visits[screen.name] = visit
+            self.history.append({
+                "screen": screen.name,
+                "at": time.time(),
+                "waited": time.time() - started,
+                "dumps": waiter.dumps - dumps_before,
+                "visit": visit,
+            })
+            if METRICS.enabled:
+                METRICS.observe("adb_screen_wait_seconds", self.history[-1]["waited"], screen=screen.name)
+                METRICS.event("screen", **self.history[-1])
+            repeats = repeats + 1 if screen.name == current else 1
+            self.repeats = repeats
+            current = screen.name
+            if repeats > self.max_visits:
+                # Обработчик не помогает - дальше только ждем смены экрана
+                if repeats == self.max_visits + 1:
+                    print(f"⚠️ Экран '{screen.name}' обработан {self.max_visits} раз без смены, жду")
+                continue
+
+            print(f"📍 Экран: {screen.name}" + (f" (повтор {repeats})" if repeats > 1 else ""))
+            # waiter.tree - тот самый снимок, по которому опознан экран
+            with TRACE.span(f"screen {screen.name}", "screen", visit=visit, repeat=repeats):
+                result = screen.handler(self, waiter.tree, el) if screen.handler else None
+            if result == STOP or screen.terminal:
+                return screen.name
+
+    def _changed(self, tree, current):
+        found = self.classify(tree)
+        if found and found[0].name != current:
+            return found
+        return None
+
+    def report(self):
+        """Печать переходов: экран, сколько ждали, сколько дампов"""
+        for step in self.history:
+            print(f"   {step['screen']:<20} ждали {step['waited']:.2f} сек, дампов: {step['dumps']}")
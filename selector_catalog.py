@@ -0,0 +1,92 @@
+import re
+
+# ==========================================
+# КАТАЛОГ СЕЛЕКТОРОВ ПО ДЕЙСТВИЯМ И ЯЗЫКУ
+# ==========================================
+#
+# Логическое действие ("next", "skip", ...) -> resource-id и подписи по языкам.
+# Язык устройства читается один раз за сессию и кэшируется: persist.sys.locale
+# (Android 7+), затем persist.sys.language (Android 5-6, MEmu 51), и только потом
+# ro.product.locale - заводской язык образа (обычно en-US), а не выбранный.
+# Действие раскрывается в короткий список: сначала resource-id (не зависят
+# от языка), затем подписи только этого языка.
+# Если язык не определен или его нет в каталоге - подписи всех языков (как раньше).
+#
+#     adb.click_any(adb.catalog.selectors("next"), timeout=5)
+#     Screen("skip_dialog", "skip", handler=...)   # раскрывается в ScreenMachine
+
+# Порядок важен: parse_language берет первую непустую строку
+LOCALE_CMD = "getprop persist.sys.locale;getprop persist.sys.language;getprop ro.product.locale"
+
+# match: "text" - подстрока без учета регистра, "text_exact" - точное совпадение
+CATALOG = {
+    # Точное совпадение: "Да" как подстрока есть и в "Далее"
+    "confirm": {"ids": ["android:id/button1"], "match": "text_exact",
+                "labels": {"ru": ["Да", "ДА", "OK"], "en": ["Yes", "YES", "OK"]}},
+    "not_now": {"labels": {"ru": ["Не сейчас"], "en": ["Not now"]}},
+    "agree": {"ids": ["com.whatsapp:id/eula_accept"],
+              "labels": {"ru": ["Принять и продолжить"], "en": ["AGREE"]}},
+    "call_method": {"labels": {"ru": ["Аудиозвонок", "Позвонить"], "en": ["Call me"]}},
+    "verify_another_way": {"labels": {"ru": ["Подтвердить другим способом", "другим способом"],
+                                      "en": ["Verify another way"]}},
+    "code_input": {"ids": ["com.whatsapp:id/verify_sms_code_input"]},
+    "continue": {"ids": ["com.whatsapp:id/continue_button"],
+                 "labels": {"ru": ["Продолжить"], "en": ["Continue"]}},
+    "next": {"ids": ["com.whatsapp:id/registration_submit", "com.whatsapp:id/register_name_accept"],
+             "labels": {"ru": ["Далее"], "en": ["Next"]}},
+    "name_input": {"ids": ["com.whatsapp:id/registration_name"],
+                   "labels": {"ru": ["Введите ваше имя"], "en": ["Type your name here"]}},
+    "home": {"labels": {"ru": ["Чаты", "Звонки"], "en": ["Chats", "Calls"]}},
+    "skip": {"labels": {"ru": ["Пропустить", "Не сейчас", "Отмена"], "en": ["Skip", "Not now", "Cancel"]}},
+    # Диалоги ProxyDroid / SuperUser
+    "ok": {"labels": {"ru": ["Хорошо", "OK"], "en": ["OK"]}},
+    "grant": {"labels": {"ru": ["Разрешить", "Предоставить"], "en": ["Grant", "Allow"]}},
+}
+
+LANG_RE = re.compile(r"^([a-z]{2,3})(?:[-_].*)?$", re.IGNORECASE)
+
+
+def parse_language(output):
+    """Вывод LOCALE_CMD -> код языка ("ru") или None"""
+    for line in (output or "").splitlines():
+        m = LANG_RE.match(line.strip())
+        if m:
+            return m.group(1).lower()
+    return None
+
+
+class SelectorCatalog:
+    """Селекторы действий для одного устройства (язык читается при первом обращении)"""
+
+    def __init__(self, adb, entries=CATALOG):
+        self.adb = adb
+        self.entries = entries
+        # Без устройства (adb=None, например бэкенд appium) - подписи всех языков
+        self._language = None if adb is not None else ""
+        self._resolved = {}
+
+    @property
+    def language(self):
+        """Язык устройства ("ru", "en", ...) или "" если не удалось определить"""
+        if self._language is None:
+            res = self.adb.run_shell(LOCALE_CMD, timeout=5)
+            self._language = parse_language(res.stdout if res else "") or ""
+            print(f"🌐 Язык устройства: {self._language or 'не определен (проверяю все подписи)'}")
+        return self._language
+
+    def labels(self, action):
+        """Подписи действия на языке устройства (все языки, если язык не определен), без повторов"""
+        labels = self.entries[action].get("labels", {})
+        if self.language in labels:
+            return list(dict.fromkeys(labels[self.language]))
+        return list(dict.fromkeys(text for values in labels.values() for text in values))
+
+    def selectors(self, action):
+        """Список селекторов действия: resource-id, затем подписи языка устройства"""
+        if action not in self._resolved:
+            entry = self.entries[action]
+            key = entry.get("match", "text")
+            selectors = [{"resource_id": rid} for rid in entry.get("ids", [])]
+            selectors += [{key: text} for text in self.labels(action)]
+            self._resolved[action] = selectors
+        return self._resolved[action]
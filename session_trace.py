@@ -0,0 +1,172 @@
+import atexit
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# ==========================================
+# ТРАССА СЕССИИ (Chrome trace-event format)
+# ==========================================
+#
+# Включается ADB_TRACE=<папка> (по умолчанию выключено). Пишется:
+#   trace.json   - все вызовы ADBController, sleep, HTTP, ожидания и экраны;
+#                  открывается в chrome://tracing или https://ui.perfetto.dev
+#   summary.txt  - на что ушло время сессии (сон / дампы / adb /
+#                  удаленные API / ожидание приложения / прочее)
+#   dumps/*.xml  - снятые дампы экранов; годятся как фикстуры для
+#                  benchmarks/bench_adb.py --fixtures <папка>/dumps
+#
+# Время в сводке - в каждый момент достается самому вложенному (последнему
+# начатому) из идущих участков любого потока: HTTP в рабочем потоке
+# (wait_dismissing) засчитывается как "удаленные API", пока основной поток
+# его ждет. Категории не пересекаются и в сумме дают длительность прогона.
+
+CATEGORY_TITLES = {
+    "sleep": "сон (time.sleep в сценарии)",
+    "dump": "дампы UI",
+    "adb": "команды adb",
+    "http": "удаленные API",
+    "wait": "ожидание приложения (опрос)",
+    "screen": "обработчики экранов",
+    "other": "прочее (python, логика)",
+}
+
+
+class Tracer:
+    def __init__(self, out_dir=None):
+        self.out_dir = Path(out_dir) if out_dir else None
+        self.enabled = bool(out_dir)
+        self.lock = threading.Lock()
+        self.events = []
+        self.start = time.perf_counter()
+        self.dump_count = 0
+        self.last_dump_hash = None
+        if self.enabled:
+            (self.out_dir / "dumps").mkdir(parents=True, exist_ok=True)
+            atexit.register(self.flush)
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("ADB_TRACE"))
+
+    def _us(self, t):
+        return round((t - self.start) * 1e6, 1)
+
+    def record(self, name, cat, started, ended, **args):
+        """Завершенный участок ("ph": "X") с началом/концом по perf_counter"""
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": self._us(started),
+            "dur": round((ended - started) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self.lock:
+            self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name, cat, **args):
+        """with TRACE.span("wait", "wait", op=...) as args: args["found"] = ..."""
+        if not self.enabled:
+            yield args
+            return
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, cat, started, time.perf_counter(), **args)
+
+    def sleep(self, seconds, reason=""):
+        """time.sleep, видимый в трассе"""
+        if not self.enabled:
+            time.sleep(seconds)
+            return
+        with self.span(f"sleep {seconds}", "sleep", reason=reason):
+            time.sleep(seconds)
+
+    def http(self, request, url, **kwargs):
+        """request(url, **kwargs) (requests.post/get) с записью размера и статуса ответа"""
+        if not self.enabled:
+            return request(url, **kwargs)
+        with self.span(f"{request.__name__.upper()} {url}", "http", url=url,
+                       request_bytes=len(json.dumps(kwargs.get("json"), default=str)) if "json" in kwargs else 0) as args:
+            response = request(url, **kwargs)
+            args["status"] = response.status_code
+            args["response_bytes"] = len(response.content or b"")
+            return response
+
+    def save_dump(self, xml):
+        """Сохранить дамп как фикстуру; одинаковые подряд не дублируются. Имя файла или None."""
+        if not self.enabled or not xml:
+            return None
+        digest = hashlib.md5(xml.encode("utf-8", errors="ignore")).hexdigest()
+        with self.lock:
+            if digest == self.last_dump_hash:
+                return f"dump_{self.dump_count:04d}.xml"
+            self.last_dump_hash = digest
+            self.dump_count += 1
+            name = f"dump_{self.dump_count:04d}.xml"
+        (self.out_dir / "dumps" / name).write_text(xml, encoding="utf-8")
+        return name
+
+    # --- отчет ---
+
+    def summary(self):
+        """{категория: сек} по всем потокам (каждый момент - самому вложенному участку) + "total" """
+        with self.lock:
+            # Фазы (flow_budget) - рамки поверх участков, своего времени у них нет
+            events = [e for e in self.events if e["cat"] != "phase" and e["dur"] > 0]
+        total = (time.perf_counter() - self.start) * 1e6
+        # Проход по границам участков: между соседними границами набор идущих участков не меняется
+        bounds = sorted({0.0, total} | {e["ts"] for e in events} | {e["ts"] + e["dur"] for e in events})
+        starts = sorted(range(len(events)), key=lambda i: events[i]["ts"])
+        active = set()
+        totals = {}
+        pos = 0
+        for left, right in zip(bounds, bounds[1:]):
+            while pos < len(starts) and events[starts[pos]]["ts"] <= left:
+                active.add(starts[pos])
+                pos += 1
+            active = {i for i in active if events[i]["ts"] + events[i]["dur"] > left}
+            if active:
+                # Самый вложенный - позже всех начатый (при равном начале - самый короткий)
+                inner = max(active, key=lambda i: (events[i]["ts"], -events[i]["dur"]))
+                cat = events[inner]["cat"]
+            else:
+                cat = "other"
+            totals[cat] = totals.get(cat, 0.0) + (min(right, total) - left if left < total else 0.0)
+        result = {cat: us / 1e6 for cat, us in totals.items()}
+        result["total"] = total / 1e6
+        return result
+
+    def report(self):
+        summary = self.summary()
+        total = summary.pop("total") or 1e-9
+        lines = [f"Прогон: {total:.1f} сек"]
+        for cat, seconds in sorted(summary.items(), key=lambda kv: -kv[1]):
+            title = CATEGORY_TITLES.get(cat, cat)
+            lines.append(f"  {title:<32} {seconds:>8.2f} сек  {seconds / total * 100:5.1f}%")
+        return "\n".join(lines)
+
+    def flush(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            events = list(self.events)
+        meta = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": threading.main_thread().ident,
+                 "args": {"name": "main"}}]
+        (self.out_dir / "trace.json").write_text(
+            json.dumps({"traceEvents": meta + events, "displayTimeUnit": "ms"}, ensure_ascii=False, default=str),
+            encoding="utf-8")
+        report = self.report()
+        (self.out_dir / "summary.txt").write_text(report + "\n", encoding="utf-8")
+        print(f"\n🧭 Трасса: {self.out_dir / 'trace.json'}\n{report}")
+
+
+TRACE = Tracer.from_env()
@@ -0,0 +1,181 @@
+import os
+import time
+
+from adb_transport import ADB_PATH
+from ui_selector import to_uiselector
+
+# ==========================================
+# БЭКЕНДЫ UI: ADB (по умолчанию) И APPIUM (опционально)
+# ==========================================
+#
+# Один API элементов для скриптов поверх разных движков:
+#   adb     - ADBController: дамп uiautomator + input через adb-сервер,
+#             без сессии и установки UiAutomator2 server
+#   appium  - прежний путь через webdriver.Remote (Appium-сервер на 4723);
+#             appium/selenium импортируются только при выборе этого бэкенда
+#
+#     ui = open_backend()                 # UI_BACKEND=adb|appium, по умолчанию adb
+#     found = ui.find_any(['new UiSelector().resourceId("com.whatsapp:id/registration_name")'], timeout=10)
+#     if found:
+#         ui.type_text(found[1], "Alex")
+#     ui.close()
+#
+# Элемент - словарь {x, y, bounds, text} (у adb еще node, у appium - el).
+# Селекторы - строки UiSelector или словари как в ADBController.find_any.
+# Время запуска бэкенда печатается и лежит в ui.startup (сек) для сравнения.
+
+APPIUM_URL = os.getenv("APPIUM_URL") or "http://localhost:4723"
+POLL_INTERVAL = 0.5
+
+
+class AdbBackend:
+    name = "adb"
+
+    def __init__(self, device_name=None, adb=None, registry=None):
+        if adb is None:
+            from device_registry import get_registry
+            registry = registry or get_registry(ADB_PATH)
+            if device_name and registry.state(device_name) != "device":
+                registry.connect(device_name)
+            adb = registry.controller(device_name)
+        self.adb = adb
+        self.device_name = adb.device_name
+
+    @staticmethod
+    def _element(el):
+        el = dict(el)
+        el["text"] = el["node"].text
+        return el
+
+    def find_all(self, selector):
+        return [self._element(el) for el in self.adb.find_all(selector)]
+
+    def find_any(self, selectors, timeout=0):
+        """(selector, element) первого сработавшего селектора или None"""
+        found = self.adb.find_any(selectors, timeout=timeout)
+        return (found[0], self._element(found[1])) if found else None
+
+    def tap(self, x, y):
+        self.adb.tap(x, y)
+
+    def click(self, el):
+        self.adb.tap(el["x"], el["y"])
+
+    def type_text(self, el, text):
+        """Фокус в поле, очистка и ввод"""
+        self.click(el)
+        if el.get("text"):
+            # Курсор в конец и стираем старое значение одним вызовом
+            with self.adb.batch() as b:
+                b.keyevent(123)
+                for _ in range(len(el["text"])):
+                    b.keyevent(67)
+        self.adb.text(text)
+
+    def keyevent(self, keycode):
+        self.adb.keyevent(keycode)
+
+    def close(self):
+        self.adb.close()
+        if self.adb.transport:
+            self.adb.transport.close()
+
+
+class AppiumBackend:
+    name = "appium"
+
+    def __init__(self, device_name, url=APPIUM_URL, **caps):
+        # Тяжелые импорты - только если выбран этот бэкенд
+        from appium import webdriver
+        from appium.webdriver.common.appiumby import AppiumBy
+
+        self.by = AppiumBy.ANDROID_UIAUTOMATOR
+        self.device_name = device_name
+        options = {
+            "platformName": "Android",
+            "automationName": "UiAutomator2",
+            "deviceName": device_name,
+            "udid": device_name,
+            "appPackage": "com.whatsapp",
+            "appActivity": "com.whatsapp.Main",
+            "autoLaunch": False,
+            "noReset": True,
+            "fullReset": False,
+            "newCommandTimeout": 600,
+            **caps,
+        }
+        self.driver = webdriver.Remote(url, options)
+
+    @staticmethod
+    def _element(el):
+        rect = el.rect
+        try:
+            text = el.text or ""
+        except Exception:
+            text = ""
+        return {
+            "x": rect["x"] + rect["width"] // 2,
+            "y": rect["y"] + rect["height"] // 2,
+            "bounds": (rect["x"], rect["y"], rect["x"] + rect["width"], rect["y"] + rect["height"]),
+            "text": text,
+            "el": el,
+        }
+
+    def find_all(self, selector):
+        try:
+            return [self._element(el) for el in self.driver.find_elements(self.by, to_uiselector(selector))]
+        except Exception as e:
+            print(f"⚠️ Appium: {to_uiselector(selector)} -> {e}")
+            return []
+
+    def find_any(self, selectors, timeout=0):
+        deadline = time.time() + timeout
+        while True:
+            for selector in selectors:
+                found = self.find_all(selector)
+                if found:
+                    return selector, found[0]
+            if time.time() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def tap(self, x, y):
+        self.driver.tap([(x, y)])
+
+    def click(self, el):
+        el["el"].click()
+
+    def type_text(self, el, text):
+        el["el"].click()
+        el["el"].clear()
+        el["el"].send_keys(text)
+
+    def keyevent(self, keycode):
+        self.driver.press_keycode(keycode)
+
+    def close(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+BACKENDS = {"adb": AdbBackend, "appium": AppiumBackend}
+
+
+def open_backend(kind=None, device_name=None, caps=None):
+    """
+    Бэкенд по имени (или UI_BACKEND); device_name=None - первый MEmu из реестра.
+    caps - дополнительные capabilities для appium (adb их не использует).
+    """
+    kind = kind or os.getenv("UI_BACKEND") or "adb"
+    if kind not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд UI: {kind} (есть: {', '.join(BACKENDS)})")
+    start = time.perf_counter()
+    if kind == "appium" and device_name is None:
+        from device_registry import get_registry
+        device_name = get_registry(ADB_PATH).first_device()
+    backend = AppiumBackend(device_name, **(caps or {})) if kind == "appium" else AdbBackend(device_name)
+    backend.startup = time.perf_counter() - start
+    print(f"⏱️ Бэкенд {kind} готов за {backend.startup:.2f} сек ({backend.device_name})")
+    return backend
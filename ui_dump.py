@@ -0,0 +1,54 @@
+import gzip
+import os
+
+# ==========================================
+# НАСТРОЙКИ И РАЗБОР ДАМПА UI
+# ==========================================
+#
+# Общие для ADBController (main) и AsyncADBController (async_adb).
+
+# Дамп UI одним вызовом: uiautomator пишет XML прямо в stdout (exec-out)
+UI_DUMP_TARGET = os.getenv("UI_DUMP_TARGET") or "/dev/tty"
+# --compressed: без служебных layout-контейнеров (дамп меньше и быстрее)
+UI_DUMP_COMPRESSED = os.getenv("UI_DUMP_COMPRESSED") == "1"
+# Сжимать дамп gzip на устройстве (если есть toybox gzip)
+UI_DUMP_GZIP = os.getenv("UI_DUMP_GZIP") == "1"
+
+# Режим "file": дамп в файл на устройстве и cat в той же команде
+REMOTE_DUMP = "/data/local/tmp/window_dump.xml"
+REMOTE_DUMP_RC = "/data/local/tmp/window_dump.rc"
+
+
+def dump_command(mode):
+    """
+    Команда дампа для режима: "stream" - XML сразу в stdout, "file" - через файл.
+    Код возврата команды - код uiautomator (и при UI_DUMP_GZIP).
+    """
+    flags = "--compressed " if UI_DUMP_COMPRESSED else ""
+    if mode == "stream":
+        cmd = f"uiautomator dump {flags}{UI_DUMP_TARGET}"
+    else:
+        cmd = f"uiautomator dump {flags}{REMOTE_DUMP} >/dev/null && cat {REMOTE_DUMP}"
+    if UI_DUMP_GZIP:
+        # У конвейера код возврата gzip - код uiautomator сохраняем в файл и возвращаем им
+        cmd = f"{{ {cmd}; echo $? > {REMOTE_DUMP_RC}; }} | gzip -c; (exit $(cat {REMOTE_DUMP_RC}))"
+    return cmd
+
+
+def decode_dump(data):
+    """
+    Сырой вывод `uiautomator dump` -> XML строка ("" если дамп не удался).
+    Понимает gzip (UI_DUMP_GZIP) и отрезает хвостовое сообщение uiautomator.
+    """
+    if not data:
+        return ""
+    if data[:2] == b"\x1f\x8b":
+        try:
+            data = gzip.decompress(data)
+        except (OSError, EOFError):
+            return ""
+    end = data.rfind(b"</hierarchy>")
+    if end < 0:
+        return ""
+    start = data.find(b"<?xml")
+    return data[max(start, 0):end + len(b"</hierarchy>")].decode("utf-8", errors="replace")
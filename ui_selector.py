@@ -0,0 +1,232 @@
+import functools
+import re
+
+# ==========================================
+# СЕЛЕКТОРЫ В СТИЛЕ UiSelector
+# ==========================================
+#
+# Строка UiSelector (как в Appium) компилируется один раз в набор проверок
+# и применяется к уже снятому UITree - все совпадения за один дамп:
+#
+#     sel = compile_selector('new UiSelector().className("android.widget.EditText").enabled(true)')
+#     cc_field, phone_field = sel.find_all(tree)[:2]
+#
+#     # Строка списка: чекбокс рядом с нужной подписью
+#     compile_selector('resourceId("com.whatsapp:id/reg_method_name").textContains("Voice")'
+#                      '.fromParent(new UiSelector().resourceId("com.whatsapp:id/reg_method_checkbox"))')
+#
+# Поддерживается:
+#   text / textContains / textStartsWith / textMatches      (с учетом регистра, как на Android)
+#   description / descriptionContains / descriptionMatches
+#   resourceId / resourceIdMatches / className / classNameMatches / packageName
+#   clickable / enabled / checked / focused / selected / scrollable (true|false)
+#   index(n) - атрибут index узла, instance(n) - n-е совпадение
+#   childSelector(sel) - потомки найденного, fromParent(sel) - соседи (потомки родителя)
+# Везде, где принимается селектор-словарь (find_any, Screen), можно передать и строку.
+
+TOKEN_RE = re.compile(r'\s*(?:(?P<new>new\s+UiSelector\s*\(\s*\))|(?P<dot>\.)|(?P<name>[A-Za-z_]\w*)|'
+                      r'(?P<string>"(?:[^"\\]|\\.)*")|(?P<number>-?\d+)|(?P<open>\()|(?P<close>\))|(?P<comma>,))')
+
+
+class SelectorError(ValueError):
+    pass
+
+
+def _attr(name):
+    return lambda node: getattr(node, name)
+
+
+ATTRS = {
+    "text": _attr("text"),
+    "description": _attr("content_desc"),
+    "resourceId": _attr("resource_id"),
+    "className": _attr("class_name"),
+    "packageName": _attr("package"),
+}
+
+FLAGS = ("clickable", "enabled", "checked", "focused", "selected", "scrollable")
+
+
+def _string_check(method, value):
+    """Проверка строкового атрибута по имени метода UiSelector"""
+    for base, get in ATTRS.items():
+        if method == base:
+            return lambda node: get(node) == value
+        if method == base + "Contains":
+            return lambda node: value in get(node)
+        if method == base + "StartsWith":
+            return lambda node: get(node).startswith(value)
+        if method == base + "Matches":
+            pattern = re.compile(value)
+            return lambda node: pattern.fullmatch(get(node)) is not None
+    return None
+
+
+class Selector:
+    """Скомпилированный селектор: проверки узла + instance + связи child/parent"""
+
+    def __init__(self, source=""):
+        self.source = source
+        self.checks = []
+        self.instance = None
+        # [("child" | "sibling", Selector)] - применяются по порядку к найденным узлам
+        self.relations = []
+
+    def add(self, method, args):
+        if method in ("childSelector", "fromParent"):
+            if len(args) != 1 or not isinstance(args[0], Selector):
+                raise SelectorError(f"{method} ждет вложенный UiSelector")
+            self.relations.append(("child" if method == "childSelector" else "sibling", args[0]))
+            return
+        if len(args) != 1:
+            raise SelectorError(f"{method}: нужен ровно один аргумент")
+        value = args[0]
+        if method in FLAGS:
+            if not isinstance(value, bool):
+                raise SelectorError(f"{method} ждет true/false")
+            self.checks.append(lambda node, name=method: getattr(node, name) == value)
+        elif method == "index":
+            self.checks.append(lambda node: node.index == value)
+        elif method == "instance":
+            self.instance = value
+        elif isinstance(value, str) and _string_check(method, value):
+            self.checks.append(_string_check(method, value))
+        else:
+            raise SelectorError(f"Неизвестный метод UiSelector: {method}")
+
+    def matches(self, node):
+        return node.bounds is not None and all(check(node) for check in self.checks)
+
+    def find_all(self, tree, nodes=None):
+        """Все подходящие узлы снимка (в порядке документа)"""
+        found = [node for node in (tree.nodes if nodes is None else nodes) if self.matches(node)]
+        if self.instance is not None:
+            found = found[self.instance:self.instance + 1]
+        for kind, sub in self.relations:
+            related = []
+            for node in found:
+                if kind == "child":
+                    scope = tree.descendants_of(node)
+                else:
+                    parent = tree.parent_of(node)
+                    scope = [n for n in tree.descendants_of(parent) if n is not node] if parent else []
+                related.extend(n for n in sub.find_all(tree, scope) if n not in related)
+            found = related
+        return found
+
+    def first(self, tree):
+        found = self.find_all(tree)
+        return found[0] if found else None
+
+    def __repr__(self):
+        return f"Selector({self.source!r})"
+
+
+def _parse(tokens, pos, source):
+    """Цепочка [new UiSelector()].method(args)... начиная с pos -> (Selector, pos)"""
+    selector = Selector(source)
+    if pos < len(tokens) and tokens[pos][0] == "new":
+        pos += 1
+    while pos < len(tokens):
+        kind, value = tokens[pos]
+        if kind == "dot":
+            pos += 1
+            continue
+        if kind != "name":
+            break
+        method = value
+        pos += 1
+        if pos >= len(tokens) or tokens[pos][0] != "open":
+            raise SelectorError(f"После {method} ожидается '('")
+        pos += 1
+        args = []
+        while pos < len(tokens) and tokens[pos][0] != "close":
+            kind, value = tokens[pos]
+            if kind == "comma":
+                pos += 1
+            elif kind == "string":
+                args.append(re.sub(r"\\(.)", r"\1", value[1:-1]))
+                pos += 1
+            elif kind == "number":
+                args.append(int(value))
+                pos += 1
+            elif kind == "name" and value in ("true", "false"):
+                args.append(value == "true")
+                pos += 1
+            elif kind in ("new", "name"):
+                nested, pos = _parse(tokens, pos, source)
+                args.append(nested)
+            else:
+                raise SelectorError(f"Неожиданный токен {value!r} в {method}()")
+        if pos >= len(tokens):
+            raise SelectorError(f"Не закрыта скобка у {method}")
+        pos += 1
+        selector.add(method, args)
+    return selector, pos
+
+
+@functools.lru_cache(maxsize=256)
+def compile_selector(source):
+    """Строка UiSelector -> Selector (кэшируется: одна строка компилируется один раз)"""
+    tokens = []
+    pos = 0
+    source = source.strip().rstrip(";")
+    while pos < len(source):
+        m = TOKEN_RE.match(source, pos)
+        if not m or m.end() == pos:
+            raise SelectorError(f"Не разобрать селектор с позиции {pos}: {source[pos:pos + 20]!r}")
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+        pos = m.end()
+    selector, end = _parse(tokens, 0, source)
+    if end != len(tokens):
+        raise SelectorError(f"Лишний хвост в селекторе: {source!r}")
+    return selector
+
+
+def select(tree, selector):
+    """Все совпадения: selector - строка UiSelector, Selector или словарь (как в find_any)"""
+    if isinstance(selector, dict):
+        if "index" in selector:
+            node = tree.get(**selector)
+            return [node] if node else []
+        return tree.find(**selector)
+    if isinstance(selector, str):
+        selector = compile_selector(selector)
+    return selector.find_all(tree)
+
+
+def first_match(tree, selector):
+    """Первое совпадение или None (для find_any / Screen)"""
+    if isinstance(selector, dict):
+        return tree.get(**selector)
+    found = select(tree, selector)
+    return found[0] if found else None
+
+
+def _quote(value):
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def to_uiselector(selector):
+    """
+    Селектор-словарь (как в find_any) -> строка UiSelector с тем же смыслом
+    (для бэкендов, которые понимают только строки, например Appium)
+    """
+    if not isinstance(selector, dict):
+        return getattr(selector, "source", selector)
+    # Подстроки в словарях - без учета регистра, в UiSelector Contains - с учетом
+    parts = {
+        "text": lambda v: f"textMatches({_quote('(?is).*' + re.escape(v) + '.*')})",
+        "text_exact": lambda v: f"text({_quote(v)})",
+        "resource_id": lambda v: f"resourceId({_quote(v)})",
+        "resource_id_contains": lambda v: f"resourceIdMatches({_quote('.*' + re.escape(v) + '.*')})",
+        "class_name": lambda v: f"className({_quote(v)})",
+        "content_desc": lambda v: f"descriptionMatches({_quote('(?is).*' + re.escape(v) + '.*')})",
+        "index": lambda v: f"instance({int(v)})",
+    }
+    chain = [parts[key](value) for key, value in selector.items() if key in parts and value is not None]
+    unknown = set(selector) - set(parts)
+    if unknown:
+        raise SelectorError(f"Ключи {sorted(unknown)} не переводятся в UiSelector")
+    return "new UiSelector()." + ".".join(chain) if chain else "new UiSelector()"
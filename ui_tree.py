@@ -0,0 +1,243 @@
+import re
+import xml.etree.ElementTree as ET
+
+# ==========================================
+# РАЗОБРАННЫЙ UI ДАМП
+# ==========================================
+#
+# Дамп uiautomator разбирается один раз в компактные записи UINode
+# с индексами по text / resource-id / class. Каждый атрибут сравнивается
+# отдельно, поэтому text="OK" больше не матчится по resource-id или content-desc.
+#
+# Селектор (kwargs для find / first):
+#   text                - text содержит подстроку (без учета регистра)
+#   text_exact          - text совпадает точно
+#   resource_id         - resource-id совпадает точно
+#   resource_id_contains- resource-id содержит подстроку
+#   class_name          - class совпадает точно
+#   content_desc        - content-desc содержит подстроку (без учета регистра)
+# Строки в стиле UiSelector (связи, instance, флаги) - см. ui_selector.
+
+BOUNDS_RE = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+# Размер куска при потоковом разборе (first)
+STREAM_CHUNK = 8192
+
+# Компактная строка узла (JSON агента иерархии, см. hierarchy_agent):
+#   [parent, index, text, resource_id, class, package, content_desc, flags, x1, y1, x2, y2]
+# parent - номер строки родителя (-1 - корень или узел без связей), flags - биты FLAG_NAMES
+FLAG_NAMES = ("clickable", "enabled", "checked", "focused", "selected", "scrollable")
+
+
+class UINode:
+    __slots__ = ("id", "parent", "children", "index", "text", "resource_id", "class_name",
+                 "package", "content_desc", "clickable", "enabled", "checked", "focused",
+                 "selected", "scrollable", "bounds")
+
+    def __init__(self, node_id, parent, attrs):
+        self.id = node_id
+        self.parent = parent
+        self.children = []
+        self.index = int(attrs.get("index") or 0)
+        self.text = attrs.get("text", "")
+        self.resource_id = attrs.get("resource-id", "")
+        self.class_name = attrs.get("class", "")
+        self.package = attrs.get("package", "")
+        self.content_desc = attrs.get("content-desc", "")
+        self.clickable = attrs.get("clickable") == "true"
+        self.enabled = attrs.get("enabled") == "true"
+        self.checked = attrs.get("checked") == "true"
+        self.focused = attrs.get("focused") == "true"
+        self.selected = attrs.get("selected") == "true"
+        self.scrollable = attrs.get("scrollable") == "true"
+        m = BOUNDS_RE.match(attrs.get("bounds", ""))
+        self.bounds = tuple(map(int, m.groups())) if m else None
+
+    @classmethod
+    def from_row(cls, node_id, parent, row):
+        """Узел из компактной строки агента (без разбора XML-атрибутов)"""
+        node = cls.__new__(cls)
+        node.id = node_id
+        node.parent = parent
+        node.children = []
+        node.index, node.text, node.resource_id, node.class_name, node.package, node.content_desc = row[1:7]
+        for bit, name in enumerate(FLAG_NAMES):
+            setattr(node, name, bool(row[7] >> bit & 1))
+        node.bounds = tuple(row[8:12]) if len(row) >= 12 else None
+        return node
+
+    def as_row(self, parent=-1):
+        flags = sum(1 << bit for bit, name in enumerate(FLAG_NAMES) if getattr(self, name))
+        return [parent, self.index, self.text, self.resource_id, self.class_name, self.package,
+                self.content_desc, flags] + list(self.bounds or ())
+
+    @property
+    def center(self):
+        x1, y1, x2, y2 = self.bounds
+        return (x1 + x2) // 2, (y1 + y2) // 2
+
+    def as_element(self):
+        """Словарь в формате ADBController.find_element: {x, y, bounds, node}"""
+        x, y = self.center
+        return {'x': x, 'y': y, 'bounds': self.bounds, 'node': self}
+
+    def __repr__(self):
+        return f"UINode({self.class_name!r}, text={self.text!r}, id={self.resource_id!r}, bounds={self.bounds})"
+
+
+def node_matches(node, text=None, text_exact=None, resource_id=None, resource_id_contains=None,
+                 class_name=None, content_desc=None):
+    """Проверка одного узла селектором (без индексов)"""
+    if node.bounds is None:
+        return False
+    if text is not None and text.lower() not in node.text.lower():
+        return False
+    if text_exact is not None and node.text != text_exact:
+        return False
+    if resource_id is not None and node.resource_id != resource_id:
+        return False
+    if resource_id_contains is not None and resource_id_contains not in node.resource_id:
+        return False
+    if class_name is not None and node.class_name != class_name:
+        return False
+    if content_desc is not None and content_desc.lower() not in node.content_desc.lower():
+        return False
+    return True
+
+
+def _xml_body(xml):
+    """Отрезает мусор вокруг <hierarchy> (сообщения uiautomator и т.п.)"""
+    start = xml.find("<")
+    end = xml.rfind("</hierarchy>")
+    if start < 0:
+        return ""
+    if end < 0:
+        return xml[start:]
+    return xml[start:end + len("</hierarchy>")]
+
+
+def iter_nodes(xml):
+    """
+    Потоковый разбор дампа: отдает UINode по мере чтения.
+    Битый/обрезанный дамп не роняет разбор - просто заканчиваем на месте ошибки.
+    """
+    body = _xml_body(xml)
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack = []
+    count = 0
+    for pos in range(0, len(body), STREAM_CHUNK):
+        try:
+            parser.feed(body[pos:pos + STREAM_CHUNK])
+        except ET.ParseError:
+            pass
+        events = parser.read_events()
+        while True:
+            try:
+                event, elem = next(events)
+            except StopIteration:
+                break
+            except ET.ParseError:
+                return
+            if elem.tag != "node":
+                continue
+            if event == "start":
+                node = UINode(count, stack[-1].id if stack else None, elem.attrib)
+                count += 1
+                if stack:
+                    stack[-1].children.append(node.id)
+                stack.append(node)
+                yield node
+            else:
+                stack.pop()
+                elem.clear()
+
+
+class UITree:
+    """Снимок экрана: список узлов + индексы по text / resource-id / class"""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.by_text = {}
+        self.by_resource_id = {}
+        self.by_class = {}
+        for node in nodes:
+            if node.text:
+                self.by_text.setdefault(node.text, []).append(node.id)
+            if node.resource_id:
+                self.by_resource_id.setdefault(node.resource_id, []).append(node.id)
+            self.by_class.setdefault(node.class_name, []).append(node.id)
+
+    @classmethod
+    def parse(cls, xml):
+        return cls(list(iter_nodes(xml)) if xml else [])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Снимок из строк агента (полная иерархия в порядке документа)"""
+        nodes = []
+        for node_id, row in enumerate(rows):
+            parent = row[0] if 0 <= row[0] < node_id else None
+            node = UINode.from_row(node_id, parent, row)
+            if parent is not None:
+                nodes[parent].children.append(node_id)
+            nodes.append(node)
+        return cls(nodes)
+
+    def to_rows(self):
+        return [node.as_row(-1 if node.parent is None else node.parent) for node in self.nodes]
+
+    @staticmethod
+    def first(xml, **selector):
+        """Первый подходящий узел без разбора всего дампа (потоковый режим)"""
+        if not xml:
+            return None
+        for node in iter_nodes(xml):
+            if node_matches(node, **selector):
+                return node
+        return None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _candidates(self, text_exact=None, resource_id=None, class_name=None, **_):
+        """Самый узкий список кандидатов по индексам"""
+        lists = []
+        if resource_id is not None:
+            lists.append(self.by_resource_id.get(resource_id, []))
+        if text_exact is not None:
+            lists.append(self.by_text.get(text_exact, []))
+        if class_name is not None:
+            lists.append(self.by_class.get(class_name, []))
+        if not lists:
+            return self.nodes
+        return [self.nodes[i] for i in min(lists, key=len)]
+
+    def find(self, **selector):
+        """Все узлы, подходящие под селектор (в порядке документа)"""
+        return [node for node in self._candidates(**selector) if node_matches(node, **selector)]
+
+    def get(self, index=0, **selector):
+        """index-й подходящий узел или None"""
+        found = self.find(**selector)
+        return found[index] if len(found) > index else None
+
+    def focused(self):
+        """Самый глубокий узел в фокусе (обычно поле ввода) или None"""
+        found = [node for node in self.nodes if node.focused]
+        return found[-1] if found else None
+
+    def parent_of(self, node):
+        return self.nodes[node.parent] if node.parent is not None else None
+
+    def children_of(self, node):
+        return [self.nodes[i] for i in node.children]
+
+    def descendants_of(self, node):
+        """Все потомки узла в порядке документа"""
+        found = []
+        stack = list(reversed(node.children))
+        while stack:
+            child = self.nodes[stack.pop()]
+            found.append(child)
+            stack.extend(reversed(child.children))
+        return found
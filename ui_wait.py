@@ -0,0 +1,242 @@
+import hashlib
+import os
+import subprocess
+import threading
+import time
+
+import flow_budget
+from adb_metrics import METRICS
+from adb_transport import AdbTransportError
+from ui_tree import UITree
+
+# ==========================================
+# ОЖИДАНИЕ ИЗМЕНЕНИЙ ЭКРАНА
+# ==========================================
+#
+# Вместо "дамп -> sleep(1) -> дамп" ждем событие изменения UI (поток событий
+# с устройства) или, если событий нет, опрашиваем с нарастающим интервалом.
+# Неизменившийся экран не разбирается повторно (сравнение хеша дампа), а при
+# потоке событий об изменении контента не дампится вообще, пока не пришло
+# событие и не сменилось окно в фокусе.
+#
+# UI_EVENTS:
+#   logcat      - (по умолчанию) `logcat -b events`: смены activity/окон.
+#                 Только будит опрос раньше, дамп на каждом шаге остается.
+#   uiautomator - `uiautomator events`: события accessibility, включая
+#                 изменения контента. На части прошивок конфликтует с
+#                 `uiautomator dump` (один UiAutomation на устройство).
+#   off         - только опрос с backoff.
+
+UI_EVENTS = (os.getenv("UI_EVENTS") or "logcat").lower()
+
+# Интервалы опроса (сек): после изменения начинаем с MIN, без изменений растем до MAX
+POLL_MIN = 0.1
+POLL_MAX = 1.0
+
+EVENT_COMMANDS = {
+    "logcat": "logcat -b events -v brief -T 1",
+    "uiautomator": "uiautomator events",
+}
+
+
+def is_ui_event(source, line):
+    """Строка потока событий означает изменение экрана?"""
+    if source == "logcat":
+        # brief: "I/am_focused_activity( 1234): [...]"
+        tag = line.split("(", 1)[0].split("/", 1)[-1]
+        return tag.startswith(("am_", "wm_"))
+    return "EventType" in line
+
+
+class UIEventStream:
+    """Фоновый поток, читающий события UI с устройства и будящий ожидающих"""
+
+    def __init__(self, adb, source=UI_EVENTS):
+        self.adb = adb
+        self.source = source if source in EVENT_COMMANDS else "off"
+        # События об изменении контента (а не только окон) позволяют пропускать дампы
+        self.content_events = self.source == "uiautomator"
+        self.generation = 0
+        self.cond = threading.Condition()
+        self.active = False
+        self.thread = None
+        self.proc = None
+        self.sock = None
+        self.stopped = False
+
+    def start(self):
+        if self.source == "off" or self.thread:
+            return self
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Конец сессии: закрыть поток событий (сокет или процесс `adb shell`)"""
+        self.active = False
+        self.stopped = True
+        if self.sock:
+            self.sock.close()
+        if self.proc:
+            self.proc.kill()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+
+    def _lines(self):
+        """Строки потока событий: через сокетный транспорт, а если он не открылся - через adb subprocess"""
+        cmd = EVENT_COMMANDS[self.source]
+        if self.adb.transport:
+            try:
+                self.sock = self.adb.transport.open_stream(f"shell:{cmd}")
+            except (OSError, AdbTransportError):
+                self.sock = None
+        if self.sock is not None:
+            try:
+                self.sock.settimeout(None)
+                buf = b""
+                while True:
+                    chunk = self.sock.recv(4096)
+                    if not chunk:
+                        return
+                    buf += chunk
+                    *lines, buf = buf.split(b"\n")
+                    for line in lines:
+                        yield line.decode("utf-8", errors="ignore")
+            except (OSError, AdbTransportError):
+                return
+        if self.stopped:
+            return
+        self.proc = subprocess.Popen([self.adb.adb, "-s", self.adb.device_name, "shell"] + cmd.split(),
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                     text=True, encoding="utf-8", errors="ignore")
+        yield from self.proc.stdout
+
+    def _run(self):
+        self.active = True
+        try:
+            for line in self._lines():
+                if is_ui_event(self.source, line):
+                    self.notify()
+        except Exception:
+            pass
+        finally:
+            # Поток умер - дальше работаем опросом
+            self.active = False
+            self.notify()
+
+    def notify(self):
+        with self.cond:
+            self.generation += 1
+            self.cond.notify_all()
+
+    def wait(self, generation, timeout):
+        """Ждет события новее generation. True, если событие было."""
+        with self.cond:
+            if self.generation != generation:
+                return True
+            self.cond.wait(timeout)
+            return self.generation != generation
+
+
+class UIWaiter:
+    """
+    Движок ожидания над ADBController: снимок экрана + ожидание условия.
+
+        waiter.wait(lambda tree: tree.get(text="Next"), timeout=10)
+    """
+
+    def __init__(self, adb, source=UI_EVENTS):
+        self.adb = adb
+        self.events = UIEventStream(adb, source)
+        self.tree = None
+        # Последний снимок и когда он снят - остается и после наших tap/text (ключ кэша координат)
+        self.last_tree = None
+        self.taken_at = 0.0
+        self.dump_hash = None
+        self.focus = None
+        self.seen_generation = -1
+        self.dumps = 0
+        self.parses = 0
+
+    def invalidate(self):
+        """Мы сами что-то сделали с экраном (tap/text) - кеш снимка недействителен"""
+        self.tree = None
+
+    def last_snapshot(self, max_age):
+        """Последний снимок (в том числе до наших tap/text), если он не старше max_age сек, иначе None"""
+        if self.last_tree is None or time.time() - self.taken_at > max_age:
+            return None
+        return self.last_tree
+
+    def snapshot(self):
+        """UITree текущего экрана (без дампа/разбора, если экран не менялся)"""
+        tree = self._snapshot()
+        # Клик по координатам из кэша проверяется по первому снимку после него;
+        # если пришлось перекликнуть - экран уже другой
+        if self.adb.coords.verify(tree):
+            tree = self._snapshot()
+        self.last_tree, self.taken_at = tree, time.time()
+        return tree
+
+    def _snapshot(self):
+        events = self.events
+        generation = events.generation
+        if self.tree is not None and events.active and events.content_events \
+                and generation == self.seen_generation:
+            # Событий не было - сверяем только окно в фокусе
+            if self.adb.focused_window() == self.focus:
+                if METRICS.enabled:
+                    METRICS.count("adb_snapshot_reused_total", skipped="dump")
+                return self.tree
+
+        # Агент иерархии (если есть) отдает уже готовые узлы - XML не нужен
+        agent_tree = self.adb.agent.tree()
+        xml = None if agent_tree is not None else self.adb.get_ui_dump()
+        self.dumps += 1
+        self.seen_generation = generation
+        if events.content_events:
+            self.focus = self.adb.focused_window()
+        if agent_tree is not None:
+            dump_hash = self.adb.agent.digest
+        else:
+            dump_hash = hashlib.md5(xml.encode("utf-8", errors="ignore")).digest()
+        if self.tree is not None and dump_hash == self.dump_hash:
+            if METRICS.enabled:
+                METRICS.count("adb_snapshot_reused_total", skipped="parse")
+            return self.tree
+        self.dump_hash = dump_hash
+        if agent_tree is not None:
+            self.tree = agent_tree
+            return self.tree
+        start = time.perf_counter()
+        self.tree = UITree.parse(xml)
+        self.parses += 1
+        if METRICS.enabled:
+            elapsed = time.perf_counter() - start
+            METRICS.observe("adb_parse_seconds", elapsed)
+            METRICS.event("parse", seconds=round(elapsed, 6), nodes=len(self.tree), bytes=len(xml))
+        return self.tree
+
+    def wait(self, predicate, timeout):
+        """
+        Ждет, пока predicate(tree) вернет истину. Возвращает это значение
+        или None по таймауту. Хотя бы одна проверка делается всегда.
+        Таймаут не выходит за бюджет текущей фазы (см. flow_budget).
+        """
+        self.events.start()
+        deadline = time.time() + flow_budget.cap(timeout)
+        interval = POLL_MIN
+        while True:
+            generation = self.events.generation
+            result = predicate(self.snapshot())
+            if result:
+                return result
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            if self.events.wait(generation, flow_budget.poll_interval(interval, remaining)):
+                interval = POLL_MIN
+            else:
+                interval = min(interval * 2, POLL_MAX)
@@ -0,0 +1,300 @@
+import struct
+import time
+from pathlib import Path
+
+from ui_wait import POLL_MAX, POLL_MIN
+
+# ==========================================
+# ВИЗУАЛЬНЫЙ ПОИСК ПО СКРИНШОТУ
+# ==========================================
+#
+# Запасной путь, когда uiautomator dump не работает или нужного элемента
+# нет в иерархии (WebView, канвас, "глухие" диалоги). Кадр снимается
+# `screencap` без PNG - сырой RGBA через exec-out, поверх байтов numpy
+# строит представление без копирования. Шаблон ищется нормированной
+# корреляцией (через FFT) на уменьшенном кадре в заданной области,
+# затем уточняется в полном разрешении.
+#
+#   frame = adb.screenshot()
+#   el = adb.visual.find("wa_agree", roi=(0, 0.6, 1, 1))
+#   el = adb.visual.find_color((0, 168, 132), roi=(0, 0.6, 1, 1))
+#
+# numpy - необязательная зависимость, импортируется при первом поиске.
+# Шаблоны: templates/<имя>.npz (серый кадр + разрешение, в котором снят),
+# создаются save_template() из сохраненного кадра.
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+
+# Форматы screencap с 4 байтами на пиксель: RGBA_8888, RGBX_8888, BGRA_8888
+PIXEL_FORMATS = {1: "RGBA", 2: "RGBX", 5: "BGRA"}
+
+_np = None
+
+
+class VisualLocatorError(Exception):
+    pass
+
+
+def _numpy():
+    global _np
+    if _np is None:
+        try:
+            import numpy
+        except ImportError as e:
+            raise VisualLocatorError("Для визуального поиска нужен numpy: pip install numpy") from e
+        _np = numpy
+    return _np
+
+
+class Frame:
+    """Сырой кадр screencap: размер из заголовка, пиксели - numpy-представление тех же байтов"""
+
+    __slots__ = ("width", "height", "format", "data", "offset", "_rgba")
+
+    def __init__(self, width, height, pixel_format, data, offset):
+        self.width = width
+        self.height = height
+        self.format = pixel_format
+        self.data = data
+        self.offset = offset
+        self._rgba = None
+
+    @classmethod
+    def from_raw(cls, data):
+        """
+        Разбор вывода `screencap` (без -p). Заголовок: width, height, format
+        (+ colorspace начиная с Android 9, итого 16 байт вместо 12).
+        """
+        if not data or len(data) < 12:
+            raise VisualLocatorError("Пустой вывод screencap")
+        width, height, pixel_format = struct.unpack_from("<III", data)
+        if pixel_format not in PIXEL_FORMATS:
+            raise VisualLocatorError(f"Неподдерживаемый формат кадра screencap: {pixel_format}")
+        size = width * height * 4
+        extra = len(data) - size
+        if extra in (12, 16):
+            offset = extra
+        elif extra > 16:
+            offset = 16
+        else:
+            raise VisualLocatorError(f"Кадр обрезан: {len(data)} байт для {width}x{height}")
+        return cls(width, height, pixel_format, data, offset)
+
+    @classmethod
+    def load(cls, path):
+        """Кадр, сохраненный Frame.save (для офлайн-отладки)"""
+        return cls.from_raw(Path(path).read_bytes())
+
+    def save(self, path):
+        Path(path).write_bytes(self.data[:self.offset + self.width * self.height * 4])
+
+    @property
+    def rgba(self):
+        """(height, width, 4) uint8 поверх исходных байтов, без копирования"""
+        if self._rgba is None:
+            np = _numpy()
+            pixels = np.frombuffer(self.data, dtype=np.uint8, count=self.width * self.height * 4, offset=self.offset)
+            pixels = pixels.reshape(self.height, self.width, 4)
+            if PIXEL_FORMATS[self.format] == "BGRA":
+                pixels = pixels[:, :, [2, 1, 0, 3]]
+            self._rgba = pixels
+        return self._rgba
+
+    def region(self, roi=None):
+        """roi (x0, y0, x1, y1) в долях экрана -> пиксельные границы"""
+        if roi is None:
+            return 0, 0, self.width, self.height
+        x0, y0, x1, y1 = roi
+        return (int(x0 * self.width), int(y0 * self.height),
+                max(int(x1 * self.width), 1), max(int(y1 * self.height), 1))
+
+    def gray(self, scale=1, roi=None):
+        """Яркость (float64) области roi с прореживанием в scale раз"""
+        np = _numpy()
+        left, top, right, bottom = self.region(roi)
+        rgb = self.rgba[top:bottom:scale, left:right:scale, :3]
+        return rgb @ np.array([0.299, 0.587, 0.114])
+
+
+def _ncc(image, template):
+    """
+    Карта нормированной корреляции шаблона по всем положениям в image.
+    Свертка через FFT, суммы по окнам - через интегральные изображения.
+    """
+    np = _numpy()
+    ih, iw = image.shape
+    th, tw = template.shape
+    if th > ih or tw > iw:
+        return None
+    t = template - template.mean()
+    t_norm = np.sqrt((t * t).sum())
+    if t_norm == 0:
+        return None
+
+    shape = (ih + th - 1, iw + tw - 1)
+    corr = np.fft.irfft2(np.fft.rfft2(image, shape) * np.fft.rfft2(t[::-1, ::-1], shape), shape)
+    corr = corr[th - 1:ih, tw - 1:iw]
+
+    def window_sums(a):
+        ii = np.zeros((ih + 1, iw + 1))
+        ii[1:, 1:] = a.cumsum(0).cumsum(1)
+        return ii[th:, tw:] - ii[:-th, tw:] - ii[th:, :-tw] + ii[:-th, :-tw]
+
+    n = th * tw
+    sums = window_sums(image)
+    var = window_sums(image * image) - sums * sums / n
+    denom = np.sqrt(np.maximum(var, 0)) * t_norm
+    return np.where(denom > 1e-6, corr / np.maximum(denom, 1e-6), 0.0)
+
+
+def _resize(gray, factor):
+    """Ближайший сосед: масштаб шаблона под разрешение устройства"""
+    np = _numpy()
+    h, w = gray.shape
+    rows = np.minimum((np.arange(max(int(h * factor), 1)) / factor).astype(int), h - 1)
+    cols = np.minimum((np.arange(max(int(w * factor), 1)) / factor).astype(int), w - 1)
+    return gray[rows[:, None], cols]
+
+
+def save_template(frame, name, bounds, directory=TEMPLATES_DIR):
+    """Вырезать шаблон (left, top, right, bottom) из кадра в templates/<name>.npz"""
+    np = _numpy()
+    left, top, right, bottom = bounds
+    gray = frame.gray()[top:bottom, left:right]
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    path = Path(directory) / f"{name}.npz"
+    np.savez_compressed(path, gray=gray.astype(np.uint8), resolution=np.array([frame.width, frame.height]))
+    return path
+
+
+class TemplateCache:
+    """Шаблоны, уже приведенные к разрешению устройства и масштабу поиска"""
+
+    def __init__(self, directory=TEMPLATES_DIR):
+        self.directory = Path(directory)
+        self.sources = {}
+        # (name, width, height, scale) -> float64 array
+        self.scaled = {}
+
+    def get(self, name, width, height, scale=1):
+        key = (name, width, height, scale)
+        if key not in self.scaled:
+            gray, (src_width, _) = self._load(name)
+            # Интерфейс Android масштабируется по ширине экрана (dpi)
+            resized = _resize(gray, width / src_width) if src_width != width else gray
+            self.scaled[key] = resized[::scale, ::scale]
+        return self.scaled[key]
+
+    def _load(self, name):
+        if name not in self.sources:
+            path = self.directory / f"{name}.npz"
+            if not path.exists():
+                raise VisualLocatorError(f"Нет шаблона {path}")
+            with _numpy().load(path) as data:
+                self.sources[name] = (data["gray"].astype(float), tuple(int(v) for v in data["resolution"]))
+        return self.sources[name]
+
+
+class VisualLocator:
+    """Поиск элементов по скриншоту для ADBController"""
+
+    def __init__(self, adb, templates=None):
+        self.adb = adb
+        self.templates = templates or TemplateCache()
+        self.frame = None
+        self.captures = 0
+
+    def capture(self):
+        """Свежий кадр (Frame) или None"""
+        data, rc = self.adb.exec_out("screencap", timeout=10)
+        if rc != 0 or not data:
+            return None
+        self.frame = Frame.from_raw(data)
+        self.captures += 1
+        return self.frame
+
+    def screen_size(self):
+        """(width, height) по заголовку кадра - numpy не нужен"""
+        frame = self.frame or self.capture()
+        return (frame.width, frame.height) if frame else None
+
+    def find(self, template, roi=None, threshold=0.8, scale=2, frame=None):
+        """
+        Ищет шаблон в кадре. roi - (x0, y0, x1, y1) в долях экрана.
+        Возвращает {x, y, bounds, score} (как find_element) или None.
+        """
+        frame = frame or self.capture()
+        if frame is None:
+            return None
+        left, top, _, _ = frame.region(roi)
+        tmpl = self.templates.get(template, frame.width, frame.height, scale)
+        scores = _ncc(frame.gray(scale, roi), tmpl)
+        if scores is None:
+            return None
+        np = _numpy()
+        y, x = (int(v) for v in np.unravel_index(int(scores.argmax()), scores.shape))
+        if scores[y, x] < threshold - 0.1:
+            return None
+
+        # Уточнение в полном разрешении рядом с грубой находкой
+        full = self.templates.get(template, frame.width, frame.height, 1)
+        th, tw = full.shape
+        pad = scale * 2
+        x0 = max(left + x * scale - pad, 0)
+        y0 = max(top + y * scale - pad, 0)
+        x1 = min(x0 + tw + 2 * pad, frame.width)
+        y1 = min(y0 + th + 2 * pad, frame.height)
+        fine = _ncc(frame.gray(1, (x0 / frame.width, y0 / frame.height, x1 / frame.width, y1 / frame.height)), full)
+        if fine is None:
+            return None
+        fy, fx = (int(v) for v in np.unravel_index(int(fine.argmax()), fine.shape))
+        score = float(fine[fy, fx])
+        if score < threshold:
+            return None
+        bounds = (x0 + fx, y0 + fy, x0 + fx + tw, y0 + fy + th)
+        return {"x": (bounds[0] + bounds[2]) // 2, "y": (bounds[1] + bounds[3]) // 2, "bounds": bounds, "score": score}
+
+    def find_color(self, rgb, roi=None, tolerance=40, min_size=(40, 20), scale=2, frame=None):
+        """
+        Самая высокая сплошная полоса пикселей цвета rgb (±tolerance по каналу) -
+        обычно это кнопка. Возвращает {x, y, bounds, score} или None.
+        """
+        frame = frame or self.capture()
+        if frame is None:
+            return None
+        np = _numpy()
+        left, top, right, bottom = frame.region(roi)
+        pixels = frame.rgba[top:bottom:scale, left:right:scale, :3].astype(np.int16)
+        mask = (np.abs(pixels - np.array(rgb, dtype=np.int16)) <= tolerance).all(axis=2)
+
+        rows = mask.sum(axis=1) >= min_size[0] // scale
+        # Самый длинный непрерывный отрезок подходящих строк
+        best, start = (0, 0, 0), None
+        for i, ok in enumerate(np.append(rows, False)):
+            if ok and start is None:
+                start = i
+            elif not ok and start is not None:
+                if i - start > best[0]:
+                    best = (i - start, start, i)
+                start = None
+        height, r0, r1 = best
+        if height * scale < min_size[1]:
+            return None
+        cols = np.flatnonzero(mask[r0:r1].any(axis=0))
+        bounds = (left + int(cols[0]) * scale, top + r0 * scale,
+                  left + (int(cols[-1]) + 1) * scale, top + r1 * scale)
+        score = float(mask[r0:r1, cols[0]:cols[-1] + 1].mean())
+        return {"x": (bounds[0] + bounds[2]) // 2, "y": (bounds[1] + bounds[3]) // 2, "bounds": bounds, "score": score}
+
+    def wait(self, find, timeout=10):
+        """Опрос find(frame) по свежим кадрам с нарастающим интервалом"""
+        deadline = time.time() + timeout
+        interval = POLL_MIN
+        while True:
+            frame = self.capture()
+            found = find(frame) if frame else None
+            remaining = deadline - time.time()
+            if found or remaining <= 0:
+                return found
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, POLL_MAX)